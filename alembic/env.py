@@ -11,6 +11,8 @@ from alembic import context
 from sqlmodel import SQLModel
 
 from src.model.user import User
+from src.model.conversation import Conversation
+from src.model.media import Media
 from src.model.message import Message
 
 # this is the Alembic Config object, which provides
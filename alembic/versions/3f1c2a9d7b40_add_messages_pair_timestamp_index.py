@@ -0,0 +1,33 @@
+"""add messages pair timestamp index
+
+Revision ID: 3f1c2a9d7b40
+Revises:
+Create Date: 2026-10-17 09:12:04.118345
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a9d7b40'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_messages_sender_receiver_timestamp',
+        'messages',
+        ['sender_id', 'receiver_id', 'timestamp'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_sender_receiver_timestamp', table_name='messages')
@@ -0,0 +1,82 @@
+"""add conversation last-message fields and participants with unread counters
+
+Revision ID: 5a9e3c7f1b20
+Revises: e7a3b5c90d14
+Create Date: 2026-10-17 16:05:12.884310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a9e3c7f1b20'
+down_revision: Union[str, None] = 'e7a3b5c90d14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('conversations', sa.Column('last_message_id', sa.Uuid(), nullable=True))
+    op.add_column('conversations', sa.Column('last_message_preview', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.add_column('conversations', sa.Column('last_message_at', sa.DateTime(), nullable=True))
+    op.add_column('conversations', sa.Column('last_sender_id', sa.Uuid(), nullable=True))
+    op.create_table(
+        'conversation_participants',
+        sa.Column('conversation_id', sa.Uuid(), nullable=False),
+        sa.Column('user_id', sa.Uuid(), nullable=False),
+        sa.Column('unread_count', sa.Integer(), nullable=False),
+        sa.Column('last_message_at', sa.DateTime(), nullable=True),
+        sa.Column('last_read_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['conversation_id'], ['conversations.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('conversation_id', 'user_id'),
+    )
+
+    # newest message of every conversation, one pass over messages
+    op.execute(
+        """
+        UPDATE conversations AS c
+        SET last_message_id = m.id,
+            last_message_preview = LEFT(m.content, 140),
+            last_message_at = m.timestamp,
+            last_sender_id = m.sender_id
+        FROM (
+            SELECT DISTINCT ON (conversation_id) conversation_id, id, content, timestamp, sender_id
+            FROM messages
+            WHERE conversation_id IS NOT NULL
+            ORDER BY conversation_id, timestamp DESC, id DESC
+        ) AS m
+        WHERE m.conversation_id = c.id
+        """
+    )
+    # history before this migration counts as read
+    op.execute(
+        """
+        INSERT INTO conversation_participants (conversation_id, user_id, unread_count, last_message_at)
+        SELECT id, user_low_id, 0, last_message_at FROM conversations
+        UNION ALL
+        SELECT id, user_high_id, 0, last_message_at FROM conversations
+        """
+    )
+
+    op.create_index(
+        'ix_conversation_participants_inbox',
+        'conversation_participants',
+        ['user_id', 'last_message_at', 'conversation_id'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_conversation_participants_inbox', table_name='conversation_participants')
+    op.drop_table('conversation_participants')
+    op.drop_column('conversations', 'last_sender_id')
+    op.drop_column('conversations', 'last_message_at')
+    op.drop_column('conversations', 'last_message_preview')
+    op.drop_column('conversations', 'last_message_id')
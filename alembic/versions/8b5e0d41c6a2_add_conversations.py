@@ -0,0 +1,82 @@
+"""add conversations and backfill messages.conversation_id
+
+Revision ID: 8b5e0d41c6a2
+Revises: 3f1c2a9d7b40
+Create Date: 2026-10-17 10:03:51.402917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b5e0d41c6a2'
+down_revision: Union[str, None] = '3f1c2a9d7b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'conversations',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('user_low_id', sa.Uuid(), nullable=False),
+        sa.Column('user_high_id', sa.Uuid(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_low_id'], ['user.id']),
+        sa.ForeignKeyConstraint(['user_high_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_low_id', 'user_high_id', name='uq_conversations_pair'),
+    )
+    op.add_column('messages', sa.Column('conversation_id', sa.Uuid(), nullable=True))
+    op.create_foreign_key(
+        'fk_messages_conversation_id', 'messages', 'conversations', ['conversation_id'], ['id']
+    )
+
+    # one conversation per existing canonical pair, then point every message at it
+    op.execute(
+        """
+        INSERT INTO conversations (id, user_low_id, user_high_id, created_at)
+        SELECT gen_random_uuid(),
+               LEAST(sender_id, receiver_id),
+               GREATEST(sender_id, receiver_id),
+               MIN(timestamp)
+        FROM messages
+        GROUP BY LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id)
+        """
+    )
+    op.execute(
+        """
+        UPDATE messages AS m
+        SET conversation_id = c.id
+        FROM conversations AS c
+        WHERE c.user_low_id = LEAST(m.sender_id, m.receiver_id)
+          AND c.user_high_id = GREATEST(m.sender_id, m.receiver_id)
+        """
+    )
+
+    op.create_index(
+        'ix_messages_conversation_timestamp',
+        'messages',
+        ['conversation_id', 'timestamp', 'id'],
+        unique=False,
+    )
+    # history no longer looks messages up by pair, the index would only slow down inserts
+    op.drop_index('ix_messages_sender_receiver_timestamp', table_name='messages')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(
+        'ix_messages_sender_receiver_timestamp',
+        'messages',
+        ['sender_id', 'receiver_id', 'timestamp'],
+        unique=False,
+    )
+    op.drop_index('ix_messages_conversation_timestamp', table_name='messages')
+    op.drop_constraint('fk_messages_conversation_id', 'messages', type_='foreignkey')
+    op.drop_column('messages', 'conversation_id')
+    op.drop_table('conversations')
@@ -0,0 +1,32 @@
+"""add delivered / read high-water marks to conversation participants
+
+Revision ID: b2d84f1e6a37
+Revises: 5a9e3c7f1b20
+Create Date: 2026-10-17 17:21:40.512093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d84f1e6a37'
+down_revision: Union[str, None] = '5a9e3c7f1b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('conversation_participants', sa.Column('last_read_message_id', sa.Uuid(), nullable=True))
+    op.add_column('conversation_participants', sa.Column('last_delivered_at', sa.DateTime(), nullable=True))
+    op.add_column('conversation_participants', sa.Column('last_delivered_message_id', sa.Uuid(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('conversation_participants', 'last_delivered_message_id')
+    op.drop_column('conversation_participants', 'last_delivered_at')
+    op.drop_column('conversation_participants', 'last_read_message_id')
@@ -0,0 +1,47 @@
+"""add generated tsvector column and GIN index for message search
+
+Revision ID: c41d7e9a2f18
+Revises: 8b5e0d41c6a2
+Create Date: 2026-10-17 14:52:07.118342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d7e9a2f18'
+down_revision: Union[str, None] = '8b5e0d41c6a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # stored generated column: Postgres keeps it current on every insert / update,
+    # adding it computes the vector for the existing rows in the same rewrite
+    op.add_column(
+        'messages',
+        sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('english'::regconfig, coalesce(content, ''))", persisted=True),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        'ix_messages_search_vector',
+        'messages',
+        ['search_vector'],
+        unique=False,
+        postgresql_using='gin',
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_search_vector', table_name='messages', postgresql_using='gin')
+    op.drop_column('messages', 'search_vector')
@@ -0,0 +1,52 @@
+"""add group rooms: conversation kind, name and creator, nullable pair and receiver
+
+Revision ID: d9c1f7a4e852
+Revises: b2d84f1e6a37
+Create Date: 2026-10-17 18:02:13.177460
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9c1f7a4e852'
+down_revision: Union[str, None] = 'b2d84f1e6a37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # the server default fills existing rows, no backfill needed
+    op.add_column(
+        'conversations',
+        sa.Column('kind', sqlmodel.sql.sqltypes.AutoString(), server_default='direct', nullable=False),
+    )
+    op.add_column('conversations', sa.Column('name', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.add_column('conversations', sa.Column('created_by', sa.Uuid(), nullable=True))
+    op.create_foreign_key('conversations_created_by_fkey', 'conversations', 'user', ['created_by'], ['id'])
+    op.alter_column('conversations', 'user_low_id', existing_type=sa.Uuid(), nullable=True)
+    op.alter_column('conversations', 'user_high_id', existing_type=sa.Uuid(), nullable=True)
+    op.alter_column('messages', 'receiver_id', existing_type=sa.Uuid(), nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # room messages have no receiver and rooms no pair, they cannot survive the downgrade
+    op.execute("DELETE FROM messages WHERE receiver_id IS NULL")
+    op.execute(
+        "DELETE FROM conversation_participants WHERE conversation_id IN "
+        "(SELECT id FROM conversations WHERE kind = 'group')"
+    )
+    op.execute("DELETE FROM conversations WHERE kind = 'group'")
+    op.alter_column('messages', 'receiver_id', existing_type=sa.Uuid(), nullable=False)
+    op.alter_column('conversations', 'user_high_id', existing_type=sa.Uuid(), nullable=False)
+    op.alter_column('conversations', 'user_low_id', existing_type=sa.Uuid(), nullable=False)
+    op.drop_constraint('conversations_created_by_fkey', 'conversations', type_='foreignkey')
+    op.drop_column('conversations', 'created_by')
+    op.drop_column('conversations', 'name')
+    op.drop_column('conversations', 'kind')
@@ -0,0 +1,48 @@
+"""add media table and messages.media_id
+
+Revision ID: e7a3b5c90d14
+Revises: c41d7e9a2f18
+Create Date: 2026-10-17 15:21:44.603127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3b5c90d14'
+down_revision: Union[str, None] = 'c41d7e9a2f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'media',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('owner_id', sa.Uuid(), nullable=False),
+        sa.Column('content_type', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('received', sa.Integer(), nullable=False),
+        sa.Column('storage_key', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('upload_id', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column('is_complete', sa.Boolean(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['owner_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_media_owner_id'), 'media', ['owner_id'], unique=False)
+    op.add_column('messages', sa.Column('media_id', sa.Uuid(), nullable=True))
+    op.create_foreign_key('fk_messages_media_id', 'messages', 'media', ['media_id'], ['id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('fk_messages_media_id', 'messages', type_='foreignkey')
+    op.drop_column('messages', 'media_id')
+    op.drop_index(op.f('ix_media_owner_id'), table_name='media')
+    op.drop_table('media')
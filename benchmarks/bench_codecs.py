@@ -0,0 +1,49 @@
+"""
+Compare the /message/ws wire encodings: encode + decode time and bytes per frame.
+
+    python -m benchmarks.bench_codecs [--iterations 100000]
+"""
+import argparse
+import timeit
+import uuid
+from datetime import datetime
+
+from src.websocket_manager.protocol import CODECS, DEFAULT_CODEC
+
+FRAMES = {
+    "message": {
+        "type": "message",
+        "content": "hey, are we still on for the review at 3?",
+        "sender_id": str(uuid.uuid4()),
+        "message_id": str(uuid.uuid4()),
+        "conversation_id": str(uuid.uuid4()),
+        "timestamp": datetime.now().isoformat(),
+    },
+    "status_update": {
+        "type": "status_update",
+        "user_id": str(uuid.uuid4()),
+        "is_online": True,
+    },
+    "active_users": {
+        "type": "active_users",
+        "active_users": [str(uuid.uuid4()) for _ in range(200)],
+    },
+}
+
+
+def run(iterations: int):
+    codecs = [("json (default)", DEFAULT_CODEC)] + [(name, codec) for name, codec in CODECS.items()]
+    print(f"{'frame':<14} {'codec':<16} {'bytes':>7} {'encode us':>10} {'decode us':>10}")
+    for frame_name, frame in FRAMES.items():
+        for codec_name, codec in codecs:
+            data = codec.encode(frame)
+            size = len(data.encode() if isinstance(data, str) else data)
+            encode = timeit.timeit(lambda: codec.encode(frame), number=iterations) / iterations * 1e6
+            decode = timeit.timeit(lambda: codec.decode(data), number=iterations) / iterations * 1e6
+            print(f"{frame_name:<14} {codec_name:<16} {size:>7} {encode:>10.2f} {decode:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=100_000)
+    run(parser.parse_args().iterations)
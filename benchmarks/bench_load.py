@@ -0,0 +1,498 @@
+"""
+Load benchmarks against a running server: auth, user directory, message history and /message/ws fan-out.
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.bench_load [--scenarios auth,users,history,ws] [--sockets 1000,5000,10000]
+                                    [--output bench_results.json]
+
+src.main:app runs under uvicorn in a subprocess against a throwaway aiosqlite
+database and an in-process fakeredis TCP server, so neither Postgres nor Redis is
+needed. Bulk data (users, conversations, history) is seeded straight into the
+database; only the measured calls go through the API. Results are written as JSON
+so two runs can be diffed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+from fakeredis import TcpFakeServer
+from redis import Redis
+from websockets.asyncio.client import connect
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(tempfile.gettempdir(), "chat_app_bench.db")
+PASSWORD = "Bench@1234"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+REDIS_PORT = _free_port()
+APP_PORT = _free_port()
+BASE_URL = f"http://127.0.0.1:{APP_PORT}"
+WS_URL = f"ws://127.0.0.1:{APP_PORT}/message/ws"
+
+# the settings have to be in place before anything under src is imported
+os.environ.update({
+    "DATABASE_URL": f"sqlite+aiosqlite:///{DB_PATH}",
+    "REDIS_URL": f"redis://127.0.0.1:{REDIS_PORT}/0",
+})
+for _key, _value in {
+    "POSTGRES_USER": "bench",
+    "POSTGRES_PASSWORD": "bench",
+    "POSTGRES_DB": "bench",
+    "HOST": "127.0.0.1",
+    "TEST_DATABASE_URL": "unused",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "600",
+    "INVITE_TOKEN_EXPIRE_TIME": "60",
+    "JWT_SECRET_KEY": "bench-secret",
+    "ALGORITHM": "HS256",
+    "INTERNAL_API_TOKEN": "bench-internal",
+    "LOG_LEVEL": "WARNING",
+    "LOG_SAMPLE_RATE": "0.0",
+    # sign-up / sign-in are hammered from one address on purpose, measure them rather than the limiter
+    "RATE_LIMIT_ENABLED": "false",
+    # the connect phase is a deliberate storm, measure fan-out rather than admission control
+    "WS_ADMISSION_ENABLED": "false",
+}.items():
+    os.environ.setdefault(_key, _value)
+
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlmodel import SQLModel  # noqa: E402
+
+from src.core.security import create_access_token, get_hashed_password  # noqa: E402
+from src.database import create_sqlite_search_index  # noqa: E402
+from src.model.conversation import Conversation, ConversationParticipant  # noqa: E402
+from src.model.message import Message  # noqa: E402
+from src.model.user import User  # noqa: E402
+from src.services.user_service import DIRECTORY_COUNTER_FIELD, directory_version_key  # noqa: E402
+from src.websocket_manager.protocol import CODECS, DEFAULT_CODEC  # noqa: E402
+
+SEED_CHUNK = 5000
+
+
+class Bench:
+    """Seeds the database and hands out tokens for seeded users."""
+
+    def __init__(self):
+        self.engine = create_engine(f"sqlite:///{DB_PATH}")
+        self.redis = Redis(port=REDIS_PORT, decode_responses=True)
+        self.password_hash = get_hashed_password(PASSWORD)
+        self.user_count = 0
+
+    def create_schema(self):
+        SQLModel.metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            create_sqlite_search_index(conn)
+
+    def seed_users(self, count: int, prefix: str) -> List[uuid.UUID]:
+        ids = [uuid.uuid4() for _ in range(count)]
+        rows = [
+            {
+                "id": user_id,
+                "name": f"{prefix}-{i}",
+                "email": f"{prefix}-{i}@bench.io",
+                "password_hash": self.password_hash,
+                "is_online": False,
+            }
+            for i, user_id in enumerate(ids)
+        ]
+        self._insert(User, rows)
+        self.user_count += count
+        # seeded behind the API's back, so drop the cached directory pages
+        self.redis.hincrby(directory_version_key(), DIRECTORY_COUNTER_FIELD, 1)
+        return ids
+
+    def seed_conversation(self, user_a: uuid.UUID, user_b: uuid.UUID) -> uuid.UUID:
+        low, high = Conversation.canonical_pair(user_a, user_b)
+        conversation_id = uuid.uuid4()
+        self._insert(Conversation, [{
+            "id": conversation_id, "user_low_id": low, "user_high_id": high, "created_at": datetime.now(),
+        }])
+        self._insert(ConversationParticipant, [
+            {"conversation_id": conversation_id, "user_id": user_id, "unread_count": 0} for user_id in (low, high)
+        ])
+        return conversation_id
+
+    def seed_history(self, user_a: uuid.UUID, user_b: uuid.UUID, count: int) -> List[uuid.UUID]:
+        conversation_id = self.seed_conversation(user_a, user_b)
+        start = datetime.now() - timedelta(seconds=count)
+        ids = [uuid.uuid4() for _ in range(count)]
+        rows = [
+            {
+                "id": message_id,
+                "sender_id": user_a if i % 2 else user_b,
+                "receiver_id": user_b if i % 2 else user_a,
+                "conversation_id": conversation_id,
+                "content": f"message {i}",
+                "timestamp": start + timedelta(seconds=i),
+            }
+            for i, message_id in enumerate(ids)
+        ]
+        self._insert(Message, rows)
+        return ids
+
+    def _insert(self, model, rows: List[dict]):
+        with self.engine.begin() as conn:
+            for i in range(0, len(rows), SEED_CHUNK):
+                conn.execute(insert(model), rows[i:i + SEED_CHUNK])
+
+    @staticmethod
+    def token(user_id: uuid.UUID) -> str:
+        return create_access_token(str(user_id))
+
+    @classmethod
+    def headers(cls, user_id: uuid.UUID) -> dict:
+        return {"Authorization": f"Bearer {cls.token(user_id)}"}
+
+
+def summarize(latencies: List[float], elapsed: float) -> dict:
+    """latencies in seconds -> count, throughput and percentiles in ms"""
+    if not latencies:
+        return {"count": 0}
+    ordered = sorted(latencies)
+
+    def pct(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "per_second": round(len(ordered) / elapsed, 1) if elapsed else None,
+        "p50_ms": pct(0.50),
+        "p90_ms": pct(0.90),
+        "p99_ms": pct(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+async def run_concurrent(count: int, concurrency: int, call: Callable[[int], Awaitable[int]]) -> dict:
+    """Run ``call(i)`` for i in range(count), at most ``concurrency`` in flight; call returns an HTTP status."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            status = await call(i)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    result = summarize(latencies, time.perf_counter() - start)
+    result["statuses"] = {str(status): n for status, n in sorted(statuses.items())}
+    return result
+
+
+async def bench_auth(bench: Bench, client: httpx.AsyncClient, args) -> dict:
+    """sign-up then sign-in throughput, both bound by bcrypt in the hashing pool"""
+    run = uuid.uuid4().hex[:8]
+
+    def email(i: int) -> str:
+        return f"auth-{run}-{i}@bench.io"
+
+    async def sign_up(i: int) -> int:
+        response = await client.post("/auth/sign-up", json={
+            "name": f"auth-{i}", "email_id": email(i), "password": PASSWORD,
+        })
+        return response.status_code
+
+    async def sign_in(i: int) -> int:
+        response = await client.post("/auth/sign-in", json={"email_id": email(i), "password": PASSWORD})
+        return response.status_code
+
+    return {
+        "users": args.auth_users,
+        "concurrency": args.concurrency,
+        "sign_up": await run_concurrent(args.auth_users, args.concurrency, sign_up),
+        "sign_in": await run_concurrent(args.auth_users, args.concurrency, sign_in),
+    }
+
+
+async def bench_users(bench: Bench, client: httpx.AsyncClient, args) -> dict:
+    """first directory page (cold and cached) and a full cursor walk, by total user count"""
+    results = []
+    for size in args.user_counts:
+        if size > bench.user_count:
+            bench.seed_users(size - bench.user_count, prefix=f"dir-{size}")
+        headers = Bench.headers(bench.seed_users(1, prefix=f"dir-viewer-{size}")[0])
+
+        start = time.perf_counter()
+        await client.get("/user/get_all_users", params={"limit": 100}, headers=headers)
+        cold = time.perf_counter() - start
+
+        async def first_page(i: int) -> int:
+            response = await client.get("/user/get_all_users", params={"limit": 100}, headers=headers)
+            return response.status_code
+
+        warm = await run_concurrent(args.requests, args.concurrency, first_page)
+
+        pages, after = 0, None
+        start = time.perf_counter()
+        while True:
+            params = {"limit": 500}
+            if after:
+                params["after"] = after
+            response = await client.get("/user/get_all_users", params=params, headers=headers)
+            pages += 1
+            after = response.json()["data"]["next_cursor"]
+            if not after:
+                break
+        walk = time.perf_counter() - start
+
+        results.append({
+            "users": bench.user_count,
+            "first_page_cold_ms": round(cold * 1000, 3),
+            "first_page": warm,
+            "full_walk": {"pages": pages, "total_ms": round(walk * 1000, 3)},
+        })
+    return {"sizes": results}
+
+
+async def bench_history(bench: Bench, client: httpx.AsyncClient, args) -> dict:
+    """latest page and a deep page of get_past_messages, by conversation size"""
+    results = []
+    for size in args.history_sizes:
+        user_a, user_b = bench.seed_users(2, prefix=f"history-{size}")
+        message_ids = bench.seed_history(user_a, user_b, size)
+        headers = Bench.headers(user_a)
+        deep_cursor = str(message_ids[len(message_ids) // 2])
+
+        async def latest(i: int) -> int:
+            response = await client.get(f"/message/messages/{user_b}", params={"limit": 50}, headers=headers)
+            return response.status_code
+
+        async def deep(i: int) -> int:
+            response = await client.get(
+                f"/message/messages/{user_b}", params={"limit": 50, "before": deep_cursor}, headers=headers,
+            )
+            return response.status_code
+
+        results.append({
+            "messages": size,
+            "latest_page": await run_concurrent(args.requests, args.concurrency, latest),
+            "deep_page": await run_concurrent(args.requests, args.concurrency, deep),
+        })
+    return {"sizes": results}
+
+
+async def bench_ws_size(bench: Bench, client: httpx.AsyncClient, args, sockets: int) -> dict:
+    users = bench.seed_users(sockets, prefix=f"ws-{sockets}-{uuid.uuid4().hex[:6]}")
+    # message i goes from socket i to socket i + 1, pre-create those conversations
+    for i in range(sockets):
+        bench.seed_conversation(users[i], users[(i + 1) % sockets])
+
+    connections = [None] * sockets
+    connect_latencies: List[float] = []
+    semaphore = asyncio.Semaphore(args.connect_concurrency)
+    subprotocols = [args.subprotocol] if args.subprotocol else None
+    codec = CODECS.get(args.subprotocol, DEFAULT_CODEC)
+
+    async def open_socket(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            connections[i] = await connect(
+                f"{WS_URL}?token={Bench.token(users[i])}",
+                subprotocols=subprotocols,
+                open_timeout=60,
+                ping_interval=None,
+                max_queue=None,
+                compression=None,
+            )
+            connect_latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(open_socket(i) for i in range(sockets)))
+    connect_elapsed = time.perf_counter() - start
+
+    sent_at: Dict[int, float] = {}
+    delivery: List[float] = []
+    all_delivered = asyncio.Event()
+    total = args.ws_messages
+
+    async def read(ws):
+        try:
+            async for raw in ws:
+                frame = codec.decode(raw)
+                if frame.get("type") != "message":
+                    continue
+                delivery.append(time.perf_counter() - sent_at[int(frame["content"])])
+                if len(delivery) >= total:
+                    all_delivered.set()
+        except Exception:
+            pass
+
+    readers = [asyncio.create_task(read(ws)) for ws in connections]
+
+    # paced sending, so latency is measured at a known offered rate
+    interval = 1 / args.ws_rate
+    send_start = time.perf_counter()
+    for n in range(total):
+        i = n % sockets
+        delay = send_start + n * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        sent_at[n] = time.perf_counter()
+        await connections[i].send(codec.encode({
+            "type": "message", "content": str(n), "receiver_id": str(users[(i + 1) % sockets]),
+        }))
+    try:
+        await asyncio.wait_for(all_delivered.wait(), timeout=args.ws_timeout)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - send_start
+    internal = {"X-Internal-Token": os.environ["INTERNAL_API_TOKEN"]}
+    server_stats = (await client.get("/stats", headers=internal)).json()
+    server_memory = (await client.get("/stats/memory", headers=internal)).json()
+
+    await asyncio.gather(*(ws.close() for ws in connections), return_exceptions=True)
+    for reader in readers:
+        reader.cancel()
+
+    return {
+        "sockets": sockets,
+        "connect": summarize(connect_latencies, connect_elapsed),
+        "messages_sent": total,
+        "offered_rate": args.ws_rate,
+        "delivery": summarize(delivery, elapsed),
+        "lost": total - len(delivery),
+        "server_stats": server_stats,
+        "server_memory": server_memory,
+    }
+
+
+async def bench_ws(bench: Bench, client: httpx.AsyncClient, args) -> dict:
+    """message rate and end-to-end delivery latency across many concurrent sockets"""
+    return {"runs": [await bench_ws_size(bench, client, args, sockets) for sockets in args.sockets]}
+
+
+SCENARIOS = {
+    "auth": bench_auth,
+    "users": bench_users,
+    "history": bench_history,
+    "ws": bench_ws,
+}
+
+
+def raise_fd_limit():
+    """every socket is a descriptor on both ends, 10k sockets need well over the usual 1024"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def start_redis() -> TcpFakeServer:
+    server = TcpFakeServer(("127.0.0.1", REDIS_PORT), bind_and_activate=False)
+    # the app opens a burst of connections during a connect storm, the default backlog of 5 resets them
+    server.request_queue_size = 1024
+    server.server_bind()
+    server.server_activate()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_app() -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "src.main:app",
+            "--host", "127.0.0.1", "--port", str(APP_PORT),
+            "--log-level", "warning", "--no-access-log",
+        ],
+        cwd=REPO_ROOT,
+        env=os.environ.copy(),
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not come up")
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def main(args):
+    raise_fd_limit()
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    redis_server = start_redis()
+    bench = Bench()
+    bench.create_schema()
+    app = start_app()
+    report = {
+        "started_at": datetime.now().isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": {},
+    }
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=BASE_URL, limits=limits, timeout=120) as client:
+            await wait_ready(client)
+            for name in args.scenarios:
+                print(f"running {name} ...", flush=True)
+                report["results"][name] = await SCENARIOS[name](bench, client, args)
+                print(json.dumps(report["results"][name], indent=2), flush=True)
+    finally:
+        app.terminate()
+        app.wait(timeout=30)
+        redis_server.shutdown()
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+
+def int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", type=lambda v: v.split(","), default=list(SCENARIOS))
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--concurrency", type=int, default=50, help="in-flight HTTP requests")
+    parser.add_argument("--requests", type=int, default=500, help="requests per measured HTTP call")
+    parser.add_argument("--auth-users", type=int, default=200)
+    parser.add_argument("--user-counts", type=int_list, default=[1_000, 10_000, 50_000])
+    parser.add_argument("--history-sizes", type=int_list, default=[100, 10_000, 100_000])
+    parser.add_argument("--sockets", type=int_list, default=[1_000, 5_000, 10_000])
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--ws-messages", type=int, default=20_000)
+    parser.add_argument("--ws-rate", type=float, default=2_000, help="offered messages per second")
+    parser.add_argument("--ws-timeout", type=float, default=30, help="seconds to wait for stragglers")
+    parser.add_argument("--subprotocol", choices=sorted(CODECS), default=None, help="wire encoding, stdlib json if unset")
+    parsed = parser.parse_args()
+    unknown = set(parsed.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    asyncio.run(main(parsed))
@@ -0,0 +1,144 @@
+"""
+Bytes per idle /message/ws connection held by one node, at growing socket counts.
+
+    python -m benchmarks.bench_memory [--sockets 10000,50000,100000] [--rooms-per-user 0]
+
+Connections are registered in-process the way ConnectionManager.connect leaves them,
+each over a Starlette WebSocket with a uvicorn-shaped scope, and the allocations are
+measured with tracemalloc. "socket" is the WebSocket object with its scope, "state" is
+the Connection record plus its share of the registry and the room index.
+"manager estimate" is what GET /stats/memory reports for the same state. The server's
+transport and its buffers are not included, see bench_load for process RSS under load.
+"""
+import argparse
+import asyncio
+import gc
+import os
+import tracemalloc
+import uuid
+from typing import List
+
+for _key, _value in {
+    "POSTGRES_USER": "bench",
+    "POSTGRES_PASSWORD": "bench",
+    "POSTGRES_DB": "bench",
+    "HOST": "127.0.0.1",
+    "DATABASE_URL": "sqlite+aiosqlite:///:memory:",
+    "TEST_DATABASE_URL": "unused",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "600",
+    "INVITE_TOKEN_EXPIRE_TIME": "60",
+    "JWT_SECRET_KEY": "bench-secret",
+    "ALGORITHM": "HS256",
+    "LOG_LEVEL": "WARNING",
+}.items():
+    os.environ.setdefault(_key, _value)
+
+from starlette.websockets import WebSocket  # noqa: E402
+
+from src.core.security import create_access_token  # noqa: E402
+from src.database import redis_client  # noqa: E402
+from src.websocket_manager.connection import Connection  # noqa: E402
+from src.websocket_manager.protocol import DEFAULT_CODEC  # noqa: E402
+from src.websocket_manager.websocker_manger import ConnectionManager  # noqa: E402
+
+
+async def _receive():
+    return {"type": "websocket.receive", "text": "{}"}
+
+
+async def _send(message):
+    pass
+
+
+def scope(token: str, device_id: str) -> dict:
+    return {
+        "type": "websocket",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "scheme": "ws",
+        "server": ("127.0.0.1", 8000),
+        "client": ("10.0.0.1", 40000),
+        "root_path": "",
+        "path": "/message/ws",
+        "raw_path": b"/message/ws",
+        "query_string": f"token={token}&device_id={device_id}".encode(),
+        "headers": [
+            (b"host", b"chat.example.com"),
+            (b"connection", b"Upgrade"),
+            (b"upgrade", b"websocket"),
+            (b"sec-websocket-version", b"13"),
+            (b"sec-websocket-key", os.urandom(16).hex().encode()),
+        ],
+        "subprotocols": [],
+        "state": {},
+        "extensions": {"websocket.http.response": {}},
+    }
+
+
+def traced() -> int:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+async def measure(sockets: int, rooms_per_user: int, room_size: int) -> dict:
+    manager = ConnectionManager(redis_conn=redis_client, node_id="bench")
+    users = [uuid.uuid4() for _ in range(sockets)]
+    # tokens exist before the client connects, they are not the node's memory
+    tokens = [create_access_token(str(user_id)) for user_id in users]
+    room_count = max(1, sockets * rooms_per_user // room_size) if rooms_per_user else 0
+    rooms = [uuid.uuid4() for _ in range(room_count)]
+
+    start = traced()
+    websockets: List[WebSocket] = [
+        WebSocket(scope(token, f"device-{i}"), _receive, _send) for i, token in enumerate(tokens)
+    ]
+    after_sockets = traced()
+    for i, (user_id, websocket) in enumerate(zip(users, websockets)):
+        # what connect() leaves behind for an idle device, without the Redis and database round trips
+        device_id = f"device-{i}"
+        manager.active_connections.setdefault(user_id)[device_id] = Connection(
+            websocket,
+            user_id,
+            max_queue=manager.send_queue_size,
+            slow_policy=manager.slow_consumer_policy,
+            slow_grace=manager.slow_consumer_grace,
+            on_slow_disconnect=manager._on_slow_disconnect,
+            codec=DEFAULT_CODEC,
+            device_id=device_id,
+        )
+        for n in range(rooms_per_user):
+            # a fresh UUID per membership, as loaded from the database
+            await manager._join_local(uuid.UUID(int=rooms[(i + n) % room_count].int), user_id)
+    after_state = traced()
+    return {
+        "sockets": sockets,
+        "socket": (after_sockets - start) / sockets,
+        "state": (after_state - after_sockets) / sockets,
+        "estimate": manager.memory_report()["bytes_per_connection"],
+    }
+
+
+async def run(socket_counts: List[int], rooms_per_user: int, room_size: int):
+    tracemalloc.start()
+    print(f"{'sockets':>8} {'socket B':>9} {'state B':>8} {'total B':>8} {'manager estimate B':>19}")
+    for sockets in socket_counts:
+        result = await measure(sockets, rooms_per_user, room_size)
+        total = result["socket"] + result["state"]
+        print(
+            f"{result['sockets']:>8} {result['socket']:>9.0f} {result['state']:>8.0f}"
+            f" {total:>8.0f} {result['estimate']:>19}"
+        )
+        gc.collect()
+
+
+def int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sockets", type=int_list, default=[10_000, 50_000, 100_000])
+    parser.add_argument("--rooms-per-user", type=int, default=0)
+    parser.add_argument("--room-size", type=int, default=50, help="members per room when rooms are used")
+    args = parser.parse_args()
+    asyncio.run(run(args.sockets, args.rooms_per_user, args.room_size))
@@ -1,24 +1,29 @@
-from http.client import HTTPException
-
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
-from starlette.responses import JSONResponse
 
 from src.core.base_response.base_response import ChatAppResponse
 from src.core.errors import UserAlreadyExists, DataBaseException, ChatAppException
+from src.core.rate_limit import account_limit, rate_limit
 from src.core.security import validate_email, validate_password
 from src.database import get_db
 from src.model.request_models.request_models import UserCreate, UserLogin
+from src.model.response_models.response_models import TokenData, UserIdData
 from src.services.user_service import create_new_user, authenticate_user, create_user_token
 
 auth_router = APIRouter(
     prefix="/auth",
-    tags=["user auth"]
+    tags=["user auth"],
+    default_response_class=ORJSONResponse,
 )
 
 
-@auth_router.post("/sign-up")
+@auth_router.post(
+    "/sign-up",
+    response_model=ChatAppResponse[UserIdData],
+    dependencies=[Depends(rate_limit("sign_up"))],
+)
 async def user_sign_up(user: UserCreate, db: AsyncSession = Depends(get_db)):
     is_valid_email, email_message = validate_email(user.email_id)
     is_valid_password, password_message = validate_password(user.password)
@@ -36,14 +41,20 @@ async def user_sign_up(user: UserCreate, db: AsyncSession = Depends(get_db)):
                 message={
                     "message": "User created successfully"
                 },
-                data={"user_id": user.id},
+                data=UserIdData(user_id=user.id),
             )
     except ChatAppException as e:
         raise e
 
 
-@auth_router.post("/sign-in")
+@auth_router.post(
+    "/sign-in",
+    response_model=ChatAppResponse[TokenData],
+    dependencies=[Depends(rate_limit("sign_in"))],
+)
 async def user_sign_in(user: UserLogin, db: AsyncSession = Depends(get_db)):
+    # checked before the password hash is, attempts against one account add up across IPs
+    await account_limit("sign_in_account", user.email_id)
     user = await authenticate_user(user=user, db=db)
     if user is not None:
         access_token = await create_user_token(user, db)
@@ -52,10 +63,7 @@ async def user_sign_in(user: UserLogin, db: AsyncSession = Depends(get_db)):
             message={
                 "message": "user logged in successfully"
             },
-            data={
-                "access_token": access_token,
-                "user_id": user.id
-            }
+            data=TokenData(access_token=access_token, user_id=user.id)
         )
     else:
-        return status.HTTP_503_SERVICE_UNAVAILABLE
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
\ No newline at end of file
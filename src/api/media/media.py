@@ -0,0 +1,110 @@
+import uuid
+
+from fastapi import APIRouter, Depends, Request, Response
+from fastapi.responses import FileResponse, ORJSONResponse, RedirectResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from src.config import Config
+from src.core.base_response.base_response import ChatAppResponse
+from src.database import get_db
+from src.model.media import Media
+from src.model.request_models.request_models import MediaUploadCreate
+from src.model.response_models.response_models import MediaUpload
+from src.model.user import User
+from src.services.media_service import (
+    complete_upload,
+    create_upload,
+    get_readable_media,
+    get_upload,
+    write_chunk,
+)
+from src.services.media_storage import media_storage
+from src.services.user_service import get_current_user
+
+router = APIRouter(tags=["Media"], prefix="/media", default_response_class=ORJSONResponse)
+
+
+def _upload_state(media: Media) -> MediaUpload:
+    return MediaUpload(
+        media_id=media.id,
+        content_type=media.content_type,
+        size=media.size,
+        offset=media.received,
+        chunk_size=Config.MEDIA_CHUNK_SIZE,
+        complete=media.is_complete,
+    )
+
+
+@router.post("/uploads", response_model=ChatAppResponse[MediaUpload], status_code=status.HTTP_201_CREATED)
+async def start_upload(
+    upload: MediaUploadCreate,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+):
+    media = await create_upload(session, current_user.id, upload.content_type, upload.size)
+    return ChatAppResponse(status_code=status.HTTP_201_CREATED, message="Upload started", data=_upload_state(media))
+
+
+@router.put("/uploads/{media_id}", response_model=ChatAppResponse[MediaUpload])
+async def upload_chunk(
+    media_id: uuid.UUID,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    Append one chunk, the body is streamed to storage as it arrives.
+    On 409 resume from the ``Upload-Offset`` response header.
+    """
+    media = await get_upload(session, media_id, current_user.id)
+    media = await write_chunk(session, media, request.headers.get("content-range"), request.stream())
+    return ChatAppResponse(status_code="200", message="Chunk stored", data=_upload_state(media))
+
+
+@router.head("/uploads/{media_id}")
+async def upload_offset(
+    media_id: uuid.UUID,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+):
+    media = await get_upload(session, media_id, current_user.id)
+    return Response(headers={
+        "Upload-Offset": str(media.received),
+        "Upload-Length": str(media.size),
+        "Cache-Control": "no-store",
+    })
+
+
+@router.post("/uploads/{media_id}/complete", response_model=ChatAppResponse[MediaUpload])
+async def finish_upload(
+    media_id: uuid.UUID,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+):
+    media = await get_upload(session, media_id, current_user.id)
+    media = await complete_upload(session, media)
+    return ChatAppResponse(status_code="200", message="Upload complete", data=_upload_state(media))
+
+
+@router.get("/{media_id}")
+async def download(
+    media_id: uuid.UUID,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    Serve the file to its uploader or anyone it was sent to. Object storage
+    answers with a redirect to a signed URL; local files honour Range requests.
+    """
+    media = await get_readable_media(session, media_id, current_user.id)
+    url = media_storage.url(media.storage_key)
+    if url is not None:
+        return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+    if Config.MEDIA_ACCEL_REDIRECT_PREFIX:
+        # the proxy sends the file itself with sendfile
+        return Response(
+            media_type=media.content_type,
+            headers={"X-Accel-Redirect": f"{Config.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{media.storage_key}"},
+        )
+    return FileResponse(media_storage.path(media.storage_key), media_type=media.content_type)
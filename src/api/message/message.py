@@ -1,107 +1,318 @@
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 import uuid
 
-from fastapi import APIRouter, Depends, Query, WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import selectinload
-from sqlmodel import select
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, WebSocketException
+from fastapi.responses import ORJSONResponse
 from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette import status
 
-from src.database import get_db
-from src.model.message import Message, MessageRead
+from src.core.base_response.base_response import ChatAppResponse
+from src.core.log import get_logger
+from src.core.rate_limit import frame_retry_after
+from src.core.security import make_naive
+from src.database import async_session_maker, get_db
+from src.model.conversation import DIRECT
+from src.model.message import MessageRead
+from src.model.response_models.response_models import (
+    ConversationPage,
+    ConversationReceipts,
+    ConversationSummary,
+    MessageSearchHit,
+    MessageSearchPage,
+    ParticipantReceipts,
+)
 from src.model.user import User
+from src.services.message_writer import message_writer
+from src.services.principal_cache import principal_cache
+from src.services.media_service import MEDIA_KINDS, get_sendable_media
+from src.services.message_service import (
+    get_conversation_id,
+    get_conversation_members,
+    get_message_page,
+    get_or_create_conversation,
+    get_participants,
+    list_conversations,
+    mark_conversation_read,
+)
+from src.services.receipt_service import RECEIPT_KINDS, receipt_service
+from src.services.search_service import search_messages
 from src.services.user_service import get_current_user, get_current_user_ws
+from src.websocket_manager.connection import Connection
+from src.websocket_manager.protocol import FrameError, receive_frame, send_frame
 from src.websocket_manager.websocker_manger import manager
 
-router = APIRouter(tags=["Message Management"], prefix="/message")
+logger = get_logger(__name__)
+
+router = APIRouter(tags=["Message Management"], prefix="/message", default_response_class=ORJSONResponse)
 
+# Connect with ?token=...&device_id=... where device_id is a stable id the client
+# keeps per device (up to 64 characters). Every device of a user gets the user's
+# messages, including the ones the user sent from another device. A device that
+# reconnects with its device_id first receives everything it missed in one
+# {"type": "sync", "messages": [...], "more": false, "cursor": "..."}
+# (with more = true, page the rest through the history endpoints). Reconnecting
+# the same device_id replaces the old socket without going offline.
+#
+# Frames are JSON text by default. A frame of an unknown type or with a missing or
+# malformed field is answered with {"type": "error", "message": "..."}. Request the "chat.json" (orjson) or
+# "chat.msgpack" (binary) subprotocol for the compact encodings, see
+# src/websocket_manager/protocol.py for the frame shapes.
+#
 # Example JSON
 # {
 #     "type": "message",
 #     "content": "hello",
-#     "receiver_id": "b80746f2-c937-4087-b76b-03e010675a74"
+#     "receiver_id": "b80746f2-c937-4087-b76b-03e010675a74",
+#     "client_id": "optional, echoed back in the persisted ack"
 # }
+#
+# Once the message is committed the sender receives
+# {"type": "ack", "status": "persisted", "messages": [{"message_id": ..., "client_id": ...}]}
+#
+# Offline messages arrive in batches of
+# {"type": "offline_messages", "batch_id": 1, "messages": [...], "remaining": 0}
+# and are only removed from the queue once acknowledged with
+# {"type": "offline_ack", "batch_id": 1}
+#
+# Presence is opt-in per contact:
+# {"type": "presence_subscribe", "user_ids": ["..."]} (up to 500 ids) answers with the current
+# {"type": "presence", "users": {"<id>": true}} and then streams
+# {"type": "status_update", "user_id": "...", "is_online": false} deltas.
+# Any frame counts as a heartbeat, idle clients send {"type": "heartbeat"}.
+#
+# Images and videos are uploaded first through /media/uploads, the frame only
+# references the completed upload, the content is an optional caption:
+# {"type": "image", "media_id": "...", "receiver_id": "...", "content": "look"}
+# The receiver gets the same frame shape as a message plus the media_id, and
+# downloads the file from GET /media/{media_id}.
+#
+# Chat frames are rate limited per user (RATE_LIMIT_WS_FRAMES). Over the limit the
+# frame is dropped and the sender gets
+# {"type": "error", "code": "rate_limited", "retry_after": 1.5, "client_id": ...}
+#
+# Receipts acknowledge everything up to the newest message received or seen,
+# echoing the fields of that message's frame:
+# {"type": "delivered" | "read", "conversation_id": "...", "message_id": "...", "timestamp": "..."}
+# Marks are written in batches, after which the other participants get
+# {"type": "receipt", "status": "read", "conversation_id": ..., "user_id": ...,
+#  "message_id": ..., "timestamp": ...}
+# Send one receipt for the newest message, not one per message.
+#
+# When the server is taking in a wave of reconnects it may answer the handshake with
+# {"type": "reconnect", "retry_after": 7.3}
+# and close with 1013 (try again later). Wait retry_after seconds before reconnecting,
+# the value is already jittered. Presence deltas may then arrive batched as
+# {"type": "presence", "users": {"<id>": true, ...}} instead of one status_update each.
+#
+# Rooms are created and managed through /rooms. Post to a room with room_id in
+# place of receiver_id:
+# {"type": "message", "content": "hi all", "room_id": "..."}
+# Members that are online get the frame with room_id set, the others catch up
+# from GET /rooms/{room_id}/messages. Joining or leaving a room is announced as
+# {"type": "room_joined" | "room_left", "room_id": "..."}
+
+
+async def record_receipt(conn: Connection, data: dict):
+    """Validate a delivered / read frame and queue its mark, the write happens in batches."""
+    try:
+        conversation_id = uuid.UUID(data["conversation_id"])
+        message_id = uuid.UUID(data["message_id"])
+        # an offset is allowed, marks are kept naive on the server clock like every other timestamp
+        timestamp = make_naive(datetime.fromisoformat(data["timestamp"]))
+    except (KeyError, TypeError, ValueError):
+        conn.send({
+            "type": "error",
+            "message": f"Invalid {data.get('type')} receipt – must include conversation_id, message_id and timestamp"
+        })
+        return
+    if manager.in_room(conn.user_id, conversation_id):
+        # room marks are stored but not pushed, a receipt per member would cost more
+        # than the message itself; members read them from the receipts endpoint
+        notify = []
+    else:
+        async with async_session_maker() as session:
+            members = await get_conversation_members(session, conversation_id)
+        if members is None or conn.user_id not in members:
+            conn.send({"type": "error", "message": "Conversation not found"})
+            return
+        notify = [member for member in members if member != conn.user_id]
+    receipt_service.record(
+        data["type"],
+        conversation_id,
+        conn.user_id,
+        message_id,
+        # a mark can never run ahead of the server clock
+        min(timestamp, datetime.now()),
+        notify=notify,
+    )
+
 
 @router.websocket("/ws")
-async def websocket_endpoint(
-    websocket: WebSocket,
-    session: AsyncSession = Depends(get_db),
-):
-    # 1) authenticate
-    user = await get_current_user_ws(websocket, session)
-    # 2) register connection
-    await manager.connect(websocket, user.id)
+async def websocket_endpoint(websocket: WebSocket):
+    # 0) admission, during a reconnect storm the handshake is deferred before any database work
+    retry_after = await manager.admission.admit()
+    if retry_after:
+        await manager.admission.reject(websocket, retry_after)
+        return
+    try:
+        # sessions are opened per DB operation, an idle socket must not pin a pooled connection
+        # 1) authenticate
+        async with async_session_maker() as session:
+            user = await get_current_user_ws(websocket, session)
+        # 2) register this device, clients that keep a device_id resume from its cursor on reconnect
+        # without one the socket gets a throwaway id and nothing is stored for it
+        device_id = websocket.query_params.get("device_id")
+        resumable = bool(device_id)
+        if not resumable:
+            device_id = uuid.uuid4().hex
+        elif len(device_id) > 64:
+            raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="device_id is too long")
+        conn = await manager.connect(websocket, user.id, device_id, resumable=resumable)
+    finally:
+        manager.admission.release()
 
     try:
         while True:
             try:
-                data = await websocket.receive_json()
+                data = await receive_frame(websocket, conn.codec)
             except WebSocketDisconnect:
                 # client closed the socket
                 break
+            except FrameError as e:
+                # unknown type or a field that does not fit the envelope, the socket stays up
+                conn.touch()
+                conn.send({"type": "error", "message": str(e)})
+                continue
+
+            conn.touch()
+
+            # control frames that carry no chat payload
+            if data.get("type") == "heartbeat":
+                continue
+            if data.get("type") == "offline_ack":
+                await manager.ack_offline(conn, data.get("batch_id"))
+                continue
 
-            # 3) validate payload has all required fields
-            if not all(k in data for k in ("type", "content", "receiver_id")):
-                await websocket.send_json({
+            # flood control, checked before any database or Redis work
+            retry_after = await frame_retry_after(data.get("type"), user.id)
+            if retry_after:
+                conn.send({
                     "type": "error",
-                    "message": "Invalid payload – must include type, content, and receiver_id"
+                    "code": "rate_limited",
+                    "message": f"Too many {data.get('type')} frames, slow down",
+                    "retry_after": round(retry_after, 2),
+                    "client_id": data.get("client_id"),
                 })
                 continue
 
-            # 4) dispatch by message type
+            if data.get("type") == "presence_subscribe":
+                await manager.watch_presence(conn, [uuid.UUID(u) for u in data.get("user_ids", [])])
+                continue
+            if data.get("type") in RECEIPT_KINDS:
+                await record_receipt(conn, data)
+                continue
+
+            # 3) a chat frame, its fields were checked on receipt; addressed to exactly one of a user or a room
             msg_type = data["type"]
-            if msg_type == "message":
-                receiver_uuid = uuid.UUID(data["receiver_id"])
+            if ("receiver_id" in data) == ("room_id" in data):
+                conn.send({
+                    "type": "error",
+                    "message": "Invalid payload – must include either receiver_id or room_id"
+                })
+                continue
 
+            room_id = receiver_uuid = None
+            if "room_id" in data:
+                room_id = uuid.UUID(data["room_id"])
+                # answered from the room index, no query per message
+                if not manager.in_room(user.id, room_id):
+                    conn.send({
+                        "type": "error",
+                        "message": "You are not a member of this room"
+                    })
+                    continue
+            else:
+                receiver_uuid = uuid.UUID(data["receiver_id"])
                 if user.id == receiver_uuid:
-                    await websocket.send_json({
+                    conn.send({
                         "type": "error",
                         "message": "You cannot send a message to yourself"
                     })
                     continue
 
-                # persist
-                msg = Message(
-                    content=data["content"],
-                    sender_id=user.id,
-                    receiver_id=receiver_uuid
-                )
-                session.add(msg)
-                await session.commit()
-                await session.refresh(msg)
-
-                # send
-                await manager.send_personal_message(
-                    msg.content,
-                    receiver_uuid,
-                    user.id
-                )
-
-            elif msg_type == "image":
-                # handle image...
-                await websocket.send_json({"type": "ack", "message": "image received"})
+            # 4) resolve the conversation, and for image / video the uploaded media
+            media_id = None
+            async with async_session_maker() as session:
+                if msg_type in MEDIA_KINDS:
+                    media = await get_sendable_media(session, uuid.UUID(data["media_id"]), user.id, msg_type)
+                    if media is None:
+                        conn.send({
+                            "type": "error",
+                            "message": f"media_id must be your own completed {msg_type} upload"
+                        })
+                        continue
+                    media_id = media.id
+                if room_id is not None:
+                    conversation_id = room_id
+                else:
+                    # answered from the principal cache for anyone recently active
+                    if await principal_cache.get_or_load(receiver_uuid, session) is None:
+                        conn.send({
+                            "type": "error",
+                            "message": "Receiver not found",
+                            "client_id": data.get("client_id"),
+                        })
+                        continue
+                    conversation_id = await get_or_create_conversation(session, user.id, receiver_uuid)
 
-            elif msg_type == "video":
-                # handle video...
-                await websocket.send_json({"type": "ack", "message": "video received"})
+            # 5) persist once, also for a room: queued for the next batch, acked to the sender once committed
+            row = {
+                "id": uuid.uuid4(),
+                "content": data.get("content", ""),
+                "timestamp": datetime.now(),
+                "sender_id": user.id,
+                "receiver_id": receiver_uuid,
+                "conversation_id": conversation_id,
+                "media_id": media_id,
+            }
+            await message_writer.submit(row, client_id=data.get("client_id"))
 
+            # send without waiting for the commit, media goes by reference only
+            meta = {
+                "message_id": str(row["id"]),
+                "conversation_id": str(conversation_id),
+                "timestamp": row["timestamp"].isoformat(),
+            }
+            if media_id is not None:
+                meta["media_id"] = str(media_id)
+            if room_id is not None:
+                # online members only, offline ones catch up from the room history
+                await manager.send_to_room(room_id, {
+                    "type": msg_type,
+                    "content": row["content"],
+                    "sender_id": str(user.id),
+                    "room_id": str(room_id),
+                    **meta,
+                }, exclude_device=device_id)
             else:
-                await websocket.send_json({
-                    "type": "error",
-                    "message": f"Unknown message type: {msg_type}"
-                })
+                meta["receiver_id"] = str(receiver_uuid)
+                await manager.send_personal_message(
+                    row["content"], receiver_uuid, user.id, meta=meta, kind=msg_type, echo_device=device_id,
+                )
 
     except Exception as e:
-        # unexpected server error
-        await websocket.send_json({
+        # unexpected server error, sent directly since the connection is torn down next
+        await send_frame(websocket, conn.codec, {
             "type": "error",
             "message": "Server error processing your message"
         })
-        print(f"[ws error] {e!r}")
+        logger.exception("ws handler error", extra={"fields": {"user_id": user.id}})
 
     finally:
         # cleanup on disconnect
-        await manager.disconnect(user.id)
-        print(f"User {user.id} disconnected.")
+        await manager.disconnect(conn)
+        logger.debug("disconnected", extra={"fields": {"user_id": user.id, "device_id": device_id}})
 
 
 @router.websocket("/hello")
@@ -112,7 +323,7 @@ async def hello(websocket: WebSocket):
             text = await websocket.receive_text()
             await websocket.send_text(f"Message text was: {text}")
     except WebSocketDisconnect:
-        print("Hello socket disconnected.")
+        logger.debug("hello socket disconnected")
 
 
 @router.get(
@@ -121,21 +332,129 @@ async def hello(websocket: WebSocket):
 )
 async def get_past_messages(
     receiver_id: uuid.UUID,
+    before: Optional[uuid.UUID] = Query(None, description="Return messages older than this message id"),
+    after: Optional[uuid.UUID] = Query(None, description="Return messages newer than this message id"),
+    limit: int = Query(50, ge=1, le=200),
     current_user: User = Depends(get_current_user),
     session: AsyncSession = Depends(get_db),
 ) -> List[MessageRead]:
-    stmt = (
-        select(Message)
-        .options(
-            selectinload(Message.sender),
-            selectinload(Message.receiver),
-        )
-        .where(
-            ((Message.sender_id == current_user.id) & (Message.receiver_id == receiver_id)) |
-            ((Message.sender_id == receiver_id) & (Message.receiver_id == current_user.id))
+    """
+    One page of the conversation, oldest first.
+
+    Without a cursor the latest ``limit`` messages are returned. Pass the id of the
+    first message as ``before`` to scroll back, or of the last one as ``after`` to
+    catch up. Paging seeks on (timestamp, id), so every page costs the same.
+    """
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+
+    conversation_id = await get_conversation_id(session, current_user.id, receiver_id)
+    if conversation_id is None:
+        return []
+    return await get_message_page(session, conversation_id, before, after, limit)
+
+
+@router.get(
+    "/search",
+    response_model=ChatAppResponse[MessageSearchPage],
+)
+async def search(
+    q: str = Query(..., min_length=1, max_length=256, description="Words to look for, all of them must match"),
+    receiver_id: Optional[uuid.UUID] = Query(None, description="Only search the conversation with this user"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10_000),
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    Ranked full-text search over the current user's conversations.
+    Pass ``next_offset`` back as ``offset`` for the next page.
+    """
+    conversation_id = None
+    if receiver_id is not None:
+        conversation_id = await get_conversation_id(session, current_user.id, receiver_id)
+        if conversation_id is None:
+            return ChatAppResponse(status_code="200", message="No matching messages", data=MessageSearchPage(results=[]))
+
+    # one extra row tells whether another page exists
+    hits = await search_messages(session, current_user.id, q, conversation_id, limit + 1, offset)
+    page = MessageSearchPage(
+        results=[MessageSearchHit(**message.model_dump(), rank=rank) for message, rank in hits[:limit]],
+        next_offset=offset + limit if len(hits) > limit else None,
+    )
+    return ChatAppResponse(status_code="200", message="Search results", data=page)
+
+
+@router.get(
+    "/conversations",
+    response_model=ChatAppResponse[ConversationPage],
+)
+async def get_conversations(
+    before: Optional[uuid.UUID] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    The inbox: every conversation with its last message and unread count, most
+    recent first. Served from the denormalized counters in one indexed query.
+    """
+    rows = await list_conversations(session, current_user.id, before, limit)
+    conversations = [
+        ConversationSummary(
+            conversation_id=conversation.id,
+            kind=conversation.kind,
+            peer_id=(
+                (conversation.user_high_id if conversation.user_low_id == current_user.id else conversation.user_low_id)
+                if conversation.kind == DIRECT else None
+            ),
+            name=conversation.name,
+            last_message_id=conversation.last_message_id,
+            last_message_preview=conversation.last_message_preview,
+            last_message_at=conversation.last_message_at,
+            last_sender_id=conversation.last_sender_id,
+            unread_count=participant.unread_count,
         )
-        .order_by(Message.timestamp)
+        for conversation, participant in rows
+    ]
+    next_cursor = str(conversations[-1].conversation_id) if len(conversations) == limit else None
+    return ChatAppResponse(
+        status_code="200",
+        message="Conversations retrieved successfully",
+        data=ConversationPage(conversations=conversations, next_cursor=next_cursor),
     )
 
-    result = await session.execute(stmt)
-    return result.scalars().all()
+
+@router.get(
+    "/conversations/{conversation_id}/receipts",
+    response_model=ChatAppResponse[ConversationReceipts],
+)
+async def get_receipts(
+    conversation_id: uuid.UUID,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    Delivered / read marks of every participant, for clients catching up on the
+    receipts they missed while offline.
+    """
+    participants = await get_participants(session, conversation_id)
+    if not any(participant.user_id == current_user.id for participant in participants):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    receipts = ConversationReceipts(
+        conversation_id=conversation_id,
+        participants=[ParticipantReceipts(**participant.model_dump()) for participant in participants],
+    )
+    return ChatAppResponse(status_code="200", message="Receipts retrieved successfully", data=receipts)
+
+
+@router.post("/conversations/{conversation_id}/read", response_model=ChatAppResponse)
+async def read_conversation(
+    conversation_id: uuid.UUID,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+):
+    """Reset the current user's unread count of the conversation."""
+    if not await mark_conversation_read(session, conversation_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return ChatAppResponse(status_code="200", message="Conversation marked as read")
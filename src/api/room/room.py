@@ -0,0 +1,100 @@
+import uuid
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from src.core.base_response.base_response import ChatAppResponse
+from src.database import get_db
+from src.model.conversation import Conversation
+from src.model.message import MessageRead
+from src.model.request_models.request_models import RoomCreate, RoomMembersAdd
+from src.model.response_models.response_models import Room
+from src.model.user import User
+from src.services.message_service import get_message_page
+from src.services.room_service import add_members, count_members, create_room, get_room, remove_member
+from src.services.user_service import get_current_user
+from src.websocket_manager.websocker_manger import manager
+
+router = APIRouter(tags=["Rooms"], prefix="/rooms", default_response_class=ORJSONResponse)
+
+
+async def _room_info(session: AsyncSession, room: Conversation) -> Room:
+    return Room(
+        room_id=room.id,
+        name=room.name,
+        created_by=room.created_by,
+        member_count=await count_members(session, room.id),
+    )
+
+
+@router.post("", response_model=ChatAppResponse[Room], status_code=status.HTTP_201_CREATED)
+async def new_room(
+    body: RoomCreate,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+):
+    room = await create_room(session, current_user.id, body.name, body.member_ids)
+    info = await _room_info(session, room)
+    for user_id in {current_user.id, *body.member_ids}:
+        await manager.notify_membership(user_id, room.id, joined=True)
+    return ChatAppResponse(status_code=status.HTTP_201_CREATED, message="Room created", data=info)
+
+
+@router.get("/{room_id}", response_model=ChatAppResponse[Room])
+async def room_info(
+    room_id: uuid.UUID,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+):
+    room = await get_room(session, room_id, current_user.id)
+    return ChatAppResponse(status_code="200", message="Room retrieved successfully", data=await _room_info(session, room))
+
+
+@router.post("/{room_id}/members", response_model=ChatAppResponse[Room])
+async def join_members(
+    room_id: uuid.UUID,
+    body: RoomMembersAdd,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+):
+    """Any member can add people, users that already are members are skipped."""
+    room = await get_room(session, room_id, current_user.id)
+    for user_id in await add_members(session, room, body.user_ids):
+        await manager.notify_membership(user_id, room.id, joined=True)
+    return ChatAppResponse(status_code="200", message="Members added", data=await _room_info(session, room))
+
+
+@router.delete("/{room_id}/members/{user_id}", response_model=ChatAppResponse)
+async def leave(
+    room_id: uuid.UUID,
+    user_id: uuid.UUID,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+):
+    """Leave the room, or as its creator remove someone else."""
+    room = await get_room(session, room_id, current_user.id)
+    if user_id != current_user.id and room.created_by != current_user.id:
+        raise HTTPException(status_code=403, detail="Only the room creator can remove other members")
+    if not await remove_member(session, room_id, user_id):
+        raise HTTPException(status_code=404, detail="User is not a member of this room")
+    await manager.notify_membership(user_id, room_id, joined=False)
+    return ChatAppResponse(status_code="200", message="Member removed")
+
+
+@router.get("/{room_id}/messages", response_model=List[MessageRead])
+async def room_messages(
+    room_id: uuid.UUID,
+    before: Optional[uuid.UUID] = Query(None, description="Return messages older than this message id"),
+    after: Optional[uuid.UUID] = Query(None, description="Return messages newer than this message id"),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+) -> List[MessageRead]:
+    """One page of the room, oldest first, paged like /message/messages/{receiver_id}."""
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+    await get_room(session, room_id, current_user.id)
+    return await get_message_page(session, room_id, before, after, limit)
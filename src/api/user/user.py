@@ -1,40 +1,63 @@
 """
 Routes for user management.
 """
-from fastapi import APIRouter, Depends, HTTPException
+import uuid
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
 
 from src.core.base_response.base_response import ChatAppResponse
 from src.database import get_db, get_redis
-from src.services.user_service import get_current_user, get_all_users
+from src.model.response_models.response_models import ActiveUsers, UserPage
+from src.services.user_service import get_current_user, get_all_users, get_directory_version
 from src.websocket_manager.websocker_manger import manager
 
-user_router = APIRouter(prefix="/user",tags=["User Management"])
+user_router = APIRouter(prefix="/user",tags=["User Management"], default_response_class=ORJSONResponse)
 
-@user_router.get("/get_all_users")
-async def get_user(db = Depends(get_db),current_user = Depends(get_current_user),redis_conn = Depends(get_redis)):
+@user_router.get("/get_all_users", response_model=ChatAppResponse[UserPage])
+async def get_user(request: Request, response: Response,
+                   after: Optional[uuid.UUID] = Query(None, description="Id of the last user of the previous page"),
+                   limit: int = Query(100, ge=1, le=500),
+                   db = Depends(get_db),current_user = Depends(get_current_user),redis_conn = Depends(get_redis)):
     """
-    Route to get all users.
+    Route to get all users, one page at a time.
+    The ETag changes whenever the directory does, send it back as If-None-Match
+    to get a 304 without touching the database. is_online is read live on every
+    200 and does not move the ETag, follow presence through presence_subscribe.
+    While Redis is unavailable there is no version to vouch for a page, it is
+    served without an ETag.
     """
     try:
-        # Assuming you have a function to get all users
-        users = await get_all_users(db,redis=redis_conn)
-        # return {"users": "hell"}
+        version = await get_directory_version(redis_conn)
+        etag = None
+        if version is not None:
+            etag = f'W/"users-v{version}-{after or "start"}-{limit}"'
+            if request.headers.get("if-none-match") == etag:
+                return Response(status_code=304, headers={"ETag": etag})
+
+        page = await get_all_users(db, redis=redis_conn, after=after, limit=limit, version=version)
+        online = await manager.presence.snapshot(user["id"] for user in page["users"])
+        for user in page["users"]:
+            user["is_online"] = online[user["id"]]
+        if etag is not None:
+            response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "private, no-cache"
         return ChatAppResponse(
             status_code="200",
             message="Users retrieved successfully",
-            data={"users": users}
+            data=page
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@user_router.get("/active_users")
+@user_router.get("/active_users", response_model=ActiveUsers)
 async def get_all_active_users(current_user = Depends(get_current_user)):
     """
     Route to get all active users.
     """
     try:
-        # Assuming you have a function to get all users
-        users = await manager.send_active_users()
-        return {"users": users}
+        users = await manager.active_users()
+        return ActiveUsers(users=users)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
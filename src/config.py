@@ -1,3 +1,7 @@
+import uuid
+from typing import Dict, Literal, Optional
+
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -12,6 +16,111 @@ class Setting(BaseSettings):
     INVITE_TOKEN_EXPIRE_TIME: int
     JWT_SECRET_KEY: str
     ALGORITHM: str
+    REDIS_URL: str = "redis://localhost:6379/0"
+
+    # shared secret for the operator endpoints (/stats, /metrics), they are disabled while unset
+    INTERNAL_API_TOKEN: Optional[str] = None
+
+    # database engine / connection pool
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+
+    # authenticated principal cache, optionally shared through redis
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10_000
+    PRINCIPAL_CACHE_REDIS: bool = False
+
+    # bcrypt runs off the event loop with bounded concurrency
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_BACKLOG: int = 64
+
+    # /user/get_all_users page cache
+    USER_DIRECTORY_CACHE_TTL_SECONDS: int = 300
+
+    # websocket fan-out across workers / nodes
+    WS_DISTRIBUTED: bool = False
+    WS_NODE_ID: str = Field(default_factory=lambda: uuid.uuid4().hex)
+
+    # per-connection outbound queues, policy is "drop" or "disconnect"
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_SLOW_CONSUMER_POLICY: Literal["drop", "disconnect"] = "drop"
+    WS_SLOW_CONSUMER_GRACE_SECONDS: float = 5.0
+
+    # the connection registry is split over this many shards (rounded up to a power of two)
+    WS_REGISTRY_SHARDS: int = 64
+
+    # per-device resume cursors, and how much a reconnecting device is sent in one sync frame
+    WS_DEVICE_CURSOR_TTL_SECONDS: int = 30 * 24 * 3600
+    WS_SYNC_MAX_MESSAGES: int = 500
+
+    # handshake admission on /message/ws: accept rate per node, handshakes in flight, and
+    # the minimum spread of the reconnect hints; presence deltas are coalesced per interval
+    # while deferrals happened within the storm window
+    WS_ADMISSION_ENABLED: bool = True
+    WS_ACCEPT_RATE: str = "200/1"
+    WS_MAX_PENDING_HANDSHAKES: int = 100
+    WS_RECONNECT_JITTER_SECONDS: float = 5.0
+    WS_STORM_WINDOW_SECONDS: float = 10.0
+    WS_STORM_PRESENCE_INTERVAL_SECONDS: float = 2.0
+
+    # offline delivery queue, per user
+    OFFLINE_QUEUE_MAX_LEN: int = 1000
+    OFFLINE_QUEUE_TTL_SECONDS: int = 7 * 24 * 3600
+    OFFLINE_DRAIN_BATCH_SIZE: int = 100
+
+    # presence: heartbeat TTL and the refresh / is_online batch write interval
+    PRESENCE_TTL_SECONDS: int = 60
+    PRESENCE_INTERVAL_SECONDS: float = 5.0
+
+    # write-behind message persistence
+    MESSAGE_BATCH_SIZE: int = 500
+    MESSAGE_BATCH_WINDOW_MS: int = 10
+    MESSAGE_WRITE_QUEUE_SIZE: int = 10_000
+
+    # group rooms, fan-out only touches the members connected to each node
+    ROOM_MAX_MEMBERS: int = 5000
+
+    # delivered / read marks are coalesced and written once per interval
+    RECEIPT_FLUSH_INTERVAL_SECONDS: float = 1.0
+
+    # structured logging, successful requests are sampled, errors and slow ones always logged
+    LOG_LEVEL: str = "INFO"
+    LOG_SAMPLE_RATE: float = Field(default=1.0, ge=0.0, le=1.0)
+    LOG_SLOW_REQUEST_MS: float = 500.0
+
+    # media uploads, every chunk but the last must be MEDIA_CHUNK_SIZE (>= 5 MiB for S3 parts)
+    MEDIA_STORAGE: Literal["local", "s3"] = "local"
+    MEDIA_ROOT: str = "media"
+    MEDIA_MAX_BYTES: int = 100 * 1024 * 1024
+    MEDIA_CHUNK_SIZE: int = 8 * 1024 * 1024
+    MEDIA_S3_BUCKET: Optional[str] = None
+    MEDIA_S3_ENDPOINT_URL: Optional[str] = None
+    MEDIA_S3_REGION: Optional[str] = None
+    MEDIA_URL_TTL_SECONDS: int = 3600
+    # hand local downloads to the reverse proxy (nginx X-Accel-Redirect) instead of streaming them
+    MEDIA_ACCEL_REDIRECT_PREFIX: Optional[str] = None
+
+    # token bucket limits as "<count>/<seconds>", routes per client IP, frames per user;
+    # sign_in_account limits sign-in attempts per account whatever the client IP
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_REDIS: bool = False
+    RATE_LIMIT_ROUTES: Dict[str, str] = {
+        "sign_up": "5/60",
+        "sign_in": "10/60",
+        "sign_in_account": "5/60",
+    }
+    RATE_LIMIT_WS_FRAMES: Dict[str, str] = {
+        "message": "30/10",
+        "image": "10/60",
+        "video": "5/60",
+        "presence_subscribe": "10/60",
+        "delivered": "60/10",
+        "read": "60/10",
+    }
     model_config = SettingsConfigDict(env_file="../.env", extra="ignore",env_file_encoding="utf-8")
 
 
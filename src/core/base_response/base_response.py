@@ -1,11 +1,18 @@
-from pydantic.v1 import BaseModel
+from typing import Generic, Optional, TypeVar
 
+from pydantic import BaseModel, ConfigDict
 
-class ChatAppResponse(BaseModel):
+DataT = TypeVar("DataT")
+
+
+class ChatAppResponse(BaseModel, Generic[DataT]):
     """
     Base response model for all API responses.
+    Parametrize it with the payload model, e.g. ``ChatAppResponse[TokenData]``,
+    so FastAPI serializes the whole envelope in pydantic-core.
     """
+    model_config = ConfigDict(coerce_numbers_to_str=True)
 
     status_code: str
     message: str | dict | None = None
-    data: dict | list | str | None = None
\ No newline at end of file
+    data: Optional[DataT] = None
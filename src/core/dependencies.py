@@ -1,9 +1,13 @@
-from fastapi import HTTPException,Request
+import secrets
+from typing import Optional
+
+from fastapi import Header, HTTPException,Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError
 from jwt import ExpiredSignatureError
 from starlette import status
 
+from src.config import Config
 from src.core.security import get_id_from_token
 
 
@@ -37,3 +41,13 @@ class AccessTokenBearer(HTTPBearer):
                 detail={"error": str(e)},
                 headers={"WWW-Authenticate": "Bearer"},
             )
+
+
+async def internal_only(x_internal_token: Optional[str] = Header(default=None)):
+    """
+    Guard for operator endpoints (node stats, metrics), they answer only to requests carrying
+    INTERNAL_API_TOKEN in ``X-Internal-Token`` and are closed while it is unset.
+    """
+    expected = Config.INTERNAL_API_TOKEN
+    if not expected or not x_internal_token or not secrets.compare_digest(x_internal_token, expected):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Internal endpoint")
@@ -1,6 +1,7 @@
 """
 This file contains all custom error messages.
 """
+import math
 from typing import Any, Callable
 
 from fastapi import FastAPI
@@ -37,6 +38,65 @@ class InvalidCredentials(ChatAppException):
     """
     Provided incorrect Credentials
     """
+
+
+class ServiceOverloaded(ChatAppException):
+    """
+    Too much work queued, the client should retry later
+    """
+
+    def __init__(self, detail=None, retry_after: int = 1):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class RateLimitExceeded(ChatAppException):
+    """
+    Client went over its request budget
+    """
+
+    def __init__(self, retry_after: float = 1):
+        super().__init__()
+        self.detail = None
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class MediaNotFound(ChatAppException):
+    """
+    Media does not exist or the user may not access it
+    """
+
+
+class InvalidUpload(ChatAppException):
+    """
+    Upload request that can never succeed (bad type, size or range)
+    """
+
+
+class UploadOffsetMismatch(ChatAppException):
+    """
+    Chunk does not start where the stored upload ends, the client should resume from ``offset``
+    """
+
+    def __init__(self, offset: int):
+        super().__init__(f"expected offset {offset}")
+        self.detail = f"expected offset {offset}"
+        self.offset = offset
+
+
+class RoomNotFound(ChatAppException):
+    """
+    Room does not exist or the user is not a member
+    """
+
+
+class InvalidRoomMembers(ChatAppException):
+    """
+    Unknown users or a room over its member limit
+    """
+
+
 def create_exception_handler(
         status_code: int, initial_detail: Any
 ) -> Callable[[Request, Exception], JSONResponse]:
@@ -54,7 +114,12 @@ def create_exception_handler(
         elif str(exc):
             detail["message"] = f"{detail['message']} {str(exc)}"
 
-        return JSONResponse(content=detail, status_code=status_code)
+        headers = None
+        if getattr(exc, "retry_after", None) is not None:
+            headers = {"Retry-After": str(exc.retry_after)}
+        if getattr(exc, "offset", None) is not None:
+            headers = {"Upload-Offset": str(exc.offset)}
+        return JSONResponse(content=detail, status_code=status_code, headers=headers)
 
     return exception_handler
 
@@ -95,6 +160,76 @@ def register_all_errors(app: FastAPI):
             },
         )
     )
+    app.add_exception_handler(
+        ServiceOverloaded,
+        create_exception_handler(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            initial_detail={
+                "message": "service is busy, please retry shortly:",
+                "error_code": "service_overloaded",
+            },
+        )
+    )
+    app.add_exception_handler(
+        RateLimitExceeded,
+        create_exception_handler(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            initial_detail={
+                "message": "too many requests, please slow down",
+                "error_code": "rate_limited",
+            },
+        )
+    )
+    app.add_exception_handler(
+        MediaNotFound,
+        create_exception_handler(
+            status_code=status.HTTP_404_NOT_FOUND,
+            initial_detail={
+                "message": "media not found",
+                "error_code": "media_not_found",
+            },
+        )
+    )
+    app.add_exception_handler(
+        InvalidUpload,
+        create_exception_handler(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            initial_detail={
+                "message": "invalid upload:",
+                "error_code": "invalid_upload",
+            },
+        )
+    )
+    app.add_exception_handler(
+        UploadOffsetMismatch,
+        create_exception_handler(
+            status_code=status.HTTP_409_CONFLICT,
+            initial_detail={
+                "message": "upload offset mismatch,",
+                "error_code": "upload_offset_mismatch",
+            },
+        )
+    )
+    app.add_exception_handler(
+        RoomNotFound,
+        create_exception_handler(
+            status_code=status.HTTP_404_NOT_FOUND,
+            initial_detail={
+                "message": "room not found",
+                "error_code": "room_not_found",
+            },
+        )
+    )
+    app.add_exception_handler(
+        InvalidRoomMembers,
+        create_exception_handler(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            initial_detail={
+                "message": "invalid room members:",
+                "error_code": "invalid_room_members",
+            },
+        )
+    )
     app.add_exception_handler(
         InvalidCredentials,
         create_exception_handler(
@@ -0,0 +1,71 @@
+"""
+Structured JSON logging.
+
+Loggers under ``chat_app`` only put records on an in-memory queue; a QueueListener
+thread formats them as one JSON object per line and writes them to stdout, so the
+event loop never waits on the stdout lock.
+"""
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+import orjson
+
+from src.config import Config
+
+ROOT_LOGGER = "chat_app"
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record. Structured fields are passed as
+    ``extra={"fields": {...}}`` and merged into the top level.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        return orjson.dumps(entry, default=str).decode()
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def setup_logging():
+    """Attach the queue handler and start the writer thread, safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        return
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter())
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(Config.LOG_LEVEL)
+    root.addHandler(QueueHandler(log_queue))
+    root.propagate = False
+
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
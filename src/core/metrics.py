@@ -0,0 +1,67 @@
+"""
+Prometheus metrics, served on /metrics.
+
+Hot paths only bump counters and observe histograms, which are a lock and an add.
+Values that already exist somewhere (socket and queue counts, pool usage) are read
+at scrape time through StatsCollector instead of being mirrored on every change.
+"""
+from typing import Callable, Iterator
+
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+
+MESSAGES_DELIVERED = Counter(
+    "chat_messages_delivered_total",
+    "Chat messages handed to a live socket, on this node or through the broker",
+    ["route"],
+)
+MESSAGES_OFFLINE = Counter(
+    "chat_messages_offline_queued_total",
+    "Chat messages queued for offline delivery",
+)
+MESSAGES_PERSISTED = Counter(
+    "chat_messages_persisted_total",
+    "Chat messages written by the batch writer",
+    ["status"],
+)
+MESSAGE_BATCH_SIZE = Histogram(
+    "chat_message_batch_size",
+    "Rows per message writer flush",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+MESSAGE_FLUSH_DURATION = Histogram(
+    "chat_message_flush_duration_seconds",
+    "Time spent in one message writer flush",
+)
+WS_FANOUT_DURATION = Histogram(
+    "ws_fanout_duration_seconds",
+    "Time to enqueue one frame on every target socket",
+    ["kind"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+
+
+class StatsCollector(Collector):
+    """
+    Expose the numeric values of a ``stats()`` style dict as gauges.
+
+    :param prefix: metric name prefix, e.g. ``ws`` gives ``ws_connections``
+    :param stats: called on every scrape
+    """
+
+    def __init__(self, prefix: str, stats: Callable[[], dict]):
+        self.prefix = prefix
+        self.stats = stats
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        for key, value in self.stats().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            yield GaugeMetricFamily(f"{self.prefix}_{key}", f"{self.prefix} {key.replace('_', ' ')}", value=value)
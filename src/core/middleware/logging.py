@@ -2,13 +2,20 @@
 Used to log request and response times with proper error handling.
 """
 import logging
+import random
 import time
 
 from fastapi import FastAPI, Request
 from starlette.middleware.cors import CORSMiddleware
 
-logger = logging.getLogger("uvicorn.access")
-logger.disabled = True
+from src.config import Config
+from src.core.log import get_logger
+from src.core.metrics import HTTP_REQUEST_DURATION
+
+# the access line below replaces uvicorn's own
+logging.getLogger("uvicorn.access").disabled = True
+
+access_logger = get_logger("access")
 
 
 def register_middleware(app: FastAPI):
@@ -20,15 +27,32 @@ def register_middleware(app: FastAPI):
 
     @app.middleware("http")
     async def custom_logging(request: Request, call_next):
-        start_time = time.time()
+        start_time = time.perf_counter()
         response = await call_next(request)
-        processing_time = time.time() - start_time
-        message = (
-            f"Request from "
-            f"{request.client.host}:{request.client.port} - {request.method} "
-            f"- {request.url.path} - {response.status_code} completed after {processing_time:.2f}s"
-        )
-        print(message)
+        duration = time.perf_counter() - start_time
+        # label by route template, raw paths would explode the series count
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.labels(
+            request.method, route.path if route is not None else "unmatched", response.status_code,
+        ).observe(duration)
+        duration_ms = duration * 1000
+        if not access_logger.isEnabledFor(logging.INFO):
+            return response
+        # errors and slow requests are always kept, the rest is sampled
+        if (
+            response.status_code < 400
+            and duration_ms < Config.LOG_SLOW_REQUEST_MS
+            and random.random() >= Config.LOG_SAMPLE_RATE
+        ):
+            return response
+        client = request.client
+        access_logger.info("request", extra={"fields": {
+            "client": f"{client.host}:{client.port}" if client else None,
+            "method": request.method,
+            "path": request.url.path,
+            "status": response.status_code,
+            "duration_ms": round(duration_ms, 3),
+        }})
         return response
 
 
@@ -0,0 +1,164 @@
+"""
+Token bucket rate limiting for the auth routes and WebSocket frames.
+
+Limits are written ``"<count>/<seconds>"``: a burst of ``count`` and a refill of
+``count / seconds`` tokens per second. Routes are limited per client IP, sign-in
+additionally per account, so a credential stuffing run spread over many IPs is
+still throttled. Each worker keeps its own buckets, so an
+over-limit client is rejected with no I/O at all. With RATE_LIMIT_REDIS the
+buckets are additionally shared through Redis, so the limit holds across workers.
+"""
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from cachetools import TTLCache
+from fastapi import Request
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.config import Config
+from src.core.errors import RateLimitExceeded
+from src.core.log import get_logger
+from src.database import redis_client
+
+logger = get_logger(__name__)
+
+# KEYS[1] bucket, ARGV rate per second, burst, cost -> seconds until allowed, 0 if allowed now
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(wait)
+"""
+
+
+def parse_limit(spec: str) -> Tuple[int, float]:
+    """``"30/10"`` -> (burst 30, 3.0 tokens per second)"""
+    count, seconds = spec.split("/", 1)
+    return int(count), int(count) / float(seconds)
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        name: str,
+        spec: str,
+        redis: Optional[Redis] = None,
+        max_keys: int = 100_000,
+    ):
+        self.name = name
+        self.burst, self.rate = parse_limit(spec)
+        self.redis = redis
+        # an evicted bucket was idle long enough to be full again
+        self._buckets: TTLCache = TTLCache(maxsize=max_keys, ttl=self.burst / self.rate)
+        self._script = redis.register_script(_TOKEN_BUCKET_LUA) if redis is not None else None
+        self.rejected = 0
+
+    def _take_local(self, key: str, cost: float) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = _Bucket(self.burst, now)
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+        # re-set on every hit to push the idle expiry forward
+        self._buckets[key] = bucket
+        if bucket.tokens >= cost:
+            bucket.tokens -= cost
+            return 0.0
+        return (cost - bucket.tokens) / self.rate
+
+    async def retry_after(self, key: str, cost: float = 1) -> float:
+        """
+        Take ``cost`` tokens from the bucket of ``key``.
+
+        :return: 0 if allowed, otherwise the seconds until it would be
+        """
+        wait = self._take_local(key, cost)
+        if not wait and self._script is not None:
+            try:
+                wait = float(await self._script(keys=[f"ratelimit:{self.name}:{key}"], args=[self.rate, self.burst, cost]))
+            except RedisError as e:
+                # shared limit unavailable, the local bucket still applies
+                logger.warning("rate limit redis check failed", extra={"fields": {"error": repr(e)}})
+        if wait:
+            self.rejected += 1
+        return wait
+
+    async def hit(self, key: str, cost: float = 1):
+        """
+        :raises: RateLimitExceeded
+        """
+        wait = await self.retry_after(key, cost)
+        if wait:
+            raise RateLimitExceeded(retry_after=wait)
+
+
+def _build(limits: Dict[str, str]) -> Dict[str, RateLimiter]:
+    redis = redis_client if Config.RATE_LIMIT_REDIS else None
+    return {name: RateLimiter(name, spec, redis=redis) for name, spec in limits.items()}
+
+
+route_limiters = _build(Config.RATE_LIMIT_ROUTES)
+frame_limiters = _build(Config.RATE_LIMIT_WS_FRAMES)
+
+
+def rate_limit(name: str) -> Callable:
+    """
+    Route dependency limiting requests per client IP with the ``name`` limit,
+    runs before the endpoint does any database or hashing work.
+    """
+    limiter = route_limiters.get(name)
+
+    async def dependency(request: Request):
+        if limiter is None or not Config.RATE_LIMIT_ENABLED:
+            return
+        client = request.client.host if request.client else "unknown"
+        await limiter.hit(f"ip:{client}")
+
+    return dependency
+
+
+async def account_limit(name: str, email: str):
+    """
+    Limit requests per account with the ``name`` limit, for routes whose account
+    is only known from the body.
+
+    :param email: the account's email, case and surrounding spaces are ignored
+    :raises: RateLimitExceeded
+    """
+    limiter = route_limiters.get(name)
+    if limiter is None or not Config.RATE_LIMIT_ENABLED:
+        return
+    await limiter.hit(f"account:{email.strip().lower()}")
+
+
+async def frame_retry_after(frame_type: str, user_id) -> float:
+    """seconds ``user_id`` has to wait before sending another ``frame_type`` frame, 0 if allowed"""
+    limiter = frame_limiters.get(frame_type)
+    if limiter is None or not Config.RATE_LIMIT_ENABLED:
+        return 0.0
+    return await limiter.retry_after(f"user:{user_id}")
@@ -1,5 +1,7 @@
+import asyncio
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 
 from jose import jwt, JWTError
@@ -7,6 +9,7 @@ from passlib.context import CryptContext
 from pydantic import BaseModel
 
 from src.config import Config
+from src.core.errors import ServiceOverloaded
 
 password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -52,6 +55,46 @@ def verify_password(password: str, hashed_pass: str) -> bool:
     return password_context.verify(password, hashed_pass)
 
 
+class PasswordHashPool:
+    """
+    Runs bcrypt in a dedicated thread pool so hashing never blocks the event loop
+    (bcrypt releases the GIL, threads are enough). At most ``workers`` hashes run at
+    once and up to ``max_backlog`` more may wait; beyond that calls are rejected
+    immediately instead of queueing behind a login storm.
+    """
+
+    def __init__(self, workers: int, max_backlog: int):
+        self.workers = workers
+        self.max_backlog = max_backlog
+        self.in_flight = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+
+    async def run(self, fn, *args):
+        if self.in_flight >= self.workers + self.max_backlog:
+            self.rejected += 1
+            raise ServiceOverloaded(detail="too many sign-in attempts in progress")
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+
+
+password_hash_pool = PasswordHashPool(
+    workers=Config.PASSWORD_HASH_WORKERS,
+    max_backlog=Config.PASSWORD_HASH_MAX_BACKLOG,
+)
+
+
+async def get_hashed_password_async(password: str) -> str:
+    return await password_hash_pool.run(get_hashed_password, password)
+
+
+async def verify_password_async(password: str, hashed_pass: str) -> bool:
+    return await password_hash_pool.run(verify_password, password, hashed_pass)
+
+
 def get_verify_token(token_payload: TokenPayload):
     subject = token_payload.sub
     exp = datetime.now() + timedelta(
@@ -59,7 +102,6 @@ def get_verify_token(token_payload: TokenPayload):
     )
     to_encode = {"exp": exp, "sub": subject}
     verify_token = jwt.encode(to_encode, Config.JWT_SECRET_KEY, Config.ALGORITHM)
-    print("verify_token", verify_token)
     return verify_token
 
 
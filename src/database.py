@@ -1,13 +1,28 @@
 from typing import Any, AsyncGenerator
 
 from redis.asyncio import Redis
+from sqlalchemy import Connection
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlmodel import SQLModel
 
 from src.config import Config
 
+def _engine_options() -> dict:
+    """pool settings from Config, sqlite has no connection pool to tune"""
+    options = {"echo": Config.DB_ECHO}
+    if not Config.DATABASE_URL.startswith("sqlite"):
+        options.update(
+            pool_size=Config.DB_POOL_SIZE,
+            max_overflow=Config.DB_MAX_OVERFLOW,
+            pool_timeout=Config.DB_POOL_TIMEOUT,
+            pool_recycle=Config.DB_POOL_RECYCLE,
+            pool_pre_ping=Config.DB_POOL_PRE_PING,
+        )
+    return options
+
+
 async_engine = create_async_engine(
-    url= Config.DATABASE_URL, echo=True
+    url= Config.DATABASE_URL, **_engine_options()
 )
 
 async_session_maker = async_sessionmaker(
@@ -17,12 +32,45 @@ async_session_maker = async_sessionmaker(
 )
 
 
-redis_client: Redis = Redis(host="localhost", port=6379, decode_responses=True)
+redis_client: Redis = Redis.from_url(Config.REDIS_URL, decode_responses=True)
+
+# Postgres gets its search index (a generated tsvector column) from Alembic.
+# SQLite has no migrations here, so the FTS5 stand-in is created with the tables,
+# as an external-content index over messages kept in sync by triggers.
+SQLITE_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE messages_fts USING fts5(content, content='messages', content_rowid='rowid')",
+    """CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content) VALUES (new.rowid, new.content);
+    END""",
+    """CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+    END""",
+    """CREATE TRIGGER messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+        INSERT INTO messages_fts(rowid, content) VALUES (new.rowid, new.content);
+    END""",
+    # index whatever was there before the table existed
+    "INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')",
+)
+
+
+def create_sqlite_search_index(conn: Connection) -> None:
+    """create the FTS5 message index once, no-op when it already exists"""
+    exists = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+    ).first()
+    if exists:
+        return
+    for statement in SQLITE_SEARCH_DDL:
+        conn.exec_driver_sql(statement)
+
 
 async def init_db() -> None:
     """initializing database"""
     async with async_engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
+        if async_engine.dialect.name == "sqlite":
+            await conn.run_sync(create_sqlite_search_index)
 
 
 async def get_db() -> AsyncGenerator[AsyncSession | Any, Any]:
@@ -35,4 +83,21 @@ async def get_db() -> AsyncGenerator[AsyncSession | Any, Any]:
 
 async def get_redis() -> Redis:
     """getting redis client"""
-    return redis_client
\ No newline at end of file
+    return redis_client
+
+
+def pool_stats() -> dict:
+    """current connection pool usage, saturation is checked out / (size + max overflow)"""
+    pool = async_engine.pool
+    if not hasattr(pool, "checkedout"):
+        return {"pool": type(pool).__name__}
+    capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+    checked_out = pool.checkedout()
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": checked_out,
+        "overflow": pool.overflow(),
+        "saturation": round(checked_out / capacity, 3) if capacity else 0.0,
+    }
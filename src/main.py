@@ -1,10 +1,40 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, Response
+from fastapi.responses import ORJSONResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
 
 from src.api.api_v1.handler.main_handler import main_router
+from src.core.dependencies import internal_only
 from src.core.errors import register_all_errors
+from src.core.log import setup_logging, shutdown_logging
+from src.core.metrics import StatsCollector
 from src.core.middleware.logging import register_middleware
+from src.database import pool_stats
+from src.services.media_storage import media_storage
+from src.services.message_writer import message_writer
+from src.services.receipt_service import receipt_service
+from src.websocket_manager.websocker_manger import manager
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()
+    await media_storage.start()
+    await manager.start()
+    await message_writer.start()
+    await receipt_service.start()
+    yield
+    # flush pending messages and receipts before the broker goes away
+    await message_writer.stop()
+    await receipt_service.stop()
+    await manager.stop()
+    shutdown_logging()
+
+REGISTRY.register(StatsCollector("ws", manager.stats))
+REGISTRY.register(StatsCollector("db_pool", pool_stats))
 
-app = FastAPI(debug=True)
+app = FastAPI(debug=True, lifespan=lifespan, default_response_class=ORJSONResponse)
 
 register_middleware(app)
 register_all_errors(app)
@@ -14,6 +44,19 @@ app.include_router(main_router)
 async def root():
     return {"status": "server is running"}
 
+@app.get("/stats", dependencies=[Depends(internal_only)])
+async def stats():
+    return {"websocket": manager.stats(), "db_pool": pool_stats()}
+
+@app.get("/stats/memory", dependencies=[Depends(internal_only)])
+async def memory_stats():
+    return manager.memory_report()
+
+# scrape with the X-Internal-Token header, e.g. Prometheus' http_headers scrape option
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(internal_only)])
+async def metrics():
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("src.main:app", reload=True)
\ No newline at end of file
+    uvicorn.run("src.main:app", reload=True)
@@ -0,0 +1,68 @@
+import uuid
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import Index, UniqueConstraint
+from sqlmodel import SQLModel, Field
+
+# characters of the last message kept on the conversation for the inbox
+PREVIEW_LENGTH = 140
+
+DIRECT = "direct"
+GROUP = "group"
+
+
+class Conversation(SQLModel, table=True):
+    """
+    A one-to-one conversation, stored once per participant pair, or a group room.
+    The pair is kept in canonical order (lower id first) so both directions
+    resolve to the same row; rooms have no pair, their members are the
+    ConversationParticipant rows.
+    """
+    __tablename__ = "conversations"
+    __table_args__ = (
+        UniqueConstraint("user_low_id", "user_high_id", name="uq_conversations_pair"),
+    )
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    kind: str = Field(default=DIRECT, sa_column_kwargs={"server_default": DIRECT})
+    user_low_id: Optional[uuid.UUID] = Field(default=None, foreign_key="user.id")
+    user_high_id: Optional[uuid.UUID] = Field(default=None, foreign_key="user.id")
+    # rooms only
+    name: Optional[str] = Field(default=None)
+    created_by: Optional[uuid.UUID] = Field(default=None, foreign_key="user.id")
+    created_at: datetime = Field(default_factory=datetime.now)
+
+    # denormalized from the newest message by the message writer, the inbox never scans messages
+    # (no FK on last_message_id, messages already points here)
+    last_message_id: Optional[uuid.UUID] = Field(default=None)
+    last_message_preview: Optional[str] = Field(default=None)
+    last_message_at: Optional[datetime] = Field(default=None)
+    last_sender_id: Optional[uuid.UUID] = Field(default=None)
+
+    @staticmethod
+    def canonical_pair(user_a: uuid.UUID, user_b: uuid.UUID) -> Tuple[uuid.UUID, uuid.UUID]:
+        return (user_a, user_b) if user_a < user_b else (user_b, user_a)
+
+
+class ConversationParticipant(SQLModel, table=True):
+    """
+    Per-user state of a conversation. Holds the unread counter and a copy of the
+    conversation's last_message_at, so a user's inbox is one range scan of
+    ``ix_conversation_participants_inbox``.
+
+    Receipts are high-water marks: every message up to ``last_delivered_at`` /
+    ``last_read_at`` counts as delivered / read, the message ids are the newest
+    message the user acknowledged.
+    """
+    __tablename__ = "conversation_participants"
+    __table_args__ = (
+        Index("ix_conversation_participants_inbox", "user_id", "last_message_at", "conversation_id"),
+    )
+    conversation_id: uuid.UUID = Field(foreign_key="conversations.id", primary_key=True)
+    user_id: uuid.UUID = Field(foreign_key="user.id", primary_key=True)
+    unread_count: int = Field(default=0)
+    last_message_at: Optional[datetime] = Field(default=None)
+    last_read_at: Optional[datetime] = Field(default=None)
+    last_read_message_id: Optional[uuid.UUID] = Field(default=None)
+    last_delivered_at: Optional[datetime] = Field(default=None)
+    last_delivered_message_id: Optional[uuid.UUID] = Field(default=None)
@@ -0,0 +1,24 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import SQLModel, Field
+
+
+class Media(SQLModel, table=True):
+    """
+    An uploaded image or video. The bytes live in the storage backend under
+    ``storage_key``, messages only point at this row.
+    """
+    __tablename__ = "media"
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    owner_id: uuid.UUID = Field(foreign_key="user.id", index=True)
+    content_type: str
+    size: int
+    # bytes stored so far, the offset a resumed upload continues from
+    received: int = Field(default=0)
+    storage_key: str
+    # backend upload handle, e.g. the S3 multipart upload id
+    upload_id: Optional[str] = Field(default=None)
+    is_complete: bool = Field(default=False)
+    created_at: datetime = Field(default_factory=datetime.now)
@@ -1,10 +1,13 @@
 import uuid
 from datetime import datetime
-from typing import TYPE_CHECKING
+from typing import Optional, TYPE_CHECKING
 
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field, Relationship
 
 # if TYPE_CHECKING:
+from src.model.conversation import Conversation  # noqa: F401, registers the FK target
+from src.model.media import Media  # noqa: F401, registers the FK target
 from src.model.user import User
 from src.model.user import UserRead
 
@@ -21,16 +24,29 @@ class MessageBase(SQLModel):
 
 class Message(MessageBase, table=True):
     __tablename__ = "messages"
+    __table_args__ = (
+        # history is served by one equality on conversation_id plus the timestamp seek
+        Index("ix_messages_conversation_timestamp", "conversation_id", "timestamp", "id"),
+    )
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     sender_id: uuid.UUID = Field(foreign_key="user.id")
-    receiver_id: uuid.UUID = Field(foreign_key="user.id")
+    # None for messages posted to a room, those are stored once for all members
+    receiver_id: Optional[uuid.UUID] = Field(default=None, foreign_key="user.id")
+    conversation_id: Optional[uuid.UUID] = Field(default=None, foreign_key="conversations.id")
+    media_id: Optional[uuid.UUID] = Field(default=None, foreign_key="media.id")
 
     # Relationships
-    sender: User = Relationship(back_populates="sent_messages")
-    receiver: User = Relationship(back_populates="received_messages")
+    sender: User = Relationship(
+        back_populates="sent_messages",
+        sa_relationship_kwargs={"foreign_keys": "[Message.sender_id]"}
+    )
+    receiver: Optional[User] = Relationship(
+        back_populates="received_messages",
+        sa_relationship_kwargs={"foreign_keys": "[Message.receiver_id]"}
+    )
 
 
 class MessageRead(MessageBase):
     id: uuid.UUID
     sender: UserRead
-    receiver: UserRead
\ No newline at end of file
+    receiver: Optional[UserRead] = None
\ No newline at end of file
@@ -1,7 +1,10 @@
 """
 This file contains all request models.
 """
-from pydantic import BaseModel
+import uuid
+from typing import List
+
+from pydantic import BaseModel, Field
 
 
 class UserCreate(BaseModel):
@@ -11,4 +14,18 @@ class UserCreate(BaseModel):
 
 class UserLogin(BaseModel):
     email_id: str
-    password: str
\ No newline at end of file
+    password: str
+
+
+class MediaUploadCreate(BaseModel):
+    content_type: str
+    size: int
+
+
+class RoomCreate(BaseModel):
+    name: str = Field(min_length=1, max_length=100)
+    member_ids: List[uuid.UUID] = []
+
+
+class RoomMembersAdd(BaseModel):
+    user_ids: List[uuid.UUID] = Field(min_length=1)
@@ -1,3 +1,91 @@
 """
 This file contains all response models.
 """
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from src.model.user import UserRead
+
+
+class UserIdData(BaseModel):
+    user_id: uuid.UUID
+
+
+class TokenData(BaseModel):
+    access_token: str
+    user_id: uuid.UUID
+
+
+class UserPage(BaseModel):
+    users: List[UserRead]
+    next_cursor: Optional[str] = None
+
+
+class ActiveUsers(BaseModel):
+    users: List[str]
+
+
+class MessageSearchHit(BaseModel):
+    id: uuid.UUID
+    conversation_id: Optional[uuid.UUID] = None
+    sender_id: uuid.UUID
+    receiver_id: Optional[uuid.UUID] = None
+    content: str
+    timestamp: datetime
+    rank: float
+
+
+class MessageSearchPage(BaseModel):
+    results: List[MessageSearchHit]
+    next_offset: Optional[int] = None
+
+
+class ConversationSummary(BaseModel):
+    conversation_id: uuid.UUID
+    kind: str
+    # the other participant of a direct conversation
+    peer_id: Optional[uuid.UUID] = None
+    # room name
+    name: Optional[str] = None
+    last_message_id: Optional[uuid.UUID] = None
+    last_message_preview: Optional[str] = None
+    last_message_at: Optional[datetime] = None
+    last_sender_id: Optional[uuid.UUID] = None
+    unread_count: int
+
+
+class ConversationPage(BaseModel):
+    conversations: List[ConversationSummary]
+    next_cursor: Optional[str] = None
+
+
+class Room(BaseModel):
+    room_id: uuid.UUID
+    name: str
+    created_by: uuid.UUID
+    member_count: int
+
+
+class ParticipantReceipts(BaseModel):
+    user_id: uuid.UUID
+    last_delivered_message_id: Optional[uuid.UUID] = None
+    last_delivered_at: Optional[datetime] = None
+    last_read_message_id: Optional[uuid.UUID] = None
+    last_read_at: Optional[datetime] = None
+
+
+class ConversationReceipts(BaseModel):
+    conversation_id: uuid.UUID
+    participants: List[ParticipantReceipts]
+
+
+class MediaUpload(BaseModel):
+    media_id: uuid.UUID
+    content_type: str
+    size: int
+    offset: int
+    chunk_size: int
+    complete: bool
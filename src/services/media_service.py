@@ -0,0 +1,192 @@
+"""
+Resumable media uploads.
+
+    POST   /media/uploads                 declare type and size, get a media id
+    PUT    /media/uploads/{id}            one chunk, ``Content-Range: bytes start-end/size``
+    HEAD   /media/uploads/{id}            ``Upload-Offset`` to resume from after a drop
+    POST   /media/uploads/{id}/complete   seal it, the id can now be sent in a message
+"""
+import asyncio
+import re
+import uuid
+import weakref
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from src.config import Config
+from src.core.errors import DataBaseException, InvalidUpload, MediaNotFound, UploadOffsetMismatch
+from src.model.conversation import ConversationParticipant
+from src.model.media import Media
+from src.model.message import Message
+from src.services.media_storage import media_storage
+
+MEDIA_KINDS = ("image", "video")
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+# one chunk at a time per upload within this process
+_upload_locks: "weakref.WeakValueDictionary[uuid.UUID, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _lock(media_id: uuid.UUID) -> asyncio.Lock:
+    lock = _upload_locks.get(media_id)
+    if lock is None:
+        lock = _upload_locks[media_id] = asyncio.Lock()
+    return lock
+
+
+def media_kind(content_type: str) -> Optional[str]:
+    """``image`` / ``video`` for the accepted content types, None otherwise"""
+    kind = content_type.split("/", 1)[0]
+    return kind if kind in MEDIA_KINDS else None
+
+
+async def create_upload(db: AsyncSession, owner_id: uuid.UUID, content_type: str, size: int) -> Media:
+    """
+    :raises: InvalidUpload, DataBaseException
+    """
+    if media_kind(content_type) is None:
+        raise InvalidUpload("only image/* and video/* can be uploaded")
+    if not 0 < size <= Config.MEDIA_MAX_BYTES:
+        raise InvalidUpload(f"size must be between 1 and {Config.MEDIA_MAX_BYTES} bytes")
+
+    media_id = uuid.uuid4()
+    key = media_id.hex
+    upload_id = await media_storage.create(key, content_type)
+    media = Media(
+        id=media_id, owner_id=owner_id, content_type=content_type, size=size,
+        storage_key=key, upload_id=upload_id,
+    )
+    try:
+        db.add(media)
+        await db.commit()
+    except SQLAlchemyError as e:
+        await db.rollback()
+        await media_storage.abort(key, upload_id)
+        raise DataBaseException(detail=str(e))
+    return media
+
+
+async def get_upload(db: AsyncSession, media_id: uuid.UUID, owner_id: uuid.UUID) -> Media:
+    """
+    :raises: MediaNotFound unless ``owner_id`` started this upload
+    """
+    media = await db.get(Media, media_id)
+    if media is None or media.owner_id != owner_id:
+        raise MediaNotFound()
+    return media
+
+
+async def write_chunk(
+        db: AsyncSession,
+        media: Media,
+        content_range: Optional[str],
+        chunks: AsyncIterator[bytes],
+) -> Media:
+    """
+    Stream one chunk to storage and advance the stored offset.
+
+    :param content_range: the request's Content-Range header
+    :param chunks: request body
+    :raises: InvalidUpload, UploadOffsetMismatch
+    """
+    if media.is_complete:
+        raise InvalidUpload("upload is already complete")
+    match = _CONTENT_RANGE.fullmatch(content_range or "")
+    if match is None:
+        raise InvalidUpload("Content-Range: bytes start-end/size is required")
+    start, end, total = (int(group) for group in match.groups())
+    length = end - start + 1
+    if total != media.size or length <= 0 or end >= total:
+        raise InvalidUpload("Content-Range does not fit the declared size")
+    if length != Config.MEDIA_CHUNK_SIZE and end != total - 1:
+        raise InvalidUpload(f"chunks must be {Config.MEDIA_CHUNK_SIZE} bytes except the last")
+
+    async with _lock(media.id):
+        await db.refresh(media)
+        if start != media.received:
+            raise UploadOffsetMismatch(media.received)
+        written = await media_storage.write_chunk(media.storage_key, media.upload_id, start, _limit(chunks, length))
+        if written != length:
+            # connection dropped mid chunk, the client resumes from the unchanged offset
+            raise UploadOffsetMismatch(media.received)
+        media.received = end + 1
+        try:
+            await db.commit()
+        except SQLAlchemyError as e:
+            await db.rollback()
+            raise DataBaseException(detail=str(e))
+    return media
+
+
+async def _limit(chunks: AsyncIterator[bytes], length: int) -> AsyncIterator[bytes]:
+    """pass the body through, refusing more than the declared range"""
+    remaining = length
+    async for data in chunks:
+        if len(data) > remaining:
+            raise InvalidUpload("body is longer than Content-Range")
+        remaining -= len(data)
+        yield data
+
+
+async def complete_upload(db: AsyncSession, media: Media) -> Media:
+    """
+    :raises: InvalidUpload while bytes are missing
+    """
+    if media.is_complete:
+        return media
+    if media.received != media.size:
+        raise InvalidUpload(f"{media.size - media.received} bytes still missing")
+    await media_storage.complete(media.storage_key, media.upload_id)
+    media.is_complete = True
+    media.upload_id = None
+    try:
+        await db.commit()
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise DataBaseException(detail=str(e))
+    return media
+
+
+async def get_sendable_media(db: AsyncSession, media_id: uuid.UUID, sender_id: uuid.UUID, kind: str) -> Optional[Media]:
+    """the sender's own completed upload of the right kind, None if it isn't one"""
+    media = await db.get(Media, media_id)
+    if media is None or media.owner_id != sender_id or not media.is_complete:
+        return None
+    if media_kind(media.content_type) != kind:
+        return None
+    return media
+
+
+async def get_readable_media(db: AsyncSession, media_id: uuid.UUID, user_id: uuid.UUID) -> Media:
+    """
+    Completed media ``user_id`` uploaded or received in a message.
+
+    :raises: MediaNotFound
+    """
+    media = await db.get(Media, media_id)
+    if media is None or not media.is_complete:
+        raise MediaNotFound()
+    if media.owner_id == user_id:
+        return media
+    # direct messages name the receiver, room messages are readable by every member
+    rooms = select(ConversationParticipant.conversation_id).where(ConversationParticipant.user_id == user_id)
+    shared = await db.execute(
+        select(Message.id)
+        .where(
+            Message.media_id == media_id,
+            or_(
+                Message.sender_id == user_id,
+                Message.receiver_id == user_id,
+                Message.conversation_id.in_(rooms),
+            ),
+        )
+        .limit(1)
+    )
+    if shared.first() is None:
+        raise MediaNotFound()
+    return media
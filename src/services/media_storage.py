@@ -0,0 +1,191 @@
+"""
+Storage backends for uploaded media.
+
+Chunks arrive in order and are streamed straight through, a chunk is never held
+in memory as a whole. Every chunk but the last is exactly ``chunk_size`` bytes, so
+a chunk's offset also gives its S3 part number.
+"""
+import asyncio
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Optional
+
+import boto3
+
+from src.config import Config
+
+# chunks spill to disk past this while they are assembled into an S3 part
+SPOOL_MAX_MEMORY = 1024 * 1024
+
+
+class MediaStorage(ABC):
+    """Interface of a storage backend, keys are generated by the media service."""
+
+    async def start(self):
+        """Prepare the backend, called once on application startup."""
+
+    @abstractmethod
+    async def create(self, key: str, content_type: str) -> Optional[str]:
+        """
+        Start an upload.
+
+        :return: backend upload handle stored with the media row, if the backend needs one
+        """
+
+    @abstractmethod
+    async def write_chunk(
+        self, key: str, upload_id: Optional[str], offset: int, chunks: AsyncIterator[bytes],
+    ) -> int:
+        """
+        Store one chunk starting at ``offset``, replacing anything stored past it.
+
+        :return: number of bytes written
+        """
+
+    @abstractmethod
+    async def complete(self, key: str, upload_id: Optional[str]):
+        """Make the upload readable under ``key``."""
+
+    @abstractmethod
+    async def abort(self, key: str, upload_id: Optional[str]):
+        """Drop whatever was stored for an upload that will not complete."""
+
+    def path(self, key: str) -> Optional[str]:
+        """local file of a completed upload, for backends that have one"""
+        return None
+
+    def url(self, key: str) -> Optional[str]:
+        """time limited direct download URL, for backends that serve files themselves"""
+        return None
+
+
+class LocalStorage(MediaStorage):
+    def __init__(self, root: str):
+        self.root = root
+
+    async def start(self):
+        await asyncio.to_thread(os.makedirs, self.root, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def _partial(self, key: str) -> str:
+        return self.path(key) + ".part"
+
+    def _create_partial(self, key: str):
+        with open(self._partial(key), "wb"):
+            pass
+
+    async def create(self, key: str, content_type: str) -> None:
+        await asyncio.to_thread(self._create_partial, key)
+        return None
+
+    async def write_chunk(
+        self, key: str, upload_id: Optional[str], offset: int, chunks: AsyncIterator[bytes],
+    ) -> int:
+        f = await asyncio.to_thread(open, self._partial(key), "r+b")
+        try:
+            # a broken earlier attempt may have left bytes past the offset
+            await asyncio.to_thread(f.truncate, offset)
+            f.seek(offset)
+            written = 0
+            async for data in chunks:
+                await asyncio.to_thread(f.write, data)
+                written += len(data)
+            return written
+        finally:
+            await asyncio.to_thread(f.close)
+
+    async def complete(self, key: str, upload_id: Optional[str]):
+        await asyncio.to_thread(os.replace, self._partial(key), self.path(key))
+
+    async def abort(self, key: str, upload_id: Optional[str]):
+        try:
+            await asyncio.to_thread(os.remove, self._partial(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3Storage(MediaStorage):
+    """S3 compatible object storage, one multipart upload per media."""
+
+    def __init__(
+        self,
+        bucket: str,
+        chunk_size: int,
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        url_ttl: int = 3600,
+    ):
+        self.bucket = bucket
+        self.chunk_size = chunk_size
+        self.url_ttl = url_ttl
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+
+    async def create(self, key: str, content_type: str) -> str:
+        response = await asyncio.to_thread(
+            self.client.create_multipart_upload, Bucket=self.bucket, Key=key, ContentType=content_type,
+        )
+        return response["UploadId"]
+
+    async def write_chunk(
+        self, key: str, upload_id: Optional[str], offset: int, chunks: AsyncIterator[bytes],
+    ) -> int:
+        # upload_part needs a seekable body of known length, spool the chunk first
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as body:
+            written = 0
+            async for data in chunks:
+                await asyncio.to_thread(body.write, data)
+                written += len(data)
+            body.seek(0)
+            # re-uploading a part number replaces it, which makes retries safe
+            await asyncio.to_thread(
+                self.client.upload_part,
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=offset // self.chunk_size + 1,
+                Body=body,
+                ContentLength=written,
+            )
+        return written
+
+    async def complete(self, key: str, upload_id: Optional[str]):
+        listing = await asyncio.to_thread(
+            self.client.list_parts, Bucket=self.bucket, Key=key, UploadId=upload_id,
+        )
+        parts = [{"PartNumber": part["PartNumber"], "ETag": part["ETag"]} for part in listing.get("Parts", [])]
+        await asyncio.to_thread(
+            self.client.complete_multipart_upload,
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+
+    async def abort(self, key: str, upload_id: Optional[str]):
+        await asyncio.to_thread(
+            self.client.abort_multipart_upload, Bucket=self.bucket, Key=key, UploadId=upload_id,
+        )
+
+    def url(self, key: str) -> str:
+        # signed locally, no request to S3
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=self.url_ttl,
+        )
+
+
+def create_storage() -> MediaStorage:
+    if Config.MEDIA_STORAGE == "s3":
+        return S3Storage(
+            bucket=Config.MEDIA_S3_BUCKET,
+            chunk_size=Config.MEDIA_CHUNK_SIZE,
+            endpoint_url=Config.MEDIA_S3_ENDPOINT_URL,
+            region=Config.MEDIA_S3_REGION,
+            url_ttl=Config.MEDIA_URL_TTL_SECONDS,
+        )
+    return LocalStorage(Config.MEDIA_ROOT)
+
+
+media_storage = create_storage()
@@ -0,0 +1,374 @@
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from cachetools import LRUCache
+from sqlalchemy import bindparam, or_, tuple_, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlmodel import select
+
+from src.core.errors import DataBaseException
+from src.model.conversation import DIRECT, PREVIEW_LENGTH, Conversation, ConversationParticipant
+from src.model.media import Media
+from src.model.message import Message
+
+conversations_table = Conversation.__table__
+participants_table = ConversationParticipant.__table__
+
+# canonical (low, high) pair -> conversation id, the mapping never changes once created
+_conversation_ids: LRUCache = LRUCache(maxsize=100_000)
+# conversation id -> its participants, same lifetime as the pair mapping
+_conversation_members: LRUCache = LRUCache(maxsize=100_000)
+
+
+async def get_conversation_id(
+        db: AsyncSession,
+        user_a: uuid.UUID,
+        user_b: uuid.UUID,
+) -> Optional[uuid.UUID]:
+    """
+    Look up the conversation between two users.
+
+    :param db: Async SQLAlchemy session
+    :param user_a: one participant
+    :param user_b: the other participant
+    :return: conversation id, or None if they never talked
+    """
+    pair = Conversation.canonical_pair(user_a, user_b)
+    conversation_id = _conversation_ids.get(pair)
+    if conversation_id is not None:
+        return conversation_id
+
+    try:
+        statement = select(Conversation.id).where(
+            Conversation.user_low_id == pair[0],
+            Conversation.user_high_id == pair[1],
+        )
+        result = await db.execute(statement)
+        conversation_id = result.scalars().first()
+    except SQLAlchemyError as e:
+        raise DataBaseException(detail=str(e))
+
+    if conversation_id is not None:
+        _conversation_ids[pair] = conversation_id
+    return conversation_id
+
+
+async def get_conversation_members(
+        db: AsyncSession,
+        conversation_id: uuid.UUID,
+) -> Optional[Tuple[uuid.UUID, ...]]:
+    """
+    Participants of a direct conversation.
+
+    :param db: Async SQLAlchemy session
+    :param conversation_id: the conversation
+    :return: participant ids, or None if there is no such direct conversation
+    """
+    members = _conversation_members.get(conversation_id)
+    if members is not None:
+        return members
+
+    try:
+        statement = select(Conversation.user_low_id, Conversation.user_high_id).where(
+            Conversation.id == conversation_id,
+            Conversation.kind == DIRECT,
+        )
+        result = await db.execute(statement)
+        row = result.first()
+    except SQLAlchemyError as e:
+        raise DataBaseException(detail=str(e))
+
+    if row is None:
+        return None
+    members = _conversation_members[conversation_id] = tuple(row)
+    return members
+
+
+async def get_or_create_conversation(
+        db: AsyncSession,
+        user_a: uuid.UUID,
+        user_b: uuid.UUID,
+) -> uuid.UUID:
+    """
+    Return the conversation between two users, creating it on their first message.
+
+    :param db: Async SQLAlchemy session
+    :param user_a: one participant
+    :param user_b: the other participant
+    :return: conversation id
+    :raises: DataBaseException, also when the insert failed for another reason than a
+             concurrent creation, e.g. an unknown participant
+    """
+    conversation_id = await get_conversation_id(db, user_a, user_b)
+    if conversation_id is not None:
+        return conversation_id
+
+    low, high = Conversation.canonical_pair(user_a, user_b)
+    conversation = Conversation(user_low_id=low, user_high_id=high)
+    try:
+        db.add(conversation)
+        await db.flush()
+        db.add_all([
+            ConversationParticipant(conversation_id=conversation.id, user_id=low),
+            ConversationParticipant(conversation_id=conversation.id, user_id=high),
+        ])
+        await db.commit()
+    except IntegrityError:
+        # the other participant created it concurrently
+        await db.rollback()
+        conversation_id = await get_conversation_id(db, user_a, user_b)
+        if conversation_id is None:
+            raise DataBaseException(detail=f"could not create a conversation between {user_a} and {user_b}")
+        return conversation_id
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise DataBaseException(detail=str(e))
+
+    _conversation_ids[(low, high)] = conversation.id
+    return conversation.id
+
+
+async def get_message_page(
+        db: AsyncSession,
+        conversation_id: uuid.UUID,
+        before: Optional[uuid.UUID] = None,
+        after: Optional[uuid.UUID] = None,
+        limit: int = 50,
+) -> List[Message]:
+    """
+    One page of a conversation, oldest first. Paging seeks on (timestamp, id), so
+    every page costs the same.
+
+    :param db: Async SQLAlchemy session
+    :param conversation_id: direct conversation or room
+    :param before: message id, return the messages older than it
+    :param after: message id, return the messages newer than it
+    :param limit: page size
+    """
+    stmt = (
+        select(Message)
+        .options(
+            selectinload(Message.sender),
+            selectinload(Message.receiver),
+        )
+        .where(Message.conversation_id == conversation_id)
+    )
+
+    position = tuple_(Message.timestamp, Message.id)
+    if after is not None:
+        cursor = select(Message.timestamp).where(Message.id == after).scalar_subquery()
+        stmt = stmt.where(position > tuple_(cursor, after)).order_by(Message.timestamp, Message.id)
+    else:
+        if before is not None:
+            cursor = select(Message.timestamp).where(Message.id == before).scalar_subquery()
+            stmt = stmt.where(position < tuple_(cursor, before))
+        stmt = stmt.order_by(Message.timestamp.desc(), Message.id.desc())
+
+    try:
+        result = await db.execute(stmt.limit(limit))
+    except SQLAlchemyError as e:
+        raise DataBaseException(detail=str(e))
+    messages = list(result.scalars().all())
+    if after is None:
+        # fetched newest first to seek backwards, hand them out oldest first
+        messages.reverse()
+    return messages
+
+
+async def get_messages_since(
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        since: datetime,
+        limit: int,
+) -> List[Tuple[Message, str, Optional[str]]]:
+    """
+    Messages of all the user's conversations newer than ``since``, oldest first,
+    for a device resuming from its cursor. Only conversations that moved since
+    then are looked at, found through ix_conversation_participants_inbox.
+
+    :param db: Async SQLAlchemy session
+    :param user_id: the device's user
+    :param since: the device's cursor
+    :param limit: at most this many messages
+    :return: (message, conversation kind, media content type) triples
+    """
+    changed = select(ConversationParticipant.conversation_id).where(
+        ConversationParticipant.user_id == user_id,
+        ConversationParticipant.last_message_at > since,
+    )
+    stmt = (
+        select(Message, Conversation.kind, Media.content_type)
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .outerjoin(Media, Media.id == Message.media_id)
+        .where(Message.conversation_id.in_(changed), Message.timestamp > since)
+        .order_by(Message.timestamp, Message.id)
+        .limit(limit)
+    )
+    try:
+        result = await db.execute(stmt)
+    except SQLAlchemyError as e:
+        raise DataBaseException(detail=str(e))
+    return [tuple(row) for row in result.all()]
+
+
+async def record_messages(db: AsyncSession, rows: List[dict]) -> None:
+    """
+    Move the inbox counters forward for a batch of inserted message rows, in the
+    caller's transaction. Costs a fixed number of executemany UPDATEs per batch:
+    last message per conversation, unread per (conversation, sender).
+
+    :param db: Async SQLAlchemy session
+    :param rows: message column values as inserted
+    """
+    latest: Dict[uuid.UUID, dict] = {}
+    unread: Counter = Counter()
+    for row in rows:
+        conversation_id = row.get("conversation_id")
+        if conversation_id is None:
+            continue
+        unread[(conversation_id, row["sender_id"])] += 1
+        current = latest.get(conversation_id)
+        if current is None or (row["timestamp"], row["id"]) > (current["timestamp"], current["id"]):
+            latest[conversation_id] = row
+    if not latest:
+        return
+
+    # bind names must differ from the column names in an executemany UPDATE
+    await db.execute(
+        update(conversations_table)
+        .where(
+            conversations_table.c.id == bindparam("b_conversation_id"),
+            or_(
+                conversations_table.c.last_message_at.is_(None),
+                conversations_table.c.last_message_at <= bindparam("b_timestamp"),
+            ),
+        )
+        .values(
+            last_message_id=bindparam("b_message_id"),
+            last_message_preview=bindparam("b_preview"),
+            last_message_at=bindparam("b_timestamp"),
+            last_sender_id=bindparam("b_sender_id"),
+        ),
+        [
+            {
+                "b_conversation_id": conversation_id,
+                "b_message_id": row["id"],
+                "b_preview": row["content"][:PREVIEW_LENGTH],
+                "b_timestamp": row["timestamp"],
+                "b_sender_id": row["sender_id"],
+            }
+            for conversation_id, row in latest.items()
+        ],
+    )
+    await db.execute(
+        update(participants_table)
+        .where(
+            participants_table.c.conversation_id == bindparam("b_conversation_id"),
+            or_(
+                participants_table.c.last_message_at.is_(None),
+                participants_table.c.last_message_at < bindparam("b_timestamp"),
+            ),
+        )
+        .values(last_message_at=bindparam("b_timestamp")),
+        [
+            {"b_conversation_id": conversation_id, "b_timestamp": row["timestamp"]}
+            for conversation_id, row in latest.items()
+        ],
+    )
+    await db.execute(
+        update(participants_table)
+        .where(
+            participants_table.c.conversation_id == bindparam("b_conversation_id"),
+            participants_table.c.user_id != bindparam("b_sender_id"),
+        )
+        .values(unread_count=participants_table.c.unread_count + bindparam("b_count")),
+        [
+            {"b_conversation_id": conversation_id, "b_sender_id": sender_id, "b_count": count}
+            for (conversation_id, sender_id), count in unread.items()
+        ],
+    )
+
+
+async def list_conversations(
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        before: Optional[uuid.UUID] = None,
+        limit: int = 50,
+) -> List[Tuple[Conversation, ConversationParticipant]]:
+    """
+    One page of the user's inbox, most recent conversation first.
+
+    :param db: Async SQLAlchemy session
+    :param user_id: inbox owner
+    :param before: conversation id of the last item of the previous page
+    :param limit: page size
+    :return: (conversation, the user's participant row) pairs
+    """
+    stmt = (
+        select(Conversation, ConversationParticipant)
+        .join(ConversationParticipant, ConversationParticipant.conversation_id == Conversation.id)
+        .where(
+            ConversationParticipant.user_id == user_id,
+            ConversationParticipant.last_message_at.is_not(None),
+        )
+    )
+    if before is not None:
+        cursor = (
+            select(ConversationParticipant.last_message_at)
+            .where(ConversationParticipant.user_id == user_id, ConversationParticipant.conversation_id == before)
+            .scalar_subquery()
+        )
+        stmt = stmt.where(
+            tuple_(ConversationParticipant.last_message_at, ConversationParticipant.conversation_id)
+            < tuple_(cursor, before)
+        )
+    stmt = stmt.order_by(
+        ConversationParticipant.last_message_at.desc(), ConversationParticipant.conversation_id.desc()
+    ).limit(limit)
+    try:
+        result = await db.execute(stmt)
+    except SQLAlchemyError as e:
+        raise DataBaseException(detail=str(e))
+    return list(result.all())
+
+
+async def get_participants(db: AsyncSession, conversation_id: uuid.UUID) -> List[ConversationParticipant]:
+    """
+    Participant rows of a conversation, with their receipt marks.
+
+    :param db: Async SQLAlchemy session
+    :param conversation_id: the conversation
+    """
+    try:
+        result = await db.execute(
+            select(ConversationParticipant).where(ConversationParticipant.conversation_id == conversation_id)
+        )
+    except SQLAlchemyError as e:
+        raise DataBaseException(detail=str(e))
+    return list(result.scalars().all())
+
+
+async def mark_conversation_read(db: AsyncSession, conversation_id: uuid.UUID, user_id: uuid.UUID) -> bool:
+    """
+    Reset the user's unread counter.
+
+    :return: False if the user is not part of the conversation
+    """
+    try:
+        result = await db.execute(
+            update(ConversationParticipant)
+            .where(
+                ConversationParticipant.conversation_id == conversation_id,
+                ConversationParticipant.user_id == user_id,
+            )
+            .values(unread_count=0, last_read_at=datetime.now())
+        )
+        await db.commit()
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise DataBaseException(detail=str(e))
+    return result.rowcount > 0
@@ -0,0 +1,166 @@
+"""
+Write-behind persistence for chat messages.
+
+The WebSocket handler hands rows to the writer and delivers right away. Rows from
+every connection are grouped into one bulk INSERT ... RETURNING per batch window,
+so a burst of messages costs one commit instead of one per message. Senders get
+a durability ack once their batch landed. A batch the database rejects is retried
+row by row, so one bad row only fails its own message. Nothing a batch does can
+stop the writer: a sender that stopped being drained would block on a full queue.
+"""
+import asyncio
+import time
+import uuid
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.config import Config
+from src.core.log import get_logger
+from src.core.metrics import MESSAGE_BATCH_SIZE, MESSAGE_FLUSH_DURATION, MESSAGES_PERSISTED
+from src.database import async_session_maker
+from src.model.message import Message
+from src.services.message_service import record_messages
+from src.websocket_manager.websocker_manger import manager
+
+logger = get_logger(__name__)
+
+AckCallback = Callable[[uuid.UUID, dict], Awaitable[None]]
+
+# columns every queued row must carry, the rest are nullable
+REQUIRED_COLUMNS = ("id", "sender_id", "conversation_id", "timestamp")
+
+
+class MessageWriter:
+    def __init__(
+        self,
+        session_maker: async_sessionmaker,
+        on_ack: AckCallback,
+        batch_size: int = 500,
+        window_ms: int = 10,
+        queue_size: int = 10_000,
+    ):
+        self.session_maker = session_maker
+        self.on_ack = on_ack
+        self.batch_size = batch_size
+        self.window = window_ms / 1000
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush whatever is queued, then stop."""
+        if self._task is None:
+            return
+        await self.queue.put(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, row: dict, client_id: Optional[str] = None):
+        """
+        Queue a message row for the next batch.
+        Only waits when the queue is full, which pushes back on the sending socket.
+
+        :param row: column values for Message, id and timestamp already set
+        :param client_id: sender's own id for the message, echoed in the ack
+        :raises: ValueError if the row misses a required column, it would fail the whole batch
+        """
+        missing = [column for column in REQUIRED_COLUMNS if row.get(column) is None]
+        if missing:
+            raise ValueError(f"message row without {', '.join(missing)}")
+        await self.queue.put((row, client_id))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.window
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                await self._flush(batch)
+            except Exception:
+                logger.exception("message batch flush failed", extra={"fields": {"rows": len(batch)}})
+
+    async def _flush(self, batch: List[tuple]):
+        rows = [row for row, _ in batch]
+        MESSAGE_BATCH_SIZE.observe(len(rows))
+        start = time.perf_counter()
+        try:
+            persisted = await self._insert(rows)
+        except SQLAlchemyError as e:
+            logger.error("message batch insert failed", extra={"fields": {"error": repr(e), "rows": len(rows)}})
+            persisted = set()
+            if len(rows) > 1:
+                # find the bad rows, everything else still lands
+                for row in rows:
+                    try:
+                        persisted |= await self._insert([row])
+                    except SQLAlchemyError as e:
+                        logger.error("message insert failed", extra={"fields": {
+                            "error": repr(e), "message_id": row["id"],
+                        }})
+        MESSAGE_FLUSH_DURATION.observe(time.perf_counter() - start)
+        MESSAGES_PERSISTED.labels("persisted").inc(len(persisted))
+        MESSAGES_PERSISTED.labels("failed").inc(len(rows) - len(persisted))
+
+        # one ack frame per sender per batch
+        acks: Dict[uuid.UUID, List[dict]] = defaultdict(list)
+        failed: Dict[uuid.UUID, List[dict]] = defaultdict(list)
+        for row, client_id in batch:
+            entry = {"message_id": str(row["id"]), "client_id": client_id}
+            if row["id"] in persisted:
+                acks[row["sender_id"]].append(entry)
+            else:
+                failed[row["sender_id"]].append(entry)
+        for sender_id, entries in acks.items():
+            await self._ack(sender_id, {"type": "ack", "status": "persisted", "messages": entries})
+        for sender_id, entries in failed.items():
+            await self._ack(sender_id, {"type": "ack", "status": "failed", "messages": entries})
+
+    async def _ack(self, sender_id: uuid.UUID, payload: dict):
+        """a lost ack only costs the sender its confirmation, the rows are already decided"""
+        try:
+            await self.on_ack(sender_id, payload)
+        except Exception:
+            logger.exception("message ack failed", extra={"fields": {
+                "sender_id": sender_id, "status": payload["status"], "messages": len(payload["messages"]),
+            }})
+
+    async def _insert(self, rows: List[dict]) -> Set[uuid.UUID]:
+        """:return: ids of the rows written"""
+        async with self.session_maker() as session:
+            result = await session.execute(insert(Message).returning(Message.id), rows)
+            persisted = set(result.scalars().all())
+            # inbox counters move in the same transaction as the rows
+            await record_messages(session, rows)
+            await session.commit()
+        return persisted
+
+
+message_writer = MessageWriter(
+    async_session_maker,
+    on_ack=manager.send_to_user,
+    batch_size=Config.MESSAGE_BATCH_SIZE,
+    window_ms=Config.MESSAGE_BATCH_WINDOW_MS,
+    queue_size=Config.MESSAGE_WRITE_QUEUE_SIZE,
+)
@@ -0,0 +1,155 @@
+"""
+Presence state kept in Redis with heartbeat TTLs.
+
+Online users live in the ``presence:online`` sorted set, scored by the time their
+entry expires. Connected users are refreshed on every heartbeat round, so a crashed
+node's users simply expire. ``user.is_online`` is written in periodic batches rather
+than on every connect / disconnect, and deltas only go to the users that asked to
+watch someone.
+"""
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set
+
+from redis.asyncio import Redis
+from sqlalchemy import update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.core.log import get_logger
+from src.model.user import User
+
+logger = get_logger(__name__)
+
+
+class PresenceService:
+    ONLINE_KEY = "presence:online"
+
+    def __init__(self, redis: Redis, session_maker: async_sessionmaker, ttl: int = 60):
+        self.redis = redis
+        self.session_maker = session_maker
+        self.ttl = ttl
+        # watched user -> local watchers, and the reverse for cleanup
+        self.watchers: Dict[uuid.UUID, Set[uuid.UUID]] = defaultdict(set)
+        self.interests: Dict[uuid.UUID, Set[uuid.UUID]] = defaultdict(set)
+        # is_online changes waiting for the next batch write
+        self._pending: Dict[uuid.UUID, bool] = {}
+
+    def _expiry(self) -> float:
+        return time.time() + self.ttl
+
+    async def mark_online(self, user_id: uuid.UUID) -> bool:
+        """
+        :return: True if the user was not online before, i.e. a delta must go out
+        """
+        added = await self.redis.zadd(self.ONLINE_KEY, {str(user_id): self._expiry()})
+        if added:
+            self._pending[user_id] = True
+        return bool(added)
+
+    async def mark_offline(self, user_id: uuid.UUID) -> bool:
+        """
+        :return: True if the user was online before
+        """
+        removed = await self.redis.zrem(self.ONLINE_KEY, str(user_id))
+        if removed:
+            self._pending[user_id] = False
+        return bool(removed)
+
+    async def refresh(self, user_ids: Iterable[uuid.UUID]) -> List[uuid.UUID]:
+        """
+        Push the expiry of live users forward, one round trip for all of them.
+
+        :param user_ids: users with a live device on this node
+        :return: users whose entry had lapsed (a stalled loop or a missed round) and
+                 who are back online now, a delta must go out for them
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return []
+        expiry = self._expiry()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.zadd(self.ONLINE_KEY, {str(user_id): expiry})
+            added = await pipe.execute()
+        revived = [user_id for user_id, new in zip(user_ids, added) if new]
+        for user_id in revived:
+            self._pending[user_id] = True
+        return revived
+
+    async def expire(self) -> List[uuid.UUID]:
+        """
+        Remove users whose heartbeat lapsed.
+
+        :return: users that went offline because of it
+        """
+        stale = await self.redis.zrangebyscore(self.ONLINE_KEY, "-inf", time.time())
+        if not stale:
+            return []
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for member in stale:
+                pipe.zrem(self.ONLINE_KEY, member)
+            removed = await pipe.execute()
+        # another node may have reaped the same entries, only report our removals
+        expired = [uuid.UUID(member) for member, gone in zip(stale, removed) if gone]
+        for user_id in expired:
+            self._pending[user_id] = False
+        return expired
+
+    async def online_users(self) -> List[str]:
+        return await self.redis.zrangebyscore(self.ONLINE_KEY, time.time(), "+inf")
+
+    async def snapshot(self, user_ids: Iterable[uuid.UUID]) -> Dict[str, bool]:
+        """Current online state of ``user_ids``."""
+        user_ids = [str(user_id) for user_id in user_ids]
+        if not user_ids:
+            return {}
+        now = time.time()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.zscore(self.ONLINE_KEY, user_id)
+            scores = await pipe.execute()
+        return {user_id: score is not None and score > now for user_id, score in zip(user_ids, scores)}
+
+    def watch(self, watcher: uuid.UUID, user_ids: Iterable[uuid.UUID]):
+        for user_id in user_ids:
+            self.watchers[user_id].add(watcher)
+            self.interests[watcher].add(user_id)
+
+    def unwatch_all(self, watcher: uuid.UUID):
+        for user_id in self.interests.pop(watcher, ()):
+            watchers = self.watchers.get(user_id)
+            if watchers is not None:
+                watchers.discard(watcher)
+                if not watchers:
+                    del self.watchers[user_id]
+
+    def watchers_of(self, user_id: uuid.UUID) -> Set[uuid.UUID]:
+        return self.watchers.get(user_id, set())
+
+    async def flush(self) -> int:
+        """
+        Write the coalesced ``is_online`` changes, two UPDATE statements at most.
+
+        :return: number of users written
+        """
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        online = [user_id for user_id, is_online in pending.items() if is_online]
+        offline = [user_id for user_id, is_online in pending.items() if not is_online]
+        try:
+            async with self.session_maker() as session:
+                if online:
+                    await session.execute(update(User).where(User.id.in_(online)).values(is_online=True))
+                if offline:
+                    await session.execute(update(User).where(User.id.in_(offline)).values(is_online=False))
+                await session.commit()
+        except SQLAlchemyError as e:
+            # keep the changes for the next round, newer ones win
+            self._pending = {**pending, **self._pending}
+            logger.warning("presence flush failed", extra={"fields": {"error": repr(e), "pending": len(pending)}})
+            return 0
+        # the directory pages leave is_online out and read it live, no version bump here
+        return len(pending)
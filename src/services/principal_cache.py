@@ -0,0 +1,96 @@
+"""
+Cache of authenticated User principals.
+
+Every authenticated request and socket connect needs the User row for the token
+subject. Entries live in a per-process TTL/LRU cache, optionally backed by Redis so
+workers share warm entries. Updates to a User through the ORM invalidate it.
+
+Only the public fields go to Redis, never the password hash. A principal rebuilt
+from Redis has no password_hash; sign-in always reads the row itself.
+"""
+import asyncio
+import json
+import uuid
+from typing import Optional
+
+from cachetools import TTLCache
+from redis.asyncio import Redis
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from src.config import Config
+from src.database import redis_client
+from src.model.user import User, UserRead
+
+# what a principal shared through Redis carries
+PRINCIPAL_FIELDS = {"id", "name", "email", "is_online"}
+
+
+class PrincipalCache:
+    def __init__(self, maxsize: int, ttl: int, redis: Optional[Redis] = None):
+        self.ttl = ttl
+        self.redis = redis
+        self._local: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def _key(user_id: uuid.UUID) -> str:
+        return f"principal:{user_id}"
+
+    async def get(self, user_id: uuid.UUID) -> Optional[User]:
+        user = self._local.get(user_id)
+        if user is not None or self.redis is None:
+            return user
+        raw = await self.redis.get(self._key(user_id))
+        if raw is None:
+            return None
+        user = User(**UserRead.model_validate(json.loads(raw)).model_dump(include=PRINCIPAL_FIELDS))
+        self._local[user_id] = user
+        return user
+
+    async def set(self, user: User):
+        self._local[user.id] = user
+        if self.redis is not None:
+            public = user.model_dump(mode="json", include=PRINCIPAL_FIELDS)
+            await self.redis.set(self._key(user.id), json.dumps(public), ex=self.ttl)
+
+    async def invalidate(self, user_id: uuid.UUID):
+        self._local.pop(user_id, None)
+        if self.redis is not None:
+            await self.redis.delete(self._key(user_id))
+
+    def discard(self, user_id: uuid.UUID):
+        """sync variant of invalidate for ORM event hooks, the Redis delete is scheduled"""
+        self._local.pop(user_id, None)
+        if self.redis is not None:
+            asyncio.get_running_loop().create_task(self.redis.delete(self._key(user_id)))
+
+    async def get_or_load(self, user_id: uuid.UUID, db: AsyncSession) -> Optional[User]:
+        """
+        Return the principal for ``user_id``, only querying the database on a miss.
+
+        :param user_id: token subject
+        :param db: Async SQLAlchemy session, untouched on a cache hit
+        :return: User object or None if the user does not exist
+        """
+        user = await self.get(user_id)
+        if user is not None:
+            return user
+        result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalars().first()
+        if user is not None:
+            await self.set(user)
+        return user
+
+
+principal_cache = PrincipalCache(
+    maxsize=Config.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl=Config.PRINCIPAL_CACHE_TTL_SECONDS,
+    redis=redis_client if Config.PRINCIPAL_CACHE_REDIS else None,
+)
+
+
+@event.listens_for(User, "after_update")
+def _invalidate_updated_user(mapper, connection, target: User):
+    """drop the cached principal whenever a User row is flushed with changes"""
+    principal_cache.discard(target.id)
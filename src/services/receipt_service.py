@@ -0,0 +1,209 @@
+"""
+Delivered / read receipts as per-conversation high-water marks.
+
+Clients acknowledge the newest message they received or saw, never every message.
+Marks are coalesced in memory, only the highest one per (conversation, user) and
+kind is kept, and written every flush interval with one executemany UPDATE per
+kind. Scrolling through 500 messages is one write. Receipts are forwarded to the
+other participants once the marks are committed, one frame per mark.
+"""
+import asyncio
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, case, or_, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.config import Config
+from src.core.log import get_logger
+from src.database import async_session_maker
+from src.model.conversation import ConversationParticipant
+from src.websocket_manager.websocker_manger import manager
+
+logger = get_logger(__name__)
+
+DELIVERED = "delivered"
+READ = "read"
+RECEIPT_KINDS = frozenset({DELIVERED, READ})
+
+participants_table = ConversationParticipant.__table__
+
+ReceiptCallback = Callable[[uuid.UUID, dict], Awaitable[bool]]
+
+
+class _Mark:
+    __slots__ = ("timestamp", "message_id", "notify")
+
+    def __init__(self, timestamp: datetime, message_id: uuid.UUID, notify: Sequence[uuid.UUID]):
+        self.timestamp = timestamp
+        self.message_id = message_id
+        self.notify = notify
+
+
+class ReceiptService:
+    def __init__(
+        self,
+        session_maker: async_sessionmaker,
+        on_receipt: ReceiptCallback,
+        interval: float = 1.0,
+    ):
+        self.session_maker = session_maker
+        self.on_receipt = on_receipt
+        self.interval = interval
+        # kind -> (conversation id, user id) -> highest mark since the last flush
+        self._pending: Dict[str, Dict[Tuple[uuid.UUID, uuid.UUID], _Mark]] = {kind: {} for kind in RECEIPT_KINDS}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Write the outstanding marks, then stop."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def record(
+        self,
+        kind: str,
+        conversation_id: uuid.UUID,
+        user_id: uuid.UUID,
+        message_id: uuid.UUID,
+        timestamp: datetime,
+        notify: Sequence[uuid.UUID] = (),
+    ):
+        """
+        Move the user's ``kind`` mark of the conversation up to ``timestamp``, a read
+        mark moves the delivered mark as well. Lower marks than the pending one are ignored.
+
+        :param kind: ``delivered`` or ``read``
+        :param message_id: newest message covered by the mark
+        :param timestamp: that message's timestamp
+        :param notify: users to forward the receipt to once it is written
+        """
+        for moved in ((DELIVERED, READ) if kind == READ else (DELIVERED,)):
+            pending = self._pending[moved]
+            mark = pending.get((conversation_id, user_id))
+            if mark is None or timestamp > mark.timestamp:
+                pending[(conversation_id, user_id)] = _Mark(timestamp, message_id, notify)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("receipt flush failed")
+
+    async def flush(self) -> int:
+        """
+        Write the coalesced marks, one executemany UPDATE per kind, and forward them.
+        A mark never moves backwards, older marks from a slower device are no-ops.
+
+        :return: number of marks written
+        """
+        pending = self._pending
+        if not any(pending.values()):
+            return 0
+        self._pending = {kind: {} for kind in RECEIPT_KINDS}
+        try:
+            async with self.session_maker() as session:
+                delivered = pending[DELIVERED]
+                if delivered:
+                    await session.execute(
+                        update(participants_table)
+                        .where(
+                            participants_table.c.conversation_id == bindparam("b_conversation_id"),
+                            participants_table.c.user_id == bindparam("b_user_id"),
+                            or_(
+                                participants_table.c.last_delivered_at.is_(None),
+                                participants_table.c.last_delivered_at < bindparam("b_timestamp"),
+                            ),
+                        )
+                        .values(
+                            last_delivered_at=bindparam("b_timestamp"),
+                            last_delivered_message_id=bindparam("b_message_id"),
+                        ),
+                        self._params(delivered),
+                    )
+                read = pending[READ]
+                if read:
+                    # a read of the newest message clears the counter, no count over messages;
+                    # an older mark leaves it until the client reads up to the newest one
+                    unread = case(
+                        (participants_table.c.last_message_at <= bindparam("b_timestamp"), 0),
+                        else_=participants_table.c.unread_count,
+                    )
+                    await session.execute(
+                        update(participants_table)
+                        .where(
+                            participants_table.c.conversation_id == bindparam("b_conversation_id"),
+                            participants_table.c.user_id == bindparam("b_user_id"),
+                            or_(
+                                participants_table.c.last_read_at.is_(None),
+                                participants_table.c.last_read_at < bindparam("b_timestamp"),
+                            ),
+                        )
+                        .values(
+                            last_read_at=bindparam("b_timestamp"),
+                            last_read_message_id=bindparam("b_message_id"),
+                            unread_count=unread,
+                        ),
+                        self._params(read),
+                    )
+                await session.commit()
+        except SQLAlchemyError as e:
+            # keep the marks for the next round, the higher one wins
+            for kind, marks in pending.items():
+                for key, mark in marks.items():
+                    newer = self._pending[kind].get(key)
+                    if newer is None or mark.timestamp > newer.timestamp:
+                        self._pending[kind][key] = mark
+            logger.warning("receipt flush failed", extra={"fields": {
+                "error": repr(e), "pending": sum(len(marks) for marks in pending.values()),
+            }})
+            return 0
+
+        written = 0
+        for kind, marks in pending.items():
+            for (conversation_id, user_id), mark in marks.items():
+                written += 1
+                frame = {
+                    "type": "receipt",
+                    "status": kind,
+                    "conversation_id": str(conversation_id),
+                    "user_id": str(user_id),
+                    "message_id": str(mark.message_id),
+                    "timestamp": mark.timestamp.isoformat(),
+                }
+                # best effort, offline users read the marks from GET /message/conversations/{id}/receipts
+                for receiver in mark.notify:
+                    await self.on_receipt(receiver, frame)
+        return written
+
+    @staticmethod
+    def _params(marks: Dict[Tuple[uuid.UUID, uuid.UUID], _Mark]) -> List[dict]:
+        # bind names must differ from the column names in an executemany UPDATE
+        return [
+            {
+                "b_conversation_id": conversation_id,
+                "b_user_id": user_id,
+                "b_timestamp": mark.timestamp,
+                "b_message_id": mark.message_id,
+            }
+            for (conversation_id, user_id), mark in marks.items()
+        ]
+
+
+receipt_service = ReceiptService(
+    async_session_maker,
+    on_receipt=manager.send_to_user,
+    interval=Config.RECEIPT_FLUSH_INTERVAL_SECONDS,
+)
@@ -0,0 +1,164 @@
+"""
+Group rooms: a Conversation of kind ``group`` whose members are its
+ConversationParticipant rows. Room messages are stored once, with the room as
+conversation and no receiver, and the participant rows carry every member's
+unread counter and receipts exactly like a direct conversation.
+"""
+import uuid
+from typing import Iterable, List
+
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from src.config import Config
+from src.core.errors import DataBaseException, InvalidRoomMembers, RoomNotFound
+from src.model.conversation import GROUP, Conversation, ConversationParticipant
+from src.model.user import User
+
+
+async def get_room_ids(db: AsyncSession, user_id: uuid.UUID) -> List[uuid.UUID]:
+    """
+    Rooms ``user_id`` is a member of.
+
+    :param db: Async SQLAlchemy session
+    :param user_id: the member
+    """
+    try:
+        result = await db.execute(
+            select(ConversationParticipant.conversation_id)
+            .join(Conversation, Conversation.id == ConversationParticipant.conversation_id)
+            .where(ConversationParticipant.user_id == user_id, Conversation.kind == GROUP)
+        )
+    except SQLAlchemyError as e:
+        raise DataBaseException(detail=str(e))
+    return list(result.scalars().all())
+
+
+async def get_room(db: AsyncSession, room_id: uuid.UUID, user_id: uuid.UUID) -> Conversation:
+    """
+    The room, if ``user_id`` is a member.
+
+    :raises: RoomNotFound
+    """
+    try:
+        result = await db.execute(
+            select(Conversation)
+            .join(ConversationParticipant, ConversationParticipant.conversation_id == Conversation.id)
+            .where(
+                Conversation.id == room_id,
+                Conversation.kind == GROUP,
+                ConversationParticipant.user_id == user_id,
+            )
+        )
+    except SQLAlchemyError as e:
+        raise DataBaseException(detail=str(e))
+    room = result.scalars().first()
+    if room is None:
+        raise RoomNotFound()
+    return room
+
+
+async def count_members(db: AsyncSession, room_id: uuid.UUID) -> int:
+    try:
+        result = await db.execute(
+            select(func.count()).select_from(ConversationParticipant)
+            .where(ConversationParticipant.conversation_id == room_id)
+        )
+    except SQLAlchemyError as e:
+        raise DataBaseException(detail=str(e))
+    return result.scalar_one()
+
+
+async def _new_members(
+        db: AsyncSession, room_id: uuid.UUID, user_ids: Iterable[uuid.UUID], current: int,
+) -> List[uuid.UUID]:
+    """the users of ``user_ids`` that exist and are not members yet, within the member limit"""
+    user_ids = set(user_ids)
+    existing = await db.execute(select(User.id).where(User.id.in_(user_ids)))
+    unknown = user_ids - set(existing.scalars().all())
+    if unknown:
+        raise InvalidRoomMembers(f"unknown users {', '.join(sorted(str(u) for u in unknown))}")
+    joined = await db.execute(
+        select(ConversationParticipant.user_id).where(
+            ConversationParticipant.conversation_id == room_id,
+            ConversationParticipant.user_id.in_(user_ids),
+        )
+    )
+    new = list(user_ids - set(joined.scalars().all()))
+    if current + len(new) > Config.ROOM_MAX_MEMBERS:
+        raise InvalidRoomMembers(f"a room holds at most {Config.ROOM_MAX_MEMBERS} members")
+    return new
+
+
+async def create_room(
+        db: AsyncSession,
+        creator_id: uuid.UUID,
+        name: str,
+        member_ids: Iterable[uuid.UUID],
+) -> Conversation:
+    """
+    Create a room with ``creator_id`` and ``member_ids`` as members.
+
+    :param db: Async SQLAlchemy session
+    :param creator_id: the user creating it, always a member
+    :param name: display name
+    :param member_ids: the other initial members
+    :raises: InvalidRoomMembers, DataBaseException
+    """
+    room = Conversation(kind=GROUP, name=name, created_by=creator_id)
+    try:
+        members = await _new_members(db, room.id, {creator_id, *member_ids}, 0)
+        db.add(room)
+        await db.flush()
+        # the room shows up in every member's inbox right away
+        db.add_all([
+            ConversationParticipant(conversation_id=room.id, user_id=user_id, last_message_at=room.created_at)
+            for user_id in members
+        ])
+        await db.commit()
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise DataBaseException(detail=str(e))
+    return room
+
+
+async def add_members(db: AsyncSession, room: Conversation, user_ids: Iterable[uuid.UUID]) -> List[uuid.UUID]:
+    """
+    Add users to a room, history before they joined counts as read.
+
+    :return: the users that were not members before
+    :raises: InvalidRoomMembers, DataBaseException
+    """
+    try:
+        new = await _new_members(db, room.id, user_ids, await count_members(db, room.id))
+        db.add_all([
+            ConversationParticipant(
+                conversation_id=room.id,
+                user_id=user_id,
+                last_message_at=room.last_message_at or room.created_at,
+            )
+            for user_id in new
+        ])
+        await db.commit()
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise DataBaseException(detail=str(e))
+    return new
+
+
+async def remove_member(db: AsyncSession, room_id: uuid.UUID, user_id: uuid.UUID) -> bool:
+    """
+    :return: False if ``user_id`` was not a member
+    """
+    try:
+        participant = await db.get(ConversationParticipant, (room_id, user_id))
+        if participant is None:
+            return False
+        await db.delete(participant)
+        await db.commit()
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise DataBaseException(detail=str(e))
+    return True
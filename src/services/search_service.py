@@ -0,0 +1,94 @@
+"""
+Full-text search over the messages of a user's conversations.
+
+Postgres matches against the generated ``messages.search_vector`` column (GIN
+indexed, see the Alembic migration); SQLite uses the ``messages_fts`` FTS5 table
+created by init_db. Both indexes follow inserts on their own, nothing here writes.
+"""
+import re
+import uuid
+from typing import List, Optional, Tuple
+
+from sqlalchemy import column, func, literal_column, table
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from src.core.errors import DataBaseException
+from src.database import async_engine
+from src.model.conversation import ConversationParticipant
+from src.model.message import Message
+
+# must match the expression of the generated column in the migration
+TEXT_SEARCH_CONFIG = "english"
+
+_TERM = re.compile(r"\w+")
+
+messages_fts = table("messages_fts", column("rowid"))
+
+
+def fts5_query(text: str) -> str:
+    """every word as a quoted FTS5 term, so user input never reaches the query syntax"""
+    return " ".join(f'"{term}"' for term in _TERM.findall(text))
+
+
+def _postgres_search(text: str):
+    vector = literal_column("messages.search_vector")
+    query = func.websearch_to_tsquery(literal_column(f"'{TEXT_SEARCH_CONFIG}'::regconfig"), text)
+    rank = func.ts_rank_cd(vector, query)
+    return select(Message, rank.label("rank")).where(vector.op("@@")(query)), rank
+
+
+def _sqlite_search(text: str):
+    match = literal_column("messages_fts")
+    # bm25 is lower for better matches, negate it so higher is better on both backends
+    rank = -func.bm25(match)
+    stmt = (
+        select(Message, rank.label("rank"))
+        .join(messages_fts, messages_fts.c.rowid == literal_column("messages.rowid"))
+        .where(match.match(fts5_query(text)))
+    )
+    return stmt, rank
+
+
+async def search_messages(
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        text: str,
+        conversation_id: Optional[uuid.UUID] = None,
+        limit: int = 20,
+        offset: int = 0,
+) -> List[Tuple[Message, float]]:
+    """
+    Ranked messages matching ``text`` in the conversations ``user_id`` takes part in.
+
+    :param db: Async SQLAlchemy session
+    :param user_id: the searching user
+    :param text: free text, every word has to match
+    :param conversation_id: restrict the search to one conversation
+    :param limit: page size
+    :param offset: number of hits to skip
+    :return: (message, rank) pairs, best match first
+    """
+    if async_engine.dialect.name == "sqlite":
+        if not fts5_query(text):
+            return []
+        stmt, rank = _sqlite_search(text)
+    else:
+        stmt, rank = _postgres_search(text)
+
+    if conversation_id is not None:
+        stmt = stmt.where(Message.conversation_id == conversation_id)
+    else:
+        # direct conversations and rooms alike
+        conversations = select(ConversationParticipant.conversation_id).where(
+            ConversationParticipant.user_id == user_id
+        )
+        stmt = stmt.where(Message.conversation_id.in_(conversations))
+
+    stmt = stmt.order_by(rank.desc(), Message.timestamp.desc()).limit(limit).offset(offset)
+    try:
+        result = await db.execute(stmt)
+    except SQLAlchemyError as e:
+        raise DataBaseException(detail=str(e))
+    return [(message, rank) for message, rank in result.all()]
@@ -1,23 +1,30 @@
+import asyncio
 import uuid
 from asyncpg import UniqueViolationError
-from fastapi import Depends, HTTPException, WebSocketException,WebSocket
+from fastapi import Depends, HTTPException, Request, WebSocketException,WebSocket
 from fastapi.security import HTTPAuthorizationCredentials
 from jose import JWTError
-from redis import Redis
+from typing import Optional
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import event
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
 from starlette import status
 from src.core.dependencies import AccessTokenBearer
 from src.core.errors import UserAlreadyExists, DataBaseException, UserNotFound, InvalidCredentials
-from src.core.middleware.logging import logger
-from src.core.security import get_hashed_password, verify_password, create_access_token, get_id_from_token
-from src.database import get_db, get_redis
+from src.core.log import get_logger
+from src.core.security import get_hashed_password_async, verify_password_async, create_access_token, get_id_from_token
+from src.config import Config
+from src.database import get_db, get_redis, redis_client
 from src.model.request_models.request_models import UserCreate, UserLogin
-from src.model.user import User
+from src.model.user import User, UserRead
+from src.services.principal_cache import principal_cache
 import json
 
-
+logger = get_logger(__name__)
 
 access_bearer_token = AccessTokenBearer()
 async def create_new_user(user: UserCreate, db: AsyncSession) -> User:
@@ -30,7 +37,7 @@ async def create_new_user(user: UserCreate, db: AsyncSession) -> User:
     :raises: UserAlreadyExists, DataBaseException
     """
     try:
-        hash_password = get_hashed_password(user.password)
+        hash_password = await get_hashed_password_async(user.password)
         user_id = uuid.uuid4()
 
         db_user = User(
@@ -43,6 +50,7 @@ async def create_new_user(user: UserCreate, db: AsyncSession) -> User:
         db.add(db_user)
         await db.commit()
         await db.refresh(db_user)
+        await bump_directory_version(redis_client)
         return db_user
 
     except SQLAlchemyError as e:
@@ -68,7 +76,7 @@ async def authenticate_user(user:UserLogin ,db: AsyncSession) -> User:
         user_db = result.scalars().first()
         if user_db is None:
             raise UserNotFound()
-        verify_user_password = verify_password(user.password, user_db.password_hash)
+        verify_user_password = await verify_password_async(user.password, user_db.password_hash)
         if not verify_user_password:
             raise InvalidCredentials()
         return user_db
@@ -88,13 +96,13 @@ async def create_user_token(user: User, db: AsyncSession) -> str:
     return create_access_token(subject= str(user.id))
 
 
-async def get_current_user(token_details: HTTPAuthorizationCredentials = Depends(access_bearer_token),
+async def get_current_user(request: Request,
+                           token_details: HTTPAuthorizationCredentials = Depends(access_bearer_token),
                            db: AsyncSession = Depends(get_db)):
     try:
-        user_id = get_id_from_token(token_details.credentials)
-        statement = select(User).where(User.id == user_id)
-        result = await db.execute(statement)
-        db_user = result.scalars().first()
+        # AccessTokenBearer already decoded the token and stored its subject
+        user_id = uuid.UUID(request.state.user)
+        db_user = await principal_cache.get_or_load(user_id, db)
 
         if not db_user:
             raise UserNotFound()
@@ -109,15 +117,12 @@ async def get_current_user(token_details: HTTPAuthorizationCredentials = Depends
 
 async def get_current_user_ws(websocket: WebSocket, db: AsyncSession = Depends(get_db)) -> User:
     token = websocket.query_params.get("token")  # or websocket.headers.get("Authorization")
-    print(token,"----> token")
     if not token:
         raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Missing token")
 
     try:
-        user_id = get_id_from_token(token)
-        result = await db.execute(select(User).where(User.id == user_id))
-        user = result.scalars().first()
-        print(user,"----> User")
+        user_id = uuid.UUID(get_id_from_token(token))
+        user = await principal_cache.get_or_load(user_id, db)
         if not user:
             raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="User not found")
 
@@ -128,40 +133,104 @@ async def get_current_user_ws(websocket: WebSocket, db: AsyncSession = Depends(g
     except Exception as e:
         raise WebSocketException(code=status.WS_1011_INTERNAL_ERROR, reason=str(e))
 
-async def get_all_users(db: AsyncSession = Depends(get_db),redis:Redis = Depends(get_redis)):
+# hash fields of the directory version
+DIRECTORY_EPOCH_FIELD = "epoch"
+DIRECTORY_COUNTER_FIELD = "n"
+
+
+def directory_version_key() -> str:
+    return "users:directory:version"
+
+
+async def get_directory_version(redis: Redis) -> Optional[str]:
+    """
+    Current version of the user directory, bumped on every sign-up or profile change.
+
+    The version is ``<epoch>.<counter>``. A new epoch is drawn whenever the hash is
+    missing, so after a Redis flush or restart the counter starting over can never
+    hand out a version an old ETag or cached page was made under.
+
+    :param redis: redis client
+    :return: version, None when redis is unavailable
     """
-    Get all users from the database.
+    key = directory_version_key()
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hsetnx(key, DIRECTORY_EPOCH_FIELD, uuid.uuid4().hex[:12])
+            pipe.hmget(key, DIRECTORY_EPOCH_FIELD, DIRECTORY_COUNTER_FIELD)
+            _, (epoch, counter) = await pipe.execute()
+    except RedisError as e:
+        logger.warning("could not read user directory version", extra={"fields": {"error": repr(e)}})
+        return None
+    return f"{epoch}.{counter or 0}"
+
+
+async def bump_directory_version(redis: Redis) -> None:
+    """invalidate every cached directory page by moving to a new version"""
+    try:
+        await redis.hincrby(directory_version_key(), DIRECTORY_COUNTER_FIELD, 1)
+    except RedisError as e:
+        logger.warning("could not bump user directory version", extra={"fields": {"error": repr(e)}})
+
+
+async def get_all_users(db: AsyncSession = Depends(get_db),redis:Redis = Depends(get_redis),
+                        after: Optional[uuid.UUID] = None, limit: int = 100,
+                        version: Optional[str] = None) -> dict:
+    """
+    Get one page of users, ordered by id.
+
+    Pages are cached in redis under the directory version, so a bump on sign-up or
+    profile change invalidates all of them at once. ``is_online`` is left out of the
+    cached page, it changes far more often than the directory; callers fill it in
+    from presence.
 
     :param db: Async SQLAlchemy session
-    :return: List of User objects
+    :param redis: redis client
+    :param after: id of the last user of the previous page
+    :param limit: page size
+    :param version: directory version from get_directory_version, pages are only
+                    cached under a known version
+    :return: {"users": [...], "next_cursor": id or None}
     """
+    cache_key = None
+    if version is not None:
+        cache_key = f"users:directory:v{version}:{after or 'start'}:{limit}"
+        try:
+            cached = await redis.get(cache_key)
+            if cached:
+                return json.loads(cached)
+        except RedisError:
+            pass
+
     try:
-        statement = select(User)
+        statement = select(User).order_by(User.id).limit(limit + 1)
+        if after is not None:
+            statement = statement.where(User.id > after)
         result = await db.execute(statement)
         users = result.scalars().all()
-        return users
     except SQLAlchemyError as e:
         raise DataBaseException(detail=str(e))
 
-
-def serialize_user(user: User) -> dict:
-    """Convert User SQLModel to dict with UUIDs as strings"""
-    user_dict = user.model_dump()
-    user_dict["id"] = str(user.id)
-    return user_dict
-    #
-    # local_users = await redis.get("users")
-    #     if local_users:
-    #         # Deserialize JSON string back to Python objects (dicts)
-    #         return json.loads(local_users)
-    #     else:
-    #         statement = select(User)
-    #         result = await db.execute(statement)
-    #         users = result.scalars().all()
-    #
-    #         # Serialize list of user dicts for Redis (SQLModel -> dict -> JSON string)
-    #         users_data =  [serialize_user(user) for user in users]
-    #         await redis.set("users", json.dumps(users_data))
-    #
-    #         print("TAG --- ", users_data)
-    #         return users_data
\ No newline at end of file
+    has_more = len(users) > limit
+    users = users[:limit]
+    page = {
+        "users": [serialize_user(user, exclude={"is_online"}) for user in users],
+        "next_cursor": str(users[-1].id) if has_more else None,
+    }
+    if cache_key is not None:
+        try:
+            await redis.set(cache_key, json.dumps(page), ex=Config.USER_DIRECTORY_CACHE_TTL_SECONDS)
+        except RedisError:
+            pass
+    return page
+
+
+@event.listens_for(User, "after_update")
+def _bump_directory_on_update(mapper, connection, target: User):
+    """profile changes show up in the directory, drop the cached pages"""
+    asyncio.get_running_loop().create_task(bump_directory_version(redis_client))
+
+
+def serialize_user(user: User, exclude: Optional[set] = None) -> dict:
+    """Convert User SQLModel to its public fields with UUIDs as strings"""
+    return UserRead.model_validate(user).model_dump(mode="json", exclude=exclude)
@@ -0,0 +1,107 @@
+"""
+Admission control for /message/ws, so a mass reconnect after a deploy or a network
+blip is spread out instead of hitting the database and the presence fan-out at once.
+
+Handshakes (token check, principal lookup, room index, offline drain / device sync)
+are admitted through a per-node token bucket and a cap on handshakes in flight.
+A deferred client gets a ``{"type": "reconnect", "retry_after": ...}`` frame and a
+1013 (try again later) close. The hint is jittered over the time the node needs to
+admit everyone deferred so far, so the herd comes back spread out rather than in lockstep.
+
+While deferrals keep happening the node is in a storm, and presence deltas are
+coalesced (see ConnectionManager.publish_presence).
+"""
+import random
+import time
+
+from fastapi import WebSocket
+from starlette import status
+
+from src.core.log import get_logger
+from src.core.rate_limit import RateLimiter
+from src.websocket_manager.protocol import negotiate, send_frame
+
+logger = get_logger(__name__)
+
+
+class AdmissionControl:
+    def __init__(
+        self,
+        accept_rate: str = "200/1",
+        max_pending: int = 100,
+        jitter: float = 5.0,
+        storm_window: float = 10.0,
+        enabled: bool = True,
+    ):
+        """
+        :param accept_rate: handshakes this node starts, as ``"<count>/<seconds>"``
+        :param max_pending: handshakes allowed in flight at once
+        :param jitter: minimum spread of the reconnect hints, in seconds
+        :param storm_window: seconds after the last deferral the node still counts as in a storm
+        """
+        # one bucket for the whole node, deferring costs no tokens
+        self.limiter = RateLimiter("ws_accept", accept_rate)
+        self.max_pending = max_pending
+        self.jitter = jitter
+        self.storm_window = storm_window
+        self.enabled = enabled
+        self.pending = 0
+        self.admitted_total = 0
+        self.deferred_total = 0
+        # deferrals since the storm started, sizes the spread of the hints
+        self._storm_deferred = 0
+        self._storm_until = 0.0
+
+    @property
+    def storm(self) -> bool:
+        return time.monotonic() < self._storm_until
+
+    async def admit(self) -> float:
+        """
+        Reserve a handshake slot, release it with ``release`` once the handshake is done.
+
+        :return: 0 if admitted, otherwise the reconnect delay to hand to the client
+        """
+        if not self.enabled:
+            self.pending += 1
+            return 0.0
+        if self.pending >= self.max_pending:
+            wait = self.pending / self.limiter.rate
+        else:
+            wait = await self.limiter.retry_after("node")
+        if not wait:
+            self.pending += 1
+            self.admitted_total += 1
+            return 0.0
+        return self._defer(wait)
+
+    def release(self):
+        self.pending -= 1
+
+    def _defer(self, wait: float) -> float:
+        now = time.monotonic()
+        if now >= self._storm_until:
+            self._storm_deferred = 0
+            logger.warning("connection storm, deferring handshakes", extra={"fields": {"pending": self.pending}})
+        self._storm_deferred += 1
+        self._storm_until = now + self.storm_window
+        self.deferred_total += 1
+        # everyone deferred so far comes back over the time it takes to admit them
+        spread = max(self.jitter, self._storm_deferred / self.limiter.rate)
+        return wait + random.uniform(0, spread)
+
+    async def reject(self, websocket: WebSocket, retry_after: float):
+        """Tell a deferred client when to come back and close with 1013."""
+        codec = negotiate(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=codec.name)
+        retry_after = round(retry_after, 2)
+        await send_frame(websocket, codec, {"type": "reconnect", "retry_after": retry_after})
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason=f"retry after {retry_after}s")
+
+    def stats(self) -> dict:
+        return {
+            "handshakes_pending": self.pending,
+            "handshakes_admitted_total": self.admitted_total,
+            "handshakes_deferred_total": self.deferred_total,
+            "storm": self.storm,
+        }
@@ -0,0 +1,178 @@
+"""
+Redis pub/sub broker used by ConnectionManager to deliver across workers and nodes.
+
+Every node subscribes to its own channel (``ws:node:<node_id>``) and to the shared
+broadcast channel. The ``ws:route:<user_id>`` set holds the nodes with at least one
+of the user's devices connected, so a sender only publishes to the nodes that
+actually hold the receiver's sockets.
+
+A node also subscribes to ``ws:room:<room_id>`` for every room that has a member
+connected to it, so a room message is published once and only reaches the nodes
+with someone to deliver it to.
+"""
+import asyncio
+import json
+from typing import Awaitable, Callable, Optional, Set
+from uuid import UUID
+
+from redis.asyncio import Redis
+
+from src.core.log import get_logger
+
+logger = get_logger(__name__)
+
+# (target user or None for a broadcast, payload, device to skip)
+BrokerHandler = Callable[[Optional[str], dict, Optional[str]], Awaitable[None]]
+PresenceHandler = Callable[[dict], Awaitable[None]]
+RoomHandler = Callable[[UUID, dict, Optional[str]], Awaitable[None]]
+
+
+class RedisBroker:
+    ROUTE_PREFIX = "ws:route:"
+    BROADCAST_CHANNEL = "ws:broadcast"
+    PRESENCE_CHANNEL = "presence:deltas"
+    ROOM_CHANNEL_PREFIX = "ws:room:"
+
+    def __init__(self, redis: Redis, node_id: str):
+        self.redis = redis
+        self.node_id = node_id
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def node_channel(node_id: str) -> str:
+        return f"ws:node:{node_id}"
+
+    @classmethod
+    def room_channel(cls, room_id: UUID) -> str:
+        return f"{cls.ROOM_CHANNEL_PREFIX}{room_id}"
+
+    @classmethod
+    def route_key(cls, user_id: UUID) -> str:
+        return f"{cls.ROUTE_PREFIX}{user_id}"
+
+    async def register(self, user_id: UUID):
+        """Route messages for ``user_id`` to this node, called for the user's first local device."""
+        await self.redis.sadd(self.route_key(user_id), self.node_id)
+
+    async def unregister(self, user_id: UUID) -> int:
+        """
+        Stop routing ``user_id`` to this node, called when its last local device left.
+        Other nodes' entries are left alone, the user may still be connected there.
+
+        :return: number of nodes the user is still connected to
+        """
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.srem(self.route_key(user_id), self.node_id)
+            pipe.scard(self.route_key(user_id))
+            _, remaining = await pipe.execute()
+        return remaining
+
+    async def routes(self, user_id: UUID) -> Set[str]:
+        return await self.redis.smembers(self.route_key(user_id))
+
+    async def publish_to_user(
+        self,
+        user_id: UUID,
+        payload: dict,
+        exclude_device: Optional[str] = None,
+        skip_node: Optional[str] = None,
+    ) -> bool:
+        """
+        Publish ``payload`` to every node holding one of ``user_id``'s devices.
+
+        :param exclude_device: device that must not get it, the sending one
+        :param skip_node: node the caller already delivered on
+        :return: False when the user has no live route, so the caller can fall back
+                 to offline delivery.
+        """
+        nodes = await self.routes(user_id)
+        nodes.discard(skip_node)
+        if not nodes:
+            return False
+        message = json.dumps({"target": str(user_id), "payload": payload, "exclude_device": exclude_device})
+        delivered = False
+        for node_id in nodes:
+            receivers = await self.redis.publish(self.node_channel(node_id), message)
+            if receivers == 0:
+                # nobody listens on that node channel any more -> stale route
+                await self.redis.srem(self.route_key(user_id), node_id)
+            else:
+                delivered = True
+        return delivered
+
+    async def publish_broadcast(self, payload: dict):
+        await self.redis.publish(
+            self.BROADCAST_CHANNEL,
+            json.dumps({"target": None, "payload": payload}),
+        )
+
+    async def publish_presence(self, payload: dict):
+        await self.redis.publish(self.PRESENCE_CHANNEL, json.dumps(payload))
+
+    async def publish_to_room(self, room_id: UUID, payload: dict, exclude_device: Optional[str] = None):
+        await self.redis.publish(
+            self.room_channel(room_id),
+            json.dumps({"payload": payload, "exclude_device": exclude_device}),
+        )
+
+    async def subscribe_room(self, room_id: UUID):
+        """Start receiving ``room_id`` messages, called when its first local member connects."""
+        await self._pubsub.subscribe(self.room_channel(room_id))
+
+    async def unsubscribe_room(self, room_id: UUID):
+        await self._pubsub.unsubscribe(self.room_channel(room_id))
+
+    async def start(
+        self,
+        handler: BrokerHandler,
+        presence_handler: Optional[PresenceHandler] = None,
+        room_handler: Optional[RoomHandler] = None,
+    ):
+        """
+        Subscribe to this node's channels and deliver incoming messages through ``handler``.
+        Presence deltas go to ``presence_handler`` and room messages to ``room_handler``
+        (with the room id) instead of straight to the sockets.
+        """
+        self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        channels = [self.node_channel(self.node_id), self.BROADCAST_CHANNEL]
+        if presence_handler is not None:
+            channels.append(self.PRESENCE_CHANNEL)
+        await self._pubsub.subscribe(*channels)
+        self._listener = asyncio.create_task(self._listen(handler, presence_handler, room_handler))
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+
+    async def _listen(
+        self,
+        handler: BrokerHandler,
+        presence_handler: Optional[PresenceHandler],
+        room_handler: Optional[RoomHandler],
+    ):
+        async for message in self._pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            try:
+                if message["channel"] == self.PRESENCE_CHANNEL:
+                    await presence_handler(json.loads(message["data"]))
+                    continue
+                if message["channel"].startswith(self.ROOM_CHANNEL_PREFIX):
+                    if room_handler is not None:
+                        room_id = UUID(message["channel"][len(self.ROOM_CHANNEL_PREFIX):])
+                        envelope = json.loads(message["data"])
+                        await room_handler(room_id, envelope["payload"], envelope.get("exclude_device"))
+                    continue
+                envelope = json.loads(message["data"])
+                await handler(envelope.get("target"), envelope["payload"], envelope.get("exclude_device"))
+            except Exception:
+                logger.exception("broker delivery failed", extra={"fields": {"channel": message["channel"]}})
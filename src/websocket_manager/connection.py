@@ -0,0 +1,156 @@
+"""
+Per-socket outbound queue drained by a dedicated writer task.
+
+Senders never await the network: they enqueue and move on, so one slow client
+can only fill its own queue instead of stalling every broadcast.
+
+A node holds one of these per socket, most of them idle, so the record is slotted
+and the queue and its writer task only exist while there is something to send.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Callable, List, Optional
+from uuid import UUID
+
+from fastapi import WebSocket
+from starlette import status
+
+from src.websocket_manager.protocol import CHAT_FRAME_TYPES, DEFAULT_CODEC, Codec, SharedFrame, send_frame
+
+DROP = "drop"
+DISCONNECT = "disconnect"
+
+
+class Connection:
+    __slots__ = (
+        "websocket", "user_id", "device_id", "cursor", "cursor_saved", "codec", "queue", "max_queue",
+        "slow_policy", "slow_grace", "on_slow_disconnect", "sent", "dropped", "closed", "last_seen",
+        "offline_batch_id", "offline_pending", "resumable", "_full_since", "_writer",
+    )
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: UUID,
+        max_queue: int,
+        slow_policy: str = DROP,
+        slow_grace: float = 5.0,
+        on_slow_disconnect: Optional[Callable[["Connection"], None]] = None,
+        codec: Codec = DEFAULT_CODEC,
+        device_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+        resumable: bool = False,
+    ):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.device_id = device_id
+        # timestamp of the newest message written to this socket, the device resumes after it
+        self.cursor = cursor
+        self.cursor_saved = cursor
+        # only a device id the client keeps is worth a stored cursor
+        self.resumable = resumable
+        self.codec = codec
+        self.queue: Optional[deque] = None
+        self.max_queue = max_queue
+        self.slow_policy = slow_policy
+        self.slow_grace = slow_grace
+        self.on_slow_disconnect = on_slow_disconnect
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+        # last frame received from the client, drives the presence heartbeat
+        self.last_seen = time.monotonic()
+        # offline batch currently waiting for the client's ack
+        self.offline_batch_id = 0
+        self.offline_pending: Optional[List[str]] = None
+        self._full_since: Optional[float] = None
+        self._writer: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self.queue) if self.queue else 0
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def send(self, payload) -> bool:
+        """
+        Enqueue ``payload`` (a frame dict or a SharedFrame) without waiting on the socket.
+
+        :return: False when the payload was dropped because the queue is full
+        """
+        if self.closed:
+            return False
+        if self.queue is None:
+            self.queue = deque()
+        elif len(self.queue) >= self.max_queue:
+            self.dropped += 1
+            now = time.monotonic()
+            if self._full_since is None:
+                self._full_since = now
+            elif self.slow_policy == DISCONNECT and now - self._full_since >= self.slow_grace:
+                self._disconnect_slow()
+            return False
+        self.queue.append(payload)
+        self._full_since = None
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._drain())
+        return True
+
+    def pending(self) -> list:
+        """Take whatever is still queued, used to hand undelivered messages to the offline queue."""
+        items = list(self.queue or ())
+        self.queue = None
+        return items
+
+    async def close(self, code: Optional[int] = None, reason: str = ""):
+        """Stop the writer, and with a ``code`` also close the socket itself."""
+        self.closed = True
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+        self._writer = None
+        if code is not None:
+            try:
+                await self.websocket.close(code=code, reason=reason)
+            except Exception:
+                pass
+
+    async def _drain(self):
+        """Write until the queue is empty, the next send starts a new writer."""
+        while self.queue:
+            payload = self.queue.popleft()
+            try:
+                await send_frame(self.websocket, self.codec, payload)
+            except Exception:
+                # socket is gone, the receive loop will clean up
+                self.closed = True
+                return
+            self.sent += 1
+            frame = payload.payload if isinstance(payload, SharedFrame) else payload
+            if isinstance(frame, dict):
+                # chat frames carry their timestamp, sync frames the position they end at
+                cursor = frame.get("cursor") or (frame.get("timestamp") if frame.get("type") in CHAT_FRAME_TYPES else None)
+                if cursor is not None and (self.cursor is None or cursor > self.cursor):
+                    self.cursor = cursor
+        # an empty deque still holds a 64 slot block, idle sockets keep none
+        self.queue = None
+        self._writer = None
+
+    def _disconnect_slow(self):
+        self.closed = True
+        if self._writer is not None:
+            self._writer.cancel()
+        if self.on_slow_disconnect is not None:
+            self.on_slow_disconnect(self)
+        asyncio.create_task(self._close_socket())
+
+    async def _close_socket(self):
+        try:
+            await self.websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="slow consumer")
+        except Exception:
+            pass
@@ -0,0 +1,36 @@
+"""
+Per-device resume positions, one Redis hash per user (``user:<id>:cursors``,
+device id -> timestamp of the newest message written to that device).
+
+Cursors move in memory on every frame and are only written when a device
+disconnects and once per presence round for the ones that moved, never per message.
+"""
+from typing import Iterable, Optional, Tuple
+from uuid import UUID
+
+from redis.asyncio import Redis
+
+
+class DeviceCursors:
+    def __init__(self, redis: Redis, ttl: int):
+        self.redis = redis
+        self.ttl = ttl
+
+    @staticmethod
+    def key(user_id: UUID) -> str:
+        return f"user:{user_id}:cursors"
+
+    async def get(self, user_id: UUID, device_id: str) -> Optional[str]:
+        return await self.redis.hget(self.key(user_id), device_id)
+
+    async def save(self, cursors: Iterable[Tuple[UUID, str, str]]):
+        """Write (user id, device id, cursor) entries in one round trip."""
+        cursors = list(cursors)
+        if not cursors:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id, device_id, cursor in cursors:
+                pipe.hset(self.key(user_id), device_id, cursor)
+                # devices that stop connecting age out with the whole hash
+                pipe.expire(self.key(user_id), self.ttl)
+            await pipe.execute()
@@ -0,0 +1,71 @@
+"""
+Redis list of messages for users that were offline when they were sent.
+
+New entries are LPUSHed, so the oldest message sits at the tail. Draining reads
+batches from the tail and only removes them once the client acknowledged the batch,
+every step being a single pipelined round trip. Acked entries are removed by value,
+not by position: the length cap may already have trimmed part of a batch in flight,
+and trimming by count would then take messages the client never got.
+"""
+import json
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from redis.asyncio import Redis
+
+
+class OfflineQueue:
+    def __init__(self, redis: Redis, max_len: int, ttl: int, batch_size: int):
+        self.redis = redis
+        self.max_len = max_len
+        self.ttl = ttl
+        self.batch_size = batch_size
+
+    @staticmethod
+    def key(user_id: UUID) -> str:
+        return f"user:{user_id}:messages"
+
+    async def push(self, user_id: UUID, payload: dict):
+        """Queue ``payload``, keeping only the newest ``max_len`` entries for ``ttl`` seconds."""
+        key = self.key(user_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.lpush(key, json.dumps(payload))
+            pipe.ltrim(key, 0, self.max_len - 1)
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def fetch(self, user_id: UUID) -> Tuple[List[str], int]:
+        """
+        Read the oldest batch without removing it.
+
+        :return: raw entries oldest first, and the total queue length
+        """
+        key = self.key(user_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.lrange(key, -self.batch_size, -1)
+            pipe.llen(key)
+            batch, total = await pipe.execute()
+        return batch[::-1], total
+
+    async def ack_and_fetch(self, user_id: UUID, entries: List[str]) -> Tuple[List[str], int]:
+        """
+        Remove the acknowledged ``entries`` and read the next batch.
+
+        :param entries: the raw entries of the acked batch, as returned by fetch
+        """
+        key = self.key(user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for entry in entries:
+                # the occurrence closest to the tail is the one that was sent
+                pipe.lrem(key, -1, entry)
+            pipe.lrange(key, -self.batch_size, -1)
+            pipe.llen(key)
+            *_, batch, total = await pipe.execute()
+        return batch[::-1], total
+
+    async def clear(self, user_id: UUID):
+        await self.redis.delete(self.key(user_id))
+
+    @staticmethod
+    def decode(entries: Optional[List[str]]) -> List[dict]:
+        return [json.loads(entry) for entry in entries or ()]
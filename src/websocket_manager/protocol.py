@@ -0,0 +1,203 @@
+"""
+Wire formats for /message/ws, negotiated through the WebSocket subprotocol header.
+
+    chat.msgpack  binary msgpack frames
+    chat.json     text frames encoded with orjson
+    (none)        stdlib json text frames, what existing clients speak
+
+Every frame is a map with a ``type`` discriminator. Frames from the client are
+checked against the TypedDicts below on receipt: unknown types and bad fields are
+answered with an error frame before the handler sees them.
+"""
+import json
+import uuid
+from typing import Annotated, Any, Dict, List, Literal, Optional, Sequence, Union
+
+import msgpack
+import orjson
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import AfterValidator, Field, TypeAdapter, ValidationError
+# pydantic only reads TypedDict field metadata from typing_extensions before Python 3.12
+from typing_extensions import NotRequired, TypedDict
+
+
+# frames that carry a chat message and must survive an offline receiver
+CHAT_FRAME_TYPES = frozenset({"message", "image", "video"})
+
+Frame = Dict[str, Any]
+
+# one presence_subscribe covers at most a full directory page (/user/get_all_users limit)
+MAX_PRESENCE_SUBSCRIBE = 500
+
+
+class FrameError(ValueError):
+    """A client frame that could not be decoded or does not match the envelope."""
+
+
+def _uuid_str(value: str) -> str:
+    uuid.UUID(value)
+    return value
+
+
+# ids stay strings on the frame, checked to parse as UUIDs
+UuidStr = Annotated[str, AfterValidator(_uuid_str)]
+
+
+# what a client may send; fields not listed here are dropped
+class HeartbeatFrame(TypedDict):
+    type: Literal["heartbeat"]
+
+
+class OfflineAckFrame(TypedDict):
+    type: Literal["offline_ack"]
+    batch_id: int
+
+
+class PresenceSubscribeFrame(TypedDict):
+    type: Literal["presence_subscribe"]
+    # bounds the presence lookup and the reply a single frame can cause
+    user_ids: Annotated[List[UuidStr], Field(max_length=MAX_PRESENCE_SUBSCRIBE)]
+
+
+class ReceiptAckFrame(TypedDict):
+    type: Literal["delivered", "read"]
+    conversation_id: UuidStr
+    message_id: UuidStr
+    timestamp: str
+
+
+class MessageFrame(TypedDict):
+    type: Literal["message"]
+    content: str
+    receiver_id: NotRequired[UuidStr]
+    room_id: NotRequired[UuidStr]
+    client_id: NotRequired[Optional[str]]
+
+
+class MediaFrame(TypedDict):
+    type: Literal["image", "video"]
+    media_id: UuidStr
+    content: NotRequired[str]
+    receiver_id: NotRequired[UuidStr]
+    room_id: NotRequired[UuidStr]
+    client_id: NotRequired[Optional[str]]
+
+
+ClientFrame = Union[
+    HeartbeatFrame, OfflineAckFrame, PresenceSubscribeFrame, ReceiptAckFrame, MessageFrame, MediaFrame,
+]
+_client_frame = TypeAdapter(Annotated[ClientFrame, Field(discriminator="type")])
+
+
+def parse_frame(data: Any) -> ClientFrame:
+    """
+    Check a decoded client frame against the envelope of its ``type``.
+
+    :raises: FrameError naming the unknown type or the first bad field
+    """
+    try:
+        return _client_frame.validate_python(data)
+    except ValidationError as e:
+        error = e.errors()[0]
+        if error["type"] in ("union_tag_invalid", "union_tag_not_found", "model_attributes_type", "dict_type"):
+            kind = data.get("type") if isinstance(data, dict) else None
+            raise FrameError(f"Unknown message type: {kind}")
+        field = ".".join(str(part) for part in error["loc"][1:])
+        raise FrameError(f"Invalid {data.get('type')} frame – {field}: {error['msg']}")
+
+
+class JsonCodec:
+    """stdlib json text frames, the default when no subprotocol is requested"""
+    name: Optional[str] = None
+    binary = False
+
+    @staticmethod
+    def encode(payload: Frame) -> str:
+        return json.dumps(payload)
+
+    @staticmethod
+    def decode(data: Union[str, bytes]) -> Frame:
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    name = "chat.json"
+    binary = False
+
+    @staticmethod
+    def encode(payload: Frame) -> str:
+        return orjson.dumps(payload).decode()
+
+    @staticmethod
+    def decode(data: Union[str, bytes]) -> Frame:
+        return orjson.loads(data)
+
+
+class MsgpackCodec:
+    name = "chat.msgpack"
+    binary = True
+
+    @staticmethod
+    def encode(payload: Frame) -> bytes:
+        return msgpack.packb(payload, use_bin_type=True)
+
+    @staticmethod
+    def decode(data: Union[str, bytes]) -> Frame:
+        return msgpack.unpackb(data, raw=False)
+
+
+Codec = Union[JsonCodec, OrjsonCodec, MsgpackCodec]
+
+CODECS: Dict[str, Codec] = {OrjsonCodec.name: OrjsonCodec(), MsgpackCodec.name: MsgpackCodec()}
+DEFAULT_CODEC = JsonCodec()
+
+
+def negotiate(requested: Sequence[str]) -> Codec:
+    """Pick the first subprotocol the client offered that we speak, in the client's order."""
+    for name in requested:
+        codec = CODECS.get(name)
+        if codec is not None:
+            return codec
+    return DEFAULT_CODEC
+
+
+class SharedFrame:
+    """A payload queued on many sockets, encoded at most once per codec."""
+    __slots__ = ("payload", "_encoded")
+
+    def __init__(self, payload: Frame):
+        self.payload = payload
+        self._encoded: Dict[Optional[str], Union[str, bytes]] = {}
+
+    def encode(self, codec: Codec) -> Union[str, bytes]:
+        data = self._encoded.get(codec.name)
+        if data is None:
+            data = self._encoded[codec.name] = codec.encode(self.payload)
+        return data
+
+
+async def send_frame(websocket: WebSocket, codec: Codec, payload: Union[Frame, SharedFrame]):
+    data = payload.encode(codec) if isinstance(payload, SharedFrame) else codec.encode(payload)
+    if codec.binary:
+        await websocket.send_bytes(data)
+    else:
+        await websocket.send_text(data)
+
+
+async def receive_frame(websocket: WebSocket, codec: Codec) -> ClientFrame:
+    """
+    Read, decode and check one frame, text or binary.
+
+    :raises: WebSocketDisconnect on close, FrameError for a frame the socket should survive
+    """
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+    data = message.get("bytes")
+    if data is None:
+        data = message.get("text")
+    try:
+        decoded = codec.decode(data)
+    except (ValueError, TypeError, msgpack.UnpackException):
+        raise FrameError("Frame could not be decoded")
+    return parse_frame(decoded)
@@ -0,0 +1,78 @@
+"""
+The node's connection registry: user -> device id -> Connection.
+
+The users are split over a fixed number of shards by hash. At 100k sockets a single
+dict resizes by copying every entry, which stalls the event loop at the moment a
+storm of connects is arriving. Small shards resize in microseconds. The shards also
+let broadcast-sized fan-out yield to the event loop between shards instead of
+enqueueing on every socket in one go.
+
+Nothing else about a connection is stored here. Whether a user is online here is
+``user_id in registry``, so no separate set of online users is kept.
+"""
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from src.websocket_manager.connection import Connection
+
+Devices = Dict[str, Connection]
+
+
+class ConnectionRegistry:
+    __slots__ = ("_shards", "_mask")
+
+    def __init__(self, shards: int = 64):
+        """
+        :param shards: rounded up to a power of two
+        """
+        count = 1
+        while count < shards:
+            count <<= 1
+        self._shards: List[Dict[UUID, Devices]] = [{} for _ in range(count)]
+        self._mask = count - 1
+
+    def _shard(self, user_id: UUID) -> Dict[UUID, Devices]:
+        return self._shards[hash(user_id) & self._mask]
+
+    def get(self, user_id: UUID) -> Optional[Devices]:
+        return self._shard(user_id).get(user_id)
+
+    def setdefault(self, user_id: UUID) -> Devices:
+        """the devices of ``user_id``, registering the user if it has none yet"""
+        return self._shard(user_id).setdefault(user_id, {})
+
+    def __contains__(self, user_id: UUID) -> bool:
+        return user_id in self._shard(user_id)
+
+    def __delitem__(self, user_id: UUID):
+        del self._shard(user_id)[user_id]
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    @property
+    def shards(self) -> List[Dict[UUID, Devices]]:
+        return self._shards
+
+    def items(self) -> Iterator[Tuple[UUID, Devices]]:
+        for shard in self._shards:
+            yield from shard.items()
+
+    def values(self) -> Iterator[Devices]:
+        for shard in self._shards:
+            yield from shard.values()
+
+    def connections(self) -> Iterator[Connection]:
+        for devices in self.values():
+            yield from devices.values()
+
+    def container_bytes(self) -> int:
+        """size of the shards, device dicts and user id keys, the connection records excluded"""
+        return sys.getsizeof(self._shards) + sum(
+            sys.getsizeof(shard) + sum(
+                sys.getsizeof(devices) + sys.getsizeof(user_id) + sys.getsizeof(user_id.int)
+                for user_id, devices in shard.items()
+            )
+            for shard in self._shards
+        )
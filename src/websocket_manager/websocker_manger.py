@@ -1,62 +1,692 @@
 import asyncio
+import itertools
+import sys
+import time
+import weakref
+from datetime import datetime
 from uuid import UUID
-from typing import Dict, Set, Optional
+from typing import Dict, Iterable, List, Set, Optional, Union
 
 from fastapi import WebSocket
-from src.database import get_redis  # you'll still use this in your WS endpoint
+from redis.asyncio import Redis
+from starlette import status
+
+from src.config import Config
+from src.core.log import get_logger
+from src.core.metrics import MESSAGES_DELIVERED, MESSAGES_OFFLINE, WS_FANOUT_DURATION
+from src.database import async_session_maker, redis_client
+from src.model.conversation import GROUP
+from src.model.message import Message
+from src.services.media_service import media_kind
+from src.services.message_service import get_messages_since
+from src.services.presence_service import PresenceService
+from src.services.room_service import get_room_ids
+from src.websocket_manager.admission import AdmissionControl
+from src.websocket_manager.broker import RedisBroker
+from src.websocket_manager.connection import Connection
+from src.websocket_manager.device_cursors import DeviceCursors
+from src.websocket_manager.offline_queue import OfflineQueue
+from src.websocket_manager.registry import ConnectionRegistry
+from src.websocket_manager.protocol import CHAT_FRAME_TYPES, SharedFrame, negotiate
+
+logger = get_logger(__name__)
+
+# membership changes, applied to the room index of the node holding the user
+ROOM_JOINED = "room_joined"
+ROOM_LEFT = "room_left"
+
+
+def message_frame(message: Message, conversation_kind: str, content_type: Optional[str]) -> dict:
+    """the live frame shape of a stored message, for devices catching up"""
+    frame = {
+        "type": media_kind(content_type) if content_type else "message",
+        "content": message.content,
+        "sender_id": str(message.sender_id),
+        "message_id": str(message.id),
+        "conversation_id": str(message.conversation_id),
+        "timestamp": message.timestamp.isoformat(),
+    }
+    if conversation_kind == GROUP:
+        frame["room_id"] = str(message.conversation_id)
+    else:
+        frame["receiver_id"] = str(message.receiver_id)
+    if message.media_id is not None:
+        frame["media_id"] = str(message.media_id)
+    return frame
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[UUID, WebSocket] = {}
-        self.online_users: Set[UUID] = set()
-        self.redis_conn: Optional = None
+    def __init__(
+        self,
+        redis_conn: Redis,
+        node_id: str,
+        distributed: bool = False,
+        send_queue_size: int = 256,
+        slow_consumer_policy: str = "drop",
+        slow_consumer_grace: float = 5.0,
+        offline_queue: Optional[OfflineQueue] = None,
+        presence: Optional[PresenceService] = None,
+        presence_interval: float = 5.0,
+        cursors: Optional[DeviceCursors] = None,
+        sync_max_messages: int = 500,
+        admission: Optional[AdmissionControl] = None,
+        storm_presence_interval: float = 2.0,
+        registry_shards: int = 64,
+    ):
+        # user -> device id -> connection, a user is online here while any device is
+        self.active_connections = ConnectionRegistry(registry_shards)
+        # room -> its members connected here, and the reverse; fan-out never looks at offline members
+        self.rooms: Dict[UUID, Set[UUID]] = {}
+        self.user_rooms: Dict[UUID, Set[UUID]] = {}
+        # one UUID object per room, shared by every member's user_rooms entry
+        self._room_ids: Dict[UUID, UUID] = {}
+        # connect / disconnect of one user run one at a time, a lock lives while someone holds it
+        self._user_locks: "weakref.WeakValueDictionary[UUID, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self.redis_conn: Redis = redis_conn
+        self.offline = offline_queue or OfflineQueue(redis_conn, max_len=1000, ttl=7 * 24 * 3600, batch_size=100)
+        self.cursors = cursors or DeviceCursors(redis_conn, ttl=30 * 24 * 3600)
+        self.sync_max_messages = sync_max_messages
+        self.send_queue_size = send_queue_size
+        self.slow_consumer_policy = slow_consumer_policy
+        self.slow_consumer_grace = slow_consumer_grace
+        # counters kept across connections so they survive disconnects
+        self.dropped_total = 0
+        self.slow_disconnects = 0
+        self.replaced_total = 0
+        # with more than one worker / node, delivery goes through redis pub/sub
+        self.broker: Optional[RedisBroker] = RedisBroker(redis_conn, node_id) if distributed else None
+        self.presence = presence or PresenceService(redis_conn, async_session_maker)
+        self.presence_interval = presence_interval
+        self._presence_task: Optional[asyncio.Task] = None
+        self.admission = admission or AdmissionControl()
+        # presence deltas held back during a connection storm, user -> latest state
+        self.storm_presence_interval = storm_presence_interval
+        self._presence_pending: Dict[UUID, bool] = {}
+        self._coalesce_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start the pub/sub subscriber (distributed mode only) and the presence heartbeat."""
+        if self.broker is not None:
+            await self.broker.start(
+                self._deliver_local, presence_handler=self._apply_presence, room_handler=self._deliver_room,
+            )
+        self._presence_task = asyncio.create_task(self._presence_loop())
+
+    async def stop(self):
+        if self._presence_task is not None:
+            self._presence_task.cancel()
+            try:
+                await self._presence_task
+            except asyncio.CancelledError:
+                pass
+            self._presence_task = None
+        if self._coalesce_task is not None:
+            self._coalesce_task.cancel()
+        await self.flush_presence()
+        await self.save_cursors()
+        await self.presence.flush()
+        if self.broker is not None:
+            await self.broker.stop()
+
+    def connections(self) -> Iterable[Connection]:
+        return self.active_connections.connections()
+
+    def _user_lock(self, user_id: UUID) -> asyncio.Lock:
+        lock = self._user_locks.get(user_id)
+        if lock is None:
+            lock = self._user_locks[user_id] = asyncio.Lock()
+        return lock
 
     async def connect(
         self,
         websocket: WebSocket,
         user_id: UUID,
-        # redis_conn  # pass this in from your endpoint
+        device_id: str,
+        resumable: bool = True,
+    ) -> Connection:
+        """
+        Register a device of ``user_id``. The same device connecting again replaces
+        its previous socket without the user ever going offline.
+
+        :param device_id: id of the device, the same device connecting again replaces its socket
+        :param resumable: ``device_id`` is one the client keeps, so its cursor is stored and resumed
+        """
+        codec = negotiate(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=codec.name)
+        async with self._user_lock(user_id):
+            conn, resume = await self._register(websocket, user_id, device_id, resumable, codec)
+        # catching up only concerns this socket, it does not hold up the user's other devices
+        if resume == "sync":
+            await self.sync_device(conn)
+        elif resume == "offline":
+            await self.drain_offline(conn)
+        return conn
+
+    async def _register(self, websocket: WebSocket, user_id: UUID, device_id: str, resumable: bool, codec):
+        """:return: the connection, and how it catches up: "sync", "offline" or None"""
+        devices = self.active_connections.setdefault(user_id)
+        previous = devices.get(device_id)
+        if previous is not None:
+            cursor = previous.cursor
+        elif resumable:
+            cursor = await self.cursors.get(user_id, device_id)
+        else:
+            cursor = None
+        conn = Connection(
+            websocket,
+            user_id,
+            max_queue=self.send_queue_size,
+            slow_policy=self.slow_consumer_policy,
+            slow_grace=self.slow_consumer_grace,
+            on_slow_disconnect=self._on_slow_disconnect,
+            codec=codec,
+            device_id=device_id,
+            cursor=cursor,
+            resumable=resumable,
+        )
+        first_device = not devices
+        devices[device_id] = conn
+        if previous is not None:
+            # a reconnect raced the old socket's teardown, whatever it still had queued moves over
+            self.replaced_total += 1
+            await previous.close(code=status.WS_1000_NORMAL_CLOSURE, reason="replaced by a newer connection")
+            for payload in previous.pending():
+                conn.send(payload)
+        logger.debug("connected", extra={"fields": {
+            "user_id": user_id, "device_id": device_id, "codec": codec.name, "devices": len(devices),
+        }})
+        if first_device:
+            if self.broker is not None:
+                await self.broker.register(user_id)
+            async with async_session_maker() as session:
+                room_ids = await get_room_ids(session, user_id)
+            for room_id in room_ids:
+                await self._join_local(room_id, user_id)
+            # a user going from one device to two is not a presence change
+            if await self.presence.mark_online(user_id):
+                await self.publish_presence(user_id, is_online=True)
+        if previous is None:
+            if cursor is not None:
+                return conn, "sync"
+            if first_device:
+                return conn, "offline"
+        return conn, None
+
+    async def disconnect(self, conn: Connection):
+        """
+        Drop ``conn``. The user stays online, in their rooms and routed here as long
+        as another device is connected.
+        """
+        async with self._user_lock(conn.user_id):
+            await self._unregister(conn)
+
+    async def _unregister(self, conn: Connection):
+        devices = self.active_connections.get(conn.user_id)
+        if devices is None or devices.get(conn.device_id) is not conn:
+            # already replaced by a newer socket of the same device
+            await conn.close()
+            return
+        del devices[conn.device_id]
+        await conn.close()
+        self.dropped_total += conn.dropped
+        await self._save_cursor(conn)
+        if devices:
+            return
+
+        user_id = conn.user_id
+        del self.active_connections[user_id]
+        # chat messages that never left the queue go to offline delivery
+        for payload in conn.pending():
+            if isinstance(payload, dict) and payload.get("type") in CHAT_FRAME_TYPES:
+                await self.push_offline(user_id, payload)
+        for room_id in list(self.user_rooms.get(user_id, ())):
+            await self._leave_local(room_id, user_id)
+        self.presence.unwatch_all(user_id)
+        remaining_nodes = 0
+        if self.broker is not None:
+            remaining_nodes = await self.broker.unregister(user_id)
+        # still connected through another node, that node keeps the presence entry alive
+        if not remaining_nodes and await self.presence.mark_offline(user_id):
+            await self.publish_presence(user_id, is_online=False)
+
+    def _send_local(
+        self, user_id: UUID, payload: Union[dict, SharedFrame], exclude_device: Optional[str] = None,
+    ) -> bool:
+        """
+        Queue ``payload`` on every device of ``user_id`` connected here.
+
+        :return: True if at least one device took it
+        """
+        devices = self.active_connections.get(user_id)
+        if not devices:
+            return False
+        if len(devices) > 1 and not isinstance(payload, SharedFrame):
+            # encoded once for all of the user's devices
+            payload = SharedFrame(payload)
+        sent = False
+        for device_id, conn in devices.items():
+            if device_id != exclude_device:
+                sent = conn.send(payload) or sent
+        return sent
+
+    async def send_personal_message(
+        self,
+        message: str,
+        user_id: UUID,
+        sender_id: Optional[UUID] = None,
+        meta: Optional[dict] = None,
+        kind: str = "message",
+        echo_device: Optional[str] = None,
     ):
-        await websocket.accept()
-        # self.redis_conn = redis_conn
-        self.active_connections[user_id] = websocket
-        self.online_users.add(user_id)
-        print(f"Connected: {self.active_connections.keys()}")
-        await self.broadcast_status(user_id, is_online=True)
-
-    def disconnect(self, user_id: UUID):
-        ws = self.active_connections.pop(user_id, None)
-        if ws:
-            self.online_users.discard(user_id)
-            # schedule the status broadcast without blocking
-            asyncio.create_task(self.broadcast_status(user_id, is_online=False))
-
-    async def send_personal_message(self, message: str, user_id: UUID):
-        ws = self.active_connections.get(user_id)
-        if ws:
-            await ws.send_text(message)
-        else:
-            # fallback: push to Redis list for offline delivery
-            await self.redis_conn.lpush(f"user:{user_id}:messages", message)
-
-    async def broadcast_status(self, user_id: UUID, is_online: bool):
+        """
+        Deliver a chat message to every device of ``user_id``, falling back to the offline queue.
+
+        :param meta: extra JSON-ready fields for the frame (message_id, timestamp, ...)
+        :param kind: frame type, ``message`` or a media kind (``image`` / ``video``)
+        :param echo_device: sending device, the sender's other devices get a copy
+        """
+        payload = {
+            "type": kind,
+            "content": message,
+            "sender_id": str(sender_id) if sender_id else None,
+            **(meta or {}),
+        }
+        local = self._send_local(user_id, payload)
+        remote = False
+        if self.broker is not None:
+            # the user's other devices may be connected to other nodes
+            remote = await self.broker.publish_to_user(user_id, payload, skip_node=self.broker.node_id)
+        if local or remote:
+            MESSAGES_DELIVERED.labels("local" if local else "remote").inc()
+        else:
+            # not connected anywhere, or every queue is full: keep it for offline delivery
+            await self.push_offline(user_id, payload)
+        if echo_device is not None and sender_id is not None:
+            await self.send_to_user(sender_id, payload, exclude_device=echo_device)
+
+    async def send_to_user(self, user_id: UUID, payload: dict, exclude_device: Optional[str] = None) -> bool:
+        """
+        Best-effort send to every device of a user, wherever they are connected.
+
+        :param exclude_device: device to skip, e.g. the one that sent the message
+        :return: False if the user is not connected on any node
+        """
+        sent = self._send_local(user_id, payload, exclude_device)
+        if self.broker is not None:
+            # devices may be spread over several nodes, this one is served above
+            sent = await self.broker.publish_to_user(
+                user_id, payload, exclude_device, skip_node=self.broker.node_id,
+            ) or sent
+        return sent
+
+    async def send_to_room(self, room_id: UUID, payload: dict, exclude_device: Optional[str] = None):
+        """
+        Deliver a room message to the members that are online, on every node.
+        Offline members catch up from the room history and their unread counter.
+
+        :param payload: the frame
+        :param exclude_device: device of the ``sender_id`` that must not get it back
+        """
+        if self.broker is not None:
+            # every node with a member of the room is subscribed, including this one
+            await self.broker.publish_to_room(room_id, payload, exclude_device)
+        else:
+            await self._deliver_room(room_id, payload, exclude_device)
+
+    async def _deliver_room(self, room_id: UUID, payload: dict, exclude_device: Optional[str] = None):
+        members = self.rooms.get(room_id)
+        if not members:
+            return
+        # one encode per codec however many members are connected here
+        frame = SharedFrame(payload)
+        sender = payload.get("sender_id")
+        delivered = 0
+        with WS_FANOUT_DURATION.labels("room").time():
+            for member in members:
+                skip = exclude_device if str(member) == sender else None
+                if self._send_local(member, frame, skip):
+                    delivered += 1
+        MESSAGES_DELIVERED.labels("room").inc(delivered)
+
+    def in_room(self, user_id: UUID, room_id: UUID) -> bool:
+        """membership check for a user connected to this node, no I/O"""
+        return room_id in self.user_rooms.get(user_id, ())
+
+    async def notify_membership(self, user_id: UUID, room_id: UUID, joined: bool):
+        """Tell ``user_id`` it joined / left ``room_id`` and update the room index wherever it is connected."""
+        payload = {"type": ROOM_JOINED if joined else ROOM_LEFT, "room_id": str(room_id)}
+        if self.broker is not None:
+            await self.broker.publish_to_user(user_id, payload)
+        elif user_id in self.active_connections:
+            await self._apply_membership(user_id, payload)
+            self._send_local(user_id, payload)
+
+    async def _apply_membership(self, user_id: UUID, payload: dict):
+        room_id = UUID(payload["room_id"])
+        if payload["type"] == ROOM_JOINED:
+            await self._join_local(room_id, user_id)
+        else:
+            await self._leave_local(room_id, user_id)
+
+    async def _join_local(self, room_id: UUID, user_id: UUID):
+        members = self.rooms.get(room_id)
+        if members is None:
+            members = self.rooms[room_id] = set()
+            self._room_ids[room_id] = room_id
+            if self.broker is not None:
+                await self.broker.subscribe_room(room_id)
+        else:
+            room_id = self._room_ids[room_id]
+        members.add(user_id)
+        self.user_rooms.setdefault(user_id, set()).add(room_id)
+
+    async def _leave_local(self, room_id: UUID, user_id: UUID):
+        rooms = self.user_rooms.get(user_id)
+        if rooms is not None:
+            rooms.discard(room_id)
+            if not rooms:
+                del self.user_rooms[user_id]
+        members = self.rooms.get(room_id)
+        if members is None:
+            return
+        members.discard(user_id)
+        if not members:
+            del self.rooms[room_id]
+            del self._room_ids[room_id]
+            if self.broker is not None:
+                await self.broker.unsubscribe_room(room_id)
+
+    async def push_offline(self, user_id: UUID, payload: dict):
+        """fallback: push to Redis list for offline delivery"""
+        await self.offline.push(user_id, payload)
+        MESSAGES_OFFLINE.inc()
+
+    async def drain_offline(self, conn: Connection):
+        """Send the oldest batch of queued offline messages, the rest follows on ack."""
+        entries, total = await self.offline.fetch(conn.user_id)
+        self._send_offline_batch(conn, entries, total)
+
+    async def ack_offline(self, conn: Connection, batch_id: int):
+        """Client confirmed ``batch_id``: drop it from Redis and send the next one."""
+        if batch_id != conn.offline_batch_id or not conn.offline_pending:
+            # stale or duplicate ack
+            return
+        entries, total = await self.offline.ack_and_fetch(conn.user_id, conn.offline_pending)
+        self._send_offline_batch(conn, entries, total)
+
+    def _send_offline_batch(self, conn: Connection, entries: List[str], total: int):
+        # the raw entries are kept until the ack, they are what gets removed from Redis
+        conn.offline_pending = entries or None
+        if not entries:
+            return
+        conn.offline_batch_id += 1
+        conn.send({
+            "type": "offline_messages",
+            "batch_id": conn.offline_batch_id,
+            "messages": self.offline.decode(entries),
+            "remaining": total - len(entries),
+        })
+
+    async def sync_device(self, conn: Connection):
+        """
+        Send a returning device everything after its cursor in one frame. With more
+        than ``sync_max_messages`` the frame says so and the client pages the rest
+        through the history endpoints.
+        """
+        async with async_session_maker() as session:
+            rows = await get_messages_since(
+                session, conn.user_id, datetime.fromisoformat(conn.cursor), self.sync_max_messages + 1,
+            )
+        if not rows:
+            return
+        messages = [message_frame(*row) for row in rows[:self.sync_max_messages]]
+        conn.send({
+            "type": "sync",
+            "messages": messages,
+            "more": len(rows) > self.sync_max_messages,
+            "cursor": messages[-1]["timestamp"],
+        })
+        # everything queued for offline delivery is part of what was just synced
+        await self.offline.clear(conn.user_id)
+
+    async def _save_cursor(self, conn: Connection):
+        if conn.resumable and conn.cursor != conn.cursor_saved:
+            await self.cursors.save([(conn.user_id, conn.device_id, conn.cursor)])
+            conn.cursor_saved = conn.cursor
+
+    async def save_cursors(self):
+        """Write the cursors that moved since the last round, one pipeline for all devices."""
+        moved: List[Connection] = [
+            conn for conn in self.connections() if conn.resumable and conn.cursor != conn.cursor_saved
+        ]
+        await self.cursors.save((conn.user_id, conn.device_id, conn.cursor) for conn in moved)
+        for conn in moved:
+            conn.cursor_saved = conn.cursor
+
+    async def watch_presence(self, conn: Connection, user_ids: Iterable[UUID]):
+        """Subscribe ``conn``'s user to presence deltas of ``user_ids`` and send their current state."""
+        user_ids = list(user_ids)
+        self.presence.watch(conn.user_id, user_ids)
+        conn.send({"type": "presence", "users": await self.presence.snapshot(user_ids)})
+
+    async def publish_presence(self, user_id: UUID, is_online: bool):
+        """
+        Announce a presence change. During a connection storm the changes are held
+        back and go out once per interval, one frame per watcher.
+        """
+        if self.admission.storm or self._presence_pending:
+            # anything already held back has to go first, so keep queueing until it did
+            self._coalesce_presence(user_id, is_online)
+            return
         msg = {
             "type": "status_update",
             "user_id": str(user_id),
             "is_online": is_online
         }
-        for ws in self.active_connections.values():
-            await ws.send_json(msg)
+        if self.broker is not None:
+            # every node applies the delta to its own watchers
+            await self.broker.publish_presence(msg)
+        else:
+            await self._apply_presence(msg)
 
-    async def send_active_users(self):
-        """Broadcast the current set of online users to everyone."""
-        payload = {
-            "type": "active_users",
-            "active_users": [str(u) for u in self.online_users]
+    def _coalesce_presence(self, user_id: UUID, is_online: bool):
+        if self._presence_pending.get(user_id) is (not is_online):
+            # flapped back before anyone was told, nothing changed
+            del self._presence_pending[user_id]
+        else:
+            self._presence_pending[user_id] = is_online
+        if self._coalesce_task is None:
+            self._coalesce_task = asyncio.create_task(self._flush_presence_later())
+
+    async def _flush_presence_later(self):
+        try:
+            while self._presence_pending:
+                await asyncio.sleep(self.storm_presence_interval)
+                await self.flush_presence()
+        except Exception:
+            logger.exception("presence flush failed")
+        finally:
+            self._coalesce_task = None
+
+    async def flush_presence(self):
+        """Publish the held back presence changes as one batch."""
+        if not self._presence_pending:
+            return
+        pending, self._presence_pending = self._presence_pending, {}
+        msg = {"type": "presence", "users": {str(user_id): is_online for user_id, is_online in pending.items()}}
+        if self.broker is not None:
+            await self.broker.publish_presence(msg)
+        else:
+            await self._apply_presence(msg)
+
+    async def _apply_presence(self, msg: dict):
+        """Forward a presence delta to the local devices of the users watching that user."""
+        if msg["type"] == "presence":
+            await self._apply_presence_batch(msg["users"])
+            return
+        frame = SharedFrame(msg)
+        with WS_FANOUT_DURATION.labels("presence").time():
+            for watcher in self.presence.watchers_of(UUID(msg["user_id"])):
+                self._send_local(watcher, frame)
+
+    async def _apply_presence_batch(self, users: Dict[str, bool]):
+        """A coalesced batch, each watcher gets the part it watches in a single frame."""
+        frames: Dict[UUID, Dict[str, bool]] = {}
+        with WS_FANOUT_DURATION.labels("presence").time():
+            for user_id, is_online in users.items():
+                for watcher in self.presence.watchers_of(UUID(user_id)):
+                    frames.setdefault(watcher, {})[user_id] = is_online
+            for watcher, watched in frames.items():
+                self._send_local(watcher, {"type": "presence", "users": watched})
+
+    async def _presence_loop(self):
+        """
+        Heartbeat round: refresh live users, expire lapsed ones, write is_online and
+        the moved device cursors in one batch each.
+        """
+        while True:
+            await asyncio.sleep(self.presence_interval)
+            try:
+                cutoff = time.monotonic() - self.presence.ttl
+                revived = await self.presence.refresh(
+                    user_id for user_id, devices in self.active_connections.items()
+                    if any(conn.last_seen >= cutoff for conn in devices.values())
+                )
+                for user_id in revived:
+                    if user_id in self.active_connections:
+                        await self.publish_presence(user_id, is_online=True)
+                    else:
+                        # left while the refresh was in flight, take the entry back out
+                        await self.presence.mark_offline(user_id)
+                for user_id in await self.presence.expire():
+                    await self.publish_presence(user_id, is_online=False)
+                await self.presence.flush()
+                await self.save_cursors()
+            except Exception:
+                logger.exception("presence round failed")
+
+    async def broadcast(self, payload: dict):
+        """Send ``payload`` to every connection, on every node in distributed mode."""
+        if self.broker is not None:
+            # our own subscriber picks this up and delivers to local sockets
+            await self.broker.publish_broadcast(payload)
+        else:
+            await self._broadcast_local(payload)
+
+    async def active_users(self):
+        """Online users across all nodes, read from the presence set instead of broadcast."""
+        return await self.presence.online_users()
+
+    async def _broadcast_local(self, payload: dict):
+        # enqueue only, each connection's writer does the actual send
+        frame = SharedFrame(payload)
+        with WS_FANOUT_DURATION.labels("broadcast").time():
+            for shard in self.active_connections.shards:
+                for devices in list(shard.values()):
+                    for conn in list(devices.values()):
+                        conn.send(frame)
+                # let other tasks in between shards, a broadcast must not hold the loop for every socket
+                await asyncio.sleep(0)
+
+    def _on_slow_disconnect(self, conn: Connection):
+        self.slow_disconnects += 1
+
+    def stats(self) -> dict:
+        """Queue depth and drop counters for tuning the send queues under load."""
+        depths = [conn.depth for conn in self.connections()]
+        return {
+            "connections": len(depths),
+            "online_users": len(self.active_connections),
+            "rooms": len(self.rooms),
+            "send_queue_size": self.send_queue_size,
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "dropped_total": self.dropped_total + sum(conn.dropped for conn in self.connections()),
+            "slow_disconnects": self.slow_disconnects,
+            "replaced_total": self.replaced_total,
+            "presence_pending": len(self._presence_pending),
+            **self.admission.stats(),
+        }
+
+    def memory_report(self, sample: int = 100) -> dict:
+        """
+        Estimated bytes held per connection by the registry, the room index and the
+        connection records. Records are measured on a sample, the socket objects
+        owned by the server are not counted.
+
+        :param sample: connections to measure
+        """
+        conns = list(itertools.islice(self.connections(), sample))
+        count = sum(len(devices) for devices in self.active_connections.values())
+        record = sum(_record_bytes(conn) for conn in conns) / len(conns) if conns else 0
+        index = sum(sys.getsizeof(members) for members in self.rooms.values()) + sum(
+            sys.getsizeof(rooms) for rooms in self.user_rooms.values()
+        ) + sys.getsizeof(self.rooms) + sys.getsizeof(self.user_rooms) + sys.getsizeof(self._room_ids)
+        registry = self.active_connections.container_bytes()
+        total = registry + index + record * count
+        return {
+            "connections": count,
+            "users": len(self.active_connections),
+            "registry_bytes": registry,
+            "room_index_bytes": index,
+            "record_bytes_avg": round(record),
+            "total_bytes": round(total),
+            "bytes_per_connection": round(total / count) if count else 0,
         }
-        for ws in self.active_connections.values():
-            await ws.send_json(payload)
-        return list(self.online_users)
+
+    async def _deliver_local(self, target: Optional[str], payload: dict, exclude_device: Optional[str] = None):
+        """Handle a message published by any node through the broker."""
+        if target is None:
+            await self._broadcast_local(payload)
+            return
+        user_id = UUID(target)
+        if user_id in self.active_connections and payload.get("type") in (ROOM_JOINED, ROOM_LEFT):
+            await self._apply_membership(user_id, payload)
+        if self._send_local(user_id, payload, exclude_device):
+            return
+        if payload.get("type") in CHAT_FRAME_TYPES and exclude_device is None:
+            # the user left between route lookup and delivery, or their queues are full
+            await self.push_offline(user_id, payload)
+
+def _record_bytes(conn: Connection) -> int:
+    """a connection record with what it owns alone, shared codecs and callbacks excluded"""
+    size = sys.getsizeof(conn) + sys.getsizeof(conn.device_id) + sys.getsizeof(conn.last_seen)
+    if conn.queue is not None:
+        size += sys.getsizeof(conn.queue)
+    if conn.cursor is not None:
+        size += sys.getsizeof(conn.cursor)
+    if conn.cursor_saved is not None and conn.cursor_saved is not conn.cursor:
+        size += sys.getsizeof(conn.cursor_saved)
+    if conn.offline_pending is not None:
+        size += sys.getsizeof(conn.offline_pending) + sum(map(sys.getsizeof, conn.offline_pending))
+    return size
+
 
 # instantiate without DI
-manager = ConnectionManager()
+manager = ConnectionManager(
+    redis_conn=redis_client,
+    node_id=Config.WS_NODE_ID,
+    distributed=Config.WS_DISTRIBUTED,
+    send_queue_size=Config.WS_SEND_QUEUE_SIZE,
+    slow_consumer_policy=Config.WS_SLOW_CONSUMER_POLICY,
+    slow_consumer_grace=Config.WS_SLOW_CONSUMER_GRACE_SECONDS,
+    offline_queue=OfflineQueue(
+        redis_client,
+        max_len=Config.OFFLINE_QUEUE_MAX_LEN,
+        ttl=Config.OFFLINE_QUEUE_TTL_SECONDS,
+        batch_size=Config.OFFLINE_DRAIN_BATCH_SIZE,
+    ),
+    presence=PresenceService(redis_client, async_session_maker, ttl=Config.PRESENCE_TTL_SECONDS),
+    presence_interval=Config.PRESENCE_INTERVAL_SECONDS,
+    cursors=DeviceCursors(redis_client, ttl=Config.WS_DEVICE_CURSOR_TTL_SECONDS),
+    sync_max_messages=Config.WS_SYNC_MAX_MESSAGES,
+    admission=AdmissionControl(
+        accept_rate=Config.WS_ACCEPT_RATE,
+        max_pending=Config.WS_MAX_PENDING_HANDSHAKES,
+        jitter=Config.WS_RECONNECT_JITTER_SECONDS,
+        storm_window=Config.WS_STORM_WINDOW_SECONDS,
+        enabled=Config.WS_ADMISSION_ENABLED,
+    ),
+    storm_presence_interval=Config.WS_STORM_PRESENCE_INTERVAL_SECONDS,
+    registry_shards=Config.WS_REGISTRY_SHARDS,
+)
@@ -0,0 +1,123 @@
+"""
+Shared fixtures. The app reads its settings at import time, so the environment is
+set up here before anything from ``src`` is imported: a throwaway SQLite database
+instead of Postgres, and fakeredis in place of the Redis server. Rate limiting and
+handshake admission are off, the tests that cover them switch them on.
+"""
+import asyncio
+import os
+import tempfile
+import uuid
+
+_tmp = tempfile.mkdtemp(prefix="chat-app-tests-")
+os.environ.update({
+    "POSTGRES_USER": "test",
+    "POSTGRES_PASSWORD": "test",
+    "POSTGRES_DB": "test",
+    "HOST": "localhost",
+    "DATABASE_URL": f"sqlite+aiosqlite:///{_tmp}/app.db",
+    "TEST_DATABASE_URL": f"sqlite+aiosqlite:///{_tmp}/app.db",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "INVITE_TOKEN_EXPIRE_TIME": "1",
+    "JWT_SECRET_KEY": "test-secret",
+    "ALGORITHM": "HS256",
+    "INTERNAL_API_TOKEN": "test-internal",
+    "MEDIA_ROOT": f"{_tmp}/media",
+    "RATE_LIMIT_ENABLED": "false",
+    "WS_ADMISSION_ENABLED": "false",
+})
+
+import fakeredis  # noqa: E402
+import pytest  # noqa: E402
+
+import src.database  # noqa: E402
+
+# every module picks the client up from src.database on import
+src.database.redis_client = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True)
+
+from src.database import async_engine, init_db  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    import src.main  # noqa: F401, registers every model
+
+    async def create():
+        await init_db()
+        await async_engine.dispose()
+
+    asyncio.run(create())
+    yield
+
+
+@pytest.fixture(autouse=True)
+async def _release_connections():
+    yield
+    # pooled aiosqlite connections belong to the test's event loop
+    await async_engine.dispose()
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def redis(redis_server):
+    return fakeredis.FakeAsyncRedis(server=redis_server, decode_responses=True)
+
+
+class FakeWebSocket:
+    """Just enough of a WebSocket for ConnectionManager, sent frames are kept in ``sent``."""
+
+    def __init__(self):
+        self.scope = {"subprotocols": []}
+        self.sent = []
+        self.close_code = None
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, data):
+        self.sent.append(data)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000, reason=""):
+        self.close_code = code
+
+
+@pytest.fixture
+def websocket():
+    return FakeWebSocket
+
+
+@pytest.fixture(scope="session")
+def client():
+    """
+    The app with its lifespan running. One for the whole session: the app's queues
+    and locks belong to the event loop they were first used on.
+    """
+    from fastapi.testclient import TestClient
+
+    from src.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+def _sign_up(client, name: str, password: str = "Passw0rd!"):
+    email = f"{name}-{uuid.uuid4().hex[:8]}@example.com"
+    response = client.post("/auth/sign-up", json={"name": name, "email_id": email, "password": password})
+    assert response.status_code == 200, response.text
+    response = client.post("/auth/sign-in", json={"email_id": email, "password": password})
+    assert response.status_code == 200, response.text
+    data = response.json()["data"]
+    return data["access_token"], data["user_id"]
+
+
+@pytest.fixture(scope="session")
+def make_user(client):
+    """signs up and signs in a new user, returns (access token, user id)"""
+    return lambda name="user": _sign_up(client, name)
@@ -0,0 +1,93 @@
+import asyncio
+import uuid
+
+import orjson
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from src.websocket_manager.admission import AdmissionControl
+from src.websocket_manager.websocker_manger import ConnectionManager, manager
+
+
+async def test_handshakes_beyond_the_accept_rate_are_deferred():
+    admission = AdmissionControl("3/1", jitter=0.5)
+    assert [await admission.admit() for _ in range(3)] == [0, 0, 0]
+    assert not admission.storm
+    retry_after = await admission.admit()
+    # a third of a second for the next token, plus up to the jitter
+    assert 0.3 <= retry_after <= 0.34 + 0.5
+    assert admission.storm
+    assert admission.stats() == {
+        "handshakes_pending": 3,
+        "handshakes_admitted_total": 3,
+        "handshakes_deferred_total": 1,
+        "storm": True,
+    }
+
+
+async def test_handshakes_in_flight_are_capped():
+    admission = AdmissionControl("100/1", max_pending=2)
+    assert [await admission.admit() for _ in range(2)] == [0, 0]
+    assert await admission.admit() > 0
+    admission.release()
+    assert await admission.admit() == 0
+
+
+async def test_reconnect_hints_spread_with_the_size_of_the_storm():
+    admission = AdmissionControl("1/1", jitter=0.5)
+    await admission.admit()
+    hints = [await admission.admit() for _ in range(200)]
+    # 200 deferred clients come back over the 200 seconds it takes to admit them
+    assert all(0 < hint <= 1 + 200 for hint in hints)
+    assert max(hints) > 100
+    assert len(set(hints)) == len(hints)
+
+
+async def test_storm_ends_after_the_window():
+    admission = AdmissionControl("1/60", storm_window=0.05)
+    await admission.admit()
+    await admission.admit()
+    assert admission.storm
+    await asyncio.sleep(0.1)
+    assert not admission.storm
+
+
+async def test_disabled_admits_everyone():
+    admission = AdmissionControl("1/60", max_pending=0, enabled=False)
+    assert [await admission.admit() for _ in range(5)] == [0] * 5
+    assert admission.deferred_total == 0
+
+
+async def test_presence_is_batched_during_a_storm(redis):
+    node = ConnectionManager(redis, node_id="a", admission=AdmissionControl("1/60"), storm_presence_interval=3600)
+    published = []
+
+    async def apply(msg):
+        published.append(msg)
+
+    node._apply_presence = apply
+    await node.admission.admit()
+    await node.admission.admit()
+    steady, flapping = uuid.uuid4(), uuid.uuid4()
+    await node.publish_presence(steady, True)
+    await node.publish_presence(flapping, True)
+    await node.publish_presence(flapping, False)
+    assert published == []
+    await node.flush_presence()
+    # the flap never reached anyone
+    assert published == [{"type": "presence", "users": {str(steady): True}}]
+    node._coalesce_task.cancel()
+
+
+def test_deferred_client_is_told_when_to_come_back(client, monkeypatch):
+    admission = AdmissionControl("1/60", jitter=1.0)
+    client.portal.call(admission.admit)
+    monkeypatch.setattr(manager, "admission", admission)
+    with client.websocket_connect("/message/ws", subprotocols=["chat.json"]) as ws:
+        frame = orjson.loads(ws.receive_text())
+        assert frame["type"] == "reconnect"
+        # a minute for the next token, spread over the minute it takes to admit this client
+        assert 0 < frame["retry_after"] <= 60 + 60
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_text()
+    assert closed.value.code == 1013
@@ -0,0 +1,143 @@
+import asyncio
+import uuid
+
+import orjson
+import pytest
+
+from src.database import async_session_maker
+from src.services.presence_service import PresenceService
+from src.websocket_manager.broker import RedisBroker
+from src.websocket_manager.websocker_manger import ConnectionManager
+
+
+async def eventually(condition, timeout: float = 1.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        if loop.time() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.01)
+
+
+def frames(ws, frame_type: str) -> list:
+    return [frame for frame in map(orjson.loads, ws.sent) if frame.get("type") == frame_type]
+
+
+@pytest.fixture
+async def nodes(redis):
+    """two nodes sharing one redis, as two workers would"""
+    started = []
+
+    async def make(node_id: str) -> ConnectionManager:
+        node = ConnectionManager(
+            redis,
+            node_id=node_id,
+            distributed=True,
+            presence=PresenceService(redis, async_session_maker, ttl=60),
+            presence_interval=3600,
+        )
+        await node.start()
+        started.append(node)
+        return node
+
+    yield make
+    for node in started:
+        await node.stop()
+
+
+async def test_send_to_user_reaches_the_node_holding_the_socket(nodes, websocket):
+    a, b = await nodes("a"), await nodes("b")
+    user_id = uuid.uuid4()
+    ws = websocket()
+    await b.connect(ws, user_id, "phone", resumable=False)
+
+    assert await a.broker.routes(user_id) == {"b"}
+    assert await a.send_to_user(user_id, {"type": "ping", "n": 1})
+    await eventually(lambda: frames(ws, "ping"))
+    assert frames(ws, "ping") == [{"type": "ping", "n": 1}]
+
+
+async def test_send_to_user_without_a_route(nodes):
+    a = await nodes("a")
+    assert not await a.send_to_user(uuid.uuid4(), {"type": "ping"})
+
+
+async def test_stale_route_is_dropped(nodes, redis):
+    a = await nodes("a")
+    user_id = uuid.uuid4()
+    # a node that died without unregistering, nobody listens on its channel
+    await redis.sadd(RedisBroker.route_key(user_id), "gone")
+
+    assert not await a.broker.publish_to_user(user_id, {"type": "ping"})
+    assert await a.broker.routes(user_id) == set()
+
+
+async def test_user_stays_online_until_the_last_device_leaves(nodes, websocket):
+    a = await nodes("a")
+    user_id = uuid.uuid4()
+    phone = await a.connect(websocket(), user_id, "phone", resumable=False)
+    laptop = await a.connect(websocket(), user_id, "laptop", resumable=False)
+    assert await a.presence.snapshot([user_id]) == {str(user_id): True}
+
+    await a.disconnect(phone)
+    assert user_id in a.active_connections
+    assert await a.presence.snapshot([user_id]) == {str(user_id): True}
+
+    await a.disconnect(laptop)
+    assert user_id not in a.active_connections
+    assert await a.presence.snapshot([user_id]) == {str(user_id): False}
+    assert await a.broker.routes(user_id) == set()
+
+
+async def test_reconnect_racing_a_disconnect_keeps_the_user_online(nodes, websocket):
+    a = await nodes("a")
+    user_id = uuid.uuid4()
+    old = await a.connect(websocket(), user_id, "phone", resumable=False)
+
+    # hold the disconnect in its route removal while the user comes back
+    gate = asyncio.Event()
+    unregister = a.broker.unregister
+
+    async def slow_unregister(user):
+        await gate.wait()
+        return await unregister(user)
+
+    a.broker.unregister = slow_unregister
+    leaving = asyncio.create_task(a.disconnect(old))
+    await asyncio.sleep(0.01)
+    joining = asyncio.create_task(a.connect(websocket(), user_id, "laptop", resumable=False))
+    await asyncio.sleep(0.01)
+    gate.set()
+    await leaving
+    new = await joining
+
+    assert a.active_connections.get(user_id) == {"laptop": new}
+    assert await a.broker.routes(user_id) == {"a"}
+    assert await a.presence.snapshot([user_id]) == {str(user_id): True}
+
+
+async def test_replaced_socket_disconnecting_late_is_a_no_op(nodes, websocket):
+    a = await nodes("a")
+    user_id = uuid.uuid4()
+    old_ws = websocket()
+    old = await a.connect(old_ws, user_id, "phone", resumable=False)
+    new = await a.connect(websocket(), user_id, "phone", resumable=False)
+    assert old_ws.close_code == 1000
+
+    await a.disconnect(old)
+    assert a.active_connections.get(user_id) == {"phone": new}
+    assert a.replaced_total == 1
+
+
+@pytest.mark.parametrize("resumable", [True, False])
+async def test_cursor_is_only_kept_for_client_device_ids(nodes, redis, websocket, resumable):
+    a = await nodes("a")
+    user_id = uuid.uuid4()
+    ws = websocket()
+    conn = await a.connect(ws, user_id, "phone", resumable=resumable)
+    conn.send({"type": "message", "content": "hi", "timestamp": "2026-01-01T00:00:00"})
+    await eventually(lambda: frames(ws, "message"))
+    await a.disconnect(conn)
+
+    saved = await redis.hgetall(a.cursors.key(user_id))
+    assert saved == ({"phone": "2026-01-01T00:00:00"} if resumable else {})
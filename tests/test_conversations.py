@@ -0,0 +1,34 @@
+import uuid
+
+from tests.utils import auth, send_and_wait_for_ack
+
+
+def test_both_directions_share_one_conversation(client, make_user):
+    alice_token, alice = make_user("alice")
+    bob_token, bob = make_user("bob")
+    with client.websocket_connect(f"/message/ws?token={alice_token}") as alice_ws, \
+            client.websocket_connect(f"/message/ws?token={bob_token}") as bob_ws:
+        ack = send_and_wait_for_ack(alice_ws, {"type": "message", "content": "hi bob", "receiver_id": bob})
+        assert ack["status"] == "persisted"
+        to_bob = bob_ws.receive_json()
+        ack = send_and_wait_for_ack(bob_ws, {"type": "message", "content": "hi alice", "receiver_id": alice})
+        assert ack["status"] == "persisted"
+        to_alice = alice_ws.receive_json()
+
+    assert to_bob["conversation_id"] == to_alice["conversation_id"]
+    for token, peer in ((alice_token, bob), (bob_token, alice)):
+        history = client.get(f"/message/messages/{peer}", headers=auth(token)).json()
+        assert [message["content"] for message in history] == ["hi bob", "hi alice"]
+
+
+def test_unknown_receiver_is_rejected_without_writing(client, make_user):
+    token, _ = make_user("alice")
+    stranger = str(uuid.uuid4())
+    with client.websocket_connect(f"/message/ws?token={token}") as ws:
+        reply = send_and_wait_for_ack(
+            ws, {"type": "message", "content": "anyone?", "receiver_id": stranger, "client_id": "c1"},
+        )
+        assert reply == {"type": "error", "message": "Receiver not found", "client_id": "c1"}
+        # the socket survives the bad frame
+        ws.send_json({"type": "heartbeat"})
+    assert client.get(f"/message/messages/{stranger}", headers=auth(token)).json() == []
@@ -0,0 +1,64 @@
+import uuid
+
+import pytest
+
+from tests.utils import auth, send_and_wait_for_ack
+
+
+@pytest.fixture(scope="module")
+def inbox(client, make_user):
+    """dave writes to erin twice, then frank once"""
+    people = {name: make_user(name) for name in ("dave", "erin", "frank")}
+    _, erin = people["erin"]
+    for sender, contents in (("dave", ["one", "two"]), ("frank", ["three"])):
+        with client.websocket_connect(f"/message/ws?token={people[sender][0]}") as ws:
+            for content in contents:
+                ack = send_and_wait_for_ack(ws, {"type": "message", "content": content, "receiver_id": erin})
+                assert ack["status"] == "persisted"
+    return people
+
+
+def conversations(client, token, **params) -> dict:
+    response = client.get("/message/conversations", headers=auth(token), params=params)
+    assert response.status_code == 200, response.text
+    return response.json()["data"]
+
+
+def test_most_recent_conversation_first(client, inbox):
+    erin_token, _ = inbox["erin"]
+    rows = conversations(client, erin_token)["conversations"]
+    assert [(row["peer_id"], row["last_message_preview"], row["unread_count"]) for row in rows] == [
+        (inbox["frank"][1], "three", 1),
+        (inbox["dave"][1], "two", 2),
+    ]
+    assert rows[0]["last_sender_id"] == inbox["frank"][1]
+
+
+def test_own_messages_are_not_unread(client, inbox):
+    dave_token, _ = inbox["dave"]
+    [row] = conversations(client, dave_token)["conversations"]
+    assert (row["peer_id"], row["last_sender_id"], row["unread_count"]) == (inbox["erin"][1], inbox["dave"][1], 0)
+
+
+def test_paging_through_the_inbox(client, inbox):
+    erin_token, _ = inbox["erin"]
+    first = conversations(client, erin_token, limit=1)
+    second = conversations(client, erin_token, limit=1, before=first["next_cursor"])
+    assert [row["peer_id"] for row in first["conversations"] + second["conversations"]] == [
+        inbox["frank"][1], inbox["dave"][1],
+    ]
+    assert conversations(client, erin_token, limit=1, before=second["next_cursor"])["conversations"] == []
+
+
+def test_marking_a_conversation_read(client, inbox):
+    erin_token, _ = inbox["erin"]
+    rows = {row["peer_id"]: row for row in conversations(client, erin_token)["conversations"]}
+    conversation_id = rows[inbox["dave"][1]]["conversation_id"]
+    response = client.post(f"/message/conversations/{conversation_id}/read", headers=auth(erin_token))
+    assert response.status_code == 200
+    rows = {row["peer_id"]: row for row in conversations(client, erin_token)["conversations"]}
+    assert (rows[inbox["dave"][1]]["unread_count"], rows[inbox["frank"][1]]["unread_count"]) == (0, 1)
+
+    frank_token, _ = inbox["frank"]
+    assert client.post(f"/message/conversations/{conversation_id}/read", headers=auth(frank_token)).status_code == 404
+    assert client.post(f"/message/conversations/{uuid.uuid4()}/read", headers=auth(erin_token)).status_code == 404
@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+from src.config import Config
+from src.services.media_storage import MediaStorage
+from tests.utils import auth, send_and_wait_for_ack
+
+CHUNK = 1000
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(Config, "MEDIA_CHUNK_SIZE", CHUNK)
+
+
+@pytest.fixture(scope="module")
+def people(make_user):
+    return {name: make_user(name) for name in ("alice", "bob", "carol")}
+
+
+def start_upload(client, token: str, size: int, content_type: str = "image/png"):
+    return client.post("/media/uploads", json={"content_type": content_type, "size": size}, headers=auth(token))
+
+
+def put_chunk(client, token: str, media_id: str, blob: bytes, start: int, end: int):
+    return client.put(
+        f"/media/uploads/{media_id}",
+        content=blob[start:end + 1],
+        headers={**auth(token), "Content-Range": f"bytes {start}-{end}/{len(blob)}"},
+    )
+
+
+def upload(client, token: str, blob: bytes, content_type: str = "image/png") -> str:
+    media_id = start_upload(client, token, len(blob), content_type).json()["data"]["media_id"]
+    for start in range(0, len(blob), CHUNK):
+        assert put_chunk(client, token, media_id, blob, start, min(start + CHUNK, len(blob)) - 1).status_code == 200
+    assert client.post(f"/media/uploads/{media_id}/complete", headers=auth(token)).status_code == 200
+    return media_id
+
+
+def test_chunked_upload_resumes_from_the_stored_offset(client, people):
+    token, _ = people["alice"]
+    blob = os.urandom(2500)
+    media_id = start_upload(client, token, len(blob)).json()["data"]["media_id"]
+    assert put_chunk(client, token, media_id, blob, 0, 999).json()["data"]["offset"] == 1000
+
+    skipped = put_chunk(client, token, media_id, blob, 2000, 2499)
+    assert skipped.status_code == 409
+    assert skipped.headers["Upload-Offset"] == "1000"
+    assert client.head(f"/media/uploads/{media_id}", headers=auth(token)).headers["Upload-Offset"] == "1000"
+    assert client.post(f"/media/uploads/{media_id}/complete", headers=auth(token)).status_code == 400
+
+    assert put_chunk(client, token, media_id, blob, 1000, 1999).status_code == 200
+    assert put_chunk(client, token, media_id, blob, 2000, 2499).status_code == 200
+    done = client.post(f"/media/uploads/{media_id}/complete", headers=auth(token)).json()["data"]
+    assert (done["offset"], done["complete"]) == (2500, True)
+
+
+@pytest.mark.parametrize("content_type, size", [("text/html", 10), ("image/png", 0)])
+def test_invalid_uploads_are_refused(client, people, content_type, size):
+    token, _ = people["alice"]
+    assert start_upload(client, token, size, content_type).status_code == 400
+
+
+def test_chunks_must_have_the_agreed_size(client, people):
+    token, _ = people["alice"]
+    blob = os.urandom(2500)
+    media_id = start_upload(client, token, len(blob)).json()["data"]["media_id"]
+    assert put_chunk(client, token, media_id, blob, 0, 499).status_code == 400
+
+
+def test_sent_media_is_readable_by_the_receiver_only(client, people):
+    alice_token, _ = people["alice"]
+    bob_token, bob = people["bob"]
+    carol_token, _ = people["carol"]
+    blob = os.urandom(1500)
+    media_id = upload(client, alice_token, blob)
+
+    with client.websocket_connect(f"/message/ws?token={alice_token}") as ws:
+        ack = send_and_wait_for_ack(ws, {"type": "image", "media_id": media_id, "receiver_id": bob, "content": "look"})
+        assert ack["status"] == "persisted"
+        # an image upload cannot go out as a video
+        error = send_and_wait_for_ack(ws, {"type": "video", "media_id": media_id, "receiver_id": bob})
+        assert error["type"] == "error"
+
+    full = client.get(f"/media/{media_id}", headers=auth(bob_token))
+    assert (full.status_code, full.headers["content-type"], full.content) == (200, "image/png", blob)
+    part = client.get(f"/media/{media_id}", headers={**auth(bob_token), "Range": "bytes=10-19"})
+    assert (part.status_code, part.content) == (206, blob[10:20])
+    assert client.get(f"/media/{media_id}", headers=auth(carol_token)).status_code == 404
+
+
+def test_someone_elses_upload_cannot_be_sent(client, people):
+    alice_token, _ = people["alice"]
+    bob_token, _ = people["bob"]
+    _, carol = people["carol"]
+    media_id = upload(client, alice_token, os.urandom(100))
+    with client.websocket_connect(f"/message/ws?token={bob_token}") as ws:
+        reply = send_and_wait_for_ack(ws, {"type": "image", "media_id": media_id, "receiver_id": carol})
+    assert reply["type"] == "error"
+
+
+def test_storage_backends_must_implement_every_operation():
+    class Partial(MediaStorage):
+        async def create(self, key, content_type):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
@@ -0,0 +1,76 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.database import async_session_maker
+from src.model.conversation import Conversation
+from src.model.message import Message
+from src.model.user import User
+from src.services.message_service import get_message_page
+
+
+@pytest.fixture
+async def conversation():
+    """a direct conversation with six messages, two of them sharing a timestamp"""
+    alice = User(name="alice", email=f"alice-{uuid.uuid4().hex[:8]}@example.com", password_hash="x")
+    bob = User(name="bob", email=f"bob-{uuid.uuid4().hex[:8]}@example.com", password_hash="x")
+    low, high = Conversation.canonical_pair(alice.id, bob.id)
+    conversation = Conversation(user_low_id=low, user_high_id=high)
+    start = datetime(2026, 1, 1, 12, 0)
+    timestamps = [start, start + timedelta(seconds=1), start + timedelta(seconds=2),
+                  start + timedelta(seconds=2), start + timedelta(seconds=3), start + timedelta(seconds=4)]
+    messages = [
+        Message(content=f"m{i}", timestamp=timestamp, sender_id=alice.id, receiver_id=bob.id,
+                conversation_id=conversation.id)
+        for i, timestamp in enumerate(timestamps)
+    ]
+    async with async_session_maker() as session:
+        session.add_all([alice, bob, conversation])
+        await session.flush()
+        session.add_all(messages)
+        await session.commit()
+    # the order paging has to follow, ties broken by id
+    return conversation.id, sorted(messages, key=lambda message: (message.timestamp, message.id))
+
+
+async def page(conversation_id, **kwargs) -> list:
+    async with async_session_maker() as session:
+        return [message.id for message in await get_message_page(session, conversation_id, **kwargs)]
+
+
+async def test_latest_page_is_oldest_first(conversation):
+    conversation_id, messages = conversation
+    assert await page(conversation_id, limit=2) == [message.id for message in messages[-2:]]
+
+
+async def test_scrolling_back_visits_every_message_once(conversation):
+    conversation_id, messages = conversation
+    seen = await page(conversation_id, limit=2)
+    while True:
+        older = await page(conversation_id, before=seen[0], limit=2)
+        if not older:
+            break
+        seen = older + seen
+    assert seen == [message.id for message in messages]
+
+
+async def test_catching_up_after_a_message(conversation):
+    conversation_id, messages = conversation
+    assert await page(conversation_id, after=messages[2].id, limit=10) == [message.id for message in messages[3:]]
+    assert await page(conversation_id, after=messages[-1].id) == []
+
+
+async def test_unknown_conversation_is_empty():
+    assert await page(uuid.uuid4()) == []
+
+
+def test_before_and_after_together_are_rejected(client, make_user):
+    token, _ = make_user("alice")
+    _, bob = make_user("bob")
+    response = client.get(
+        f"/message/messages/{bob}",
+        params={"before": str(uuid.uuid4()), "after": str(uuid.uuid4())},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 400
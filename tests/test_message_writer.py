@@ -0,0 +1,179 @@
+import asyncio
+import uuid
+from datetime import datetime
+
+import pytest
+from redis.exceptions import RedisError
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel, select
+
+from src.model.conversation import Conversation, ConversationParticipant
+from src.model.message import Message
+from src.model.user import User
+from src.services.message_writer import MessageWriter
+
+
+@pytest.fixture
+async def session_maker(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/writer.db")
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _foreign_keys(dbapi_connection, _):
+        # sqlite ignores foreign keys unless asked, Postgres always checks them
+        dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    yield async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.fixture
+async def conversation(session_maker):
+    alice = User(name="alice", email="alice@example.com", password_hash="x")
+    bob = User(name="bob", email="bob@example.com", password_hash="x")
+    low, high = Conversation.canonical_pair(alice.id, bob.id)
+    conversation = Conversation(user_low_id=low, user_high_id=high)
+    async with session_maker() as session:
+        session.add_all([alice, bob])
+        await session.flush()
+        session.add(conversation)
+        await session.flush()
+        session.add_all([
+            ConversationParticipant(conversation_id=conversation.id, user_id=low),
+            ConversationParticipant(conversation_id=conversation.id, user_id=high),
+        ])
+        await session.commit()
+    return conversation.id, alice.id, bob.id
+
+
+def message_row(sender_id, receiver_id, conversation_id, content: str) -> dict:
+    return {
+        "id": uuid.uuid4(),
+        "sender_id": sender_id,
+        "receiver_id": receiver_id,
+        "conversation_id": conversation_id,
+        "content": content,
+        "timestamp": datetime.now(),
+    }
+
+
+@pytest.fixture
+def acks():
+    return []
+
+
+@pytest.fixture
+async def writer(session_maker, acks):
+    async def on_ack(user_id, payload):
+        acks.append((user_id, payload))
+
+    writer = MessageWriter(session_maker, on_ack=on_ack, batch_size=10, window_ms=50)
+    await writer.start()
+    yield writer
+    await writer.stop()
+
+
+async def test_batch_is_written_and_acked(writer, session_maker, conversation, acks):
+    conversation_id, alice, bob = conversation
+    rows = [message_row(alice, bob, conversation_id, f"m{i}") for i in range(3)]
+    for i, row in enumerate(rows):
+        await writer.submit(row, client_id=f"c{i}")
+    await writer.stop()
+
+    assert acks == [(alice, {"type": "ack", "status": "persisted", "messages": [
+        {"message_id": str(row["id"]), "client_id": f"c{i}"} for i, row in enumerate(rows)
+    ]})]
+    async with session_maker() as session:
+        participant = (await session.execute(
+            select(ConversationParticipant).where(ConversationParticipant.user_id == bob)
+        )).scalars().one()
+    assert participant.unread_count == 3
+
+
+async def test_bad_row_only_fails_its_own_message(writer, session_maker, conversation, acks):
+    conversation_id, alice, bob = conversation
+    good = message_row(alice, bob, conversation_id, "fine")
+    # the conversation does not exist, the foreign key rejects the row
+    bad = message_row(bob, alice, uuid.uuid4(), "orphan")
+    await writer.submit(good, client_id="good")
+    await writer.submit(bad, client_id="bad")
+    await writer.stop()
+
+    assert sorted(acks, key=lambda ack: ack[1]["status"]) == [
+        (bob, {"type": "ack", "status": "failed", "messages": [{"message_id": str(bad["id"]), "client_id": "bad"}]}),
+        (alice, {"type": "ack", "status": "persisted", "messages": [{"message_id": str(good["id"]), "client_id": "good"}]}),
+    ]
+    async with session_maker() as session:
+        stored = (await session.execute(select(Message.id))).scalars().all()
+    assert stored == [good["id"]]
+
+
+async def test_submit_rejects_rows_without_required_columns(writer, conversation):
+    conversation_id, alice, bob = conversation
+    row = message_row(alice, bob, conversation_id, "no sender")
+    row["sender_id"] = None
+    with pytest.raises(ValueError, match="sender_id"):
+        await writer.submit(row)
+    assert writer.queue.empty()
+
+
+async def wait_for(condition, timeout: float = 1.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+
+async def test_failing_ack_does_not_stop_the_writer(session_maker, conversation):
+    conversation_id, alice, bob = conversation
+    calls = []
+
+    async def on_ack(user_id, payload):
+        calls.append(payload)
+        if len(calls) == 1:
+            raise RedisError("broker unavailable")
+
+    writer = MessageWriter(session_maker, on_ack=on_ack, batch_size=10, window_ms=1)
+    await writer.start()
+    first = message_row(alice, bob, conversation_id, "first")
+    await writer.submit(first)
+    await wait_for(lambda: calls)
+    second = message_row(alice, bob, conversation_id, "second")
+    await writer.submit(second)
+    await writer.stop()
+
+    assert [call["messages"][0]["message_id"] for call in calls] == [str(first["id"]), str(second["id"])]
+    async with session_maker() as session:
+        stored = set((await session.execute(select(Message.id))).scalars().all())
+    assert stored == {first["id"], second["id"]}
+
+
+async def test_failed_flush_does_not_stop_the_writer(session_maker, conversation, acks, monkeypatch):
+    conversation_id, alice, bob = conversation
+
+    async def on_ack(user_id, payload):
+        acks.append(payload)
+
+    writer = MessageWriter(session_maker, on_ack=on_ack, batch_size=10, window_ms=1)
+    insert = writer._insert
+    failures = [RuntimeError("driver bug")]
+
+    async def flaky_insert(rows):
+        if failures:
+            raise failures.pop()
+        return await insert(rows)
+
+    monkeypatch.setattr(writer, "_insert", flaky_insert)
+    await writer.start()
+    await writer.submit(message_row(alice, bob, conversation_id, "lost"))
+    await wait_for(lambda: not failures)
+    kept = message_row(alice, bob, conversation_id, "kept")
+    await writer.submit(kept)
+    await writer.stop()
+
+    assert acks == [{"type": "ack", "status": "persisted", "messages": [
+        {"message_id": str(kept["id"]), "client_id": None},
+    ]}]
@@ -0,0 +1,64 @@
+import asyncio
+import uuid
+
+import orjson
+
+from src.websocket_manager.offline_queue import OfflineQueue
+from src.websocket_manager.websocker_manger import ConnectionManager
+
+
+def messages(*contents) -> list:
+    return [{"type": "message", "content": content} for content in contents]
+
+
+async def test_batches_are_served_oldest_first(redis):
+    queue = OfflineQueue(redis, max_len=10, ttl=60, batch_size=2)
+    user_id = uuid.uuid4()
+    for payload in messages("m1", "m2", "m3"):
+        await queue.push(user_id, payload)
+
+    entries, total = await queue.fetch(user_id)
+    assert (queue.decode(entries), total) == (messages("m1", "m2"), 3)
+    entries, total = await queue.ack_and_fetch(user_id, entries)
+    assert (queue.decode(entries), total) == (messages("m3"), 1)
+    entries, total = await queue.ack_and_fetch(user_id, entries)
+    assert (entries, total) == ([], 0)
+
+
+async def test_ack_after_the_cap_trimmed_the_batch_keeps_unsent_messages(redis):
+    queue = OfflineQueue(redis, max_len=3, ttl=60, batch_size=2)
+    user_id = uuid.uuid4()
+    for payload in messages("m1", "m2", "m3"):
+        await queue.push(user_id, payload)
+    sent, _ = await queue.fetch(user_id)
+    # arrives while m1, m2 are in flight, the cap pushes m1 out
+    await queue.push(user_id, messages("m4")[0])
+
+    entries, total = await queue.ack_and_fetch(user_id, sent)
+    assert (queue.decode(entries), total) == (messages("m3", "m4"), 2)
+
+
+async def test_reconnect_drains_in_acked_batches(redis, websocket):
+    manager = ConnectionManager(
+        redis, node_id="a", offline_queue=OfflineQueue(redis, max_len=10, ttl=60, batch_size=2),
+    )
+    user_id = uuid.uuid4()
+    for payload in messages("m1", "m2", "m3"):
+        await manager.push_offline(user_id, payload)
+
+    ws = websocket()
+    conn = await manager.connect(ws, user_id, "phone", resumable=False)
+    await manager.ack_offline(conn, 1)
+    # a duplicate ack must not drop the next batch
+    await manager.ack_offline(conn, 1)
+    await asyncio.sleep(0.05)
+
+    batches = [orjson.loads(frame) for frame in ws.sent]
+    assert [(b["batch_id"], b["messages"], b["remaining"]) for b in batches] == [
+        (1, messages("m1", "m2"), 1),
+        (2, messages("m3"), 0),
+    ]
+    # the last batch stays queued until it is acked
+    entries, total = await manager.offline.fetch(user_id)
+    assert (manager.offline.decode(entries), total) == (messages("m3"), 1)
+    await manager.disconnect(conn)
@@ -0,0 +1,17 @@
+import pytest
+
+INTERNAL = {"X-Internal-Token": "test-internal"}
+
+
+@pytest.mark.parametrize("path", ["/stats", "/stats/memory", "/metrics"])
+def test_operator_endpoints_need_the_internal_token(client, path):
+    assert client.get(path).status_code == 403
+    assert client.get(path, headers={"X-Internal-Token": "wrong"}).status_code == 403
+    assert client.get(path, headers=INTERNAL).status_code == 200
+
+
+def test_metrics_cover_http_websocket_and_persistence(client):
+    client.get("/")
+    body = client.get("/metrics", headers=INTERNAL).text
+    for name in ('http_request_duration_seconds_count{method="GET",route="/"', "ws_connections", "chat_message_batch_size"):
+        assert name in body
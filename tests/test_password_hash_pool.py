@@ -0,0 +1,45 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.core.errors import ServiceOverloaded
+from src.core.security import PasswordHashPool, get_hashed_password_async, verify_password_async
+
+
+async def test_hash_and_verify_round_trip():
+    hashed = await get_hashed_password_async("Passw0rd!")
+    assert await verify_password_async("Passw0rd!", hashed)
+    assert not await verify_password_async("wrong", hashed)
+
+
+async def test_hashing_does_not_block_the_event_loop():
+    pool = PasswordHashPool(workers=1, max_backlog=0)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    await pool.run(time.sleep, 0.2)
+    task.cancel()
+    assert ticks >= 5
+
+
+async def test_calls_beyond_the_backlog_are_rejected_immediately():
+    pool = PasswordHashPool(workers=1, max_backlog=1)
+    release = threading.Event()
+    busy = [asyncio.create_task(pool.run(release.wait, 5)) for _ in range(2)]
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(ServiceOverloaded):
+        await pool.run(release.wait, 5)
+    assert (pool.in_flight, pool.rejected) == (2, 1)
+
+    release.set()
+    assert await asyncio.gather(*busy) == [True, True]
+    assert pool.in_flight == 0
@@ -0,0 +1,13 @@
+import uuid
+
+from src.database import async_session_maker
+from src.services.presence_service import PresenceService
+
+
+async def test_refresh_brings_a_lapsed_user_back(redis):
+    presence = PresenceService(redis, async_session_maker, ttl=60)
+    live, lapsed = uuid.uuid4(), uuid.uuid4()
+    await presence.mark_online(live)
+
+    assert await presence.refresh([live, lapsed]) == [lapsed]
+    assert await presence.snapshot([live, lapsed]) == {str(live): True, str(lapsed): True}
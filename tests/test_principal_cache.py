@@ -0,0 +1,62 @@
+import json
+import uuid
+
+import pytest
+
+from src.database import async_session_maker
+from src.model.user import User
+from src.services.principal_cache import PrincipalCache, principal_cache
+
+
+class UnusedSession:
+    """a session a cache hit must not touch"""
+
+    async def execute(self, *args, **kwargs):
+        raise AssertionError("cache hit went to the database")
+
+
+@pytest.fixture
+async def stored_user():
+    user = User(name="alice", email=f"alice-{uuid.uuid4().hex[:8]}@example.com", password_hash="bcrypt-hash")
+    async with async_session_maker() as session:
+        session.add(user)
+        await session.commit()
+    return user
+
+
+async def test_second_lookup_skips_the_database(stored_user):
+    cache = PrincipalCache(maxsize=10, ttl=60)
+    async with async_session_maker() as session:
+        loaded = await cache.get_or_load(stored_user.id, session)
+    assert loaded.id == stored_user.id
+
+    assert await cache.get_or_load(stored_user.id, UnusedSession()) is loaded
+
+
+async def test_unknown_user_is_not_cached():
+    cache = PrincipalCache(maxsize=10, ttl=60)
+    user_id = uuid.uuid4()
+    async with async_session_maker() as session:
+        assert await cache.get_or_load(user_id, session) is None
+    assert await cache.get(user_id) is None
+
+
+async def test_shared_entry_carries_no_password_hash(stored_user, redis):
+    writer = PrincipalCache(maxsize=10, ttl=60, redis=redis)
+    reader = PrincipalCache(maxsize=10, ttl=60, redis=redis)
+    await writer.set(stored_user)
+
+    raw = json.loads(await redis.get(f"principal:{stored_user.id}"))
+    assert set(raw) == {"id", "name", "email", "is_online"}
+    principal = await reader.get_or_load(stored_user.id, UnusedSession())
+    assert (principal.id, principal.email, principal.password_hash) == (stored_user.id, stored_user.email, None)
+
+
+async def test_updating_the_user_drops_the_cached_principal(stored_user):
+    await principal_cache.set(stored_user)
+    async with async_session_maker() as session:
+        user = await session.get(User, stored_user.id)
+        user.name = "alice smith"
+        await session.commit()
+
+    assert await principal_cache.get(stored_user.id) is None
@@ -0,0 +1,35 @@
+import uuid
+
+import pytest
+
+from src.websocket_manager.protocol import MAX_PRESENCE_SUBSCRIBE, FrameError, parse_frame
+
+
+def presence_subscribe(count: int) -> dict:
+    return {"type": "presence_subscribe", "user_ids": [str(uuid.uuid4()) for _ in range(count)]}
+
+
+def test_presence_subscribe_up_to_the_cap_is_accepted():
+    frame = presence_subscribe(MAX_PRESENCE_SUBSCRIBE)
+    assert parse_frame(frame) == frame
+
+
+def test_presence_subscribe_over_the_cap_is_rejected():
+    with pytest.raises(FrameError, match="user_ids"):
+        parse_frame(presence_subscribe(MAX_PRESENCE_SUBSCRIBE + 1))
+
+
+def test_presence_subscribe_with_a_bad_id_is_rejected():
+    with pytest.raises(FrameError, match="user_ids.0"):
+        parse_frame({"type": "presence_subscribe", "user_ids": ["not-a-uuid"]})
+
+
+def test_oversized_subscribe_is_answered_with_an_error_frame(client, make_user):
+    token, _ = make_user("alice")
+    with client.websocket_connect(f"/message/ws?token={token}") as ws:
+        ws.send_json(presence_subscribe(MAX_PRESENCE_SUBSCRIBE + 1))
+        reply = ws.receive_json()
+        assert reply["type"] == "error" and "user_ids" in reply["message"]
+
+        ws.send_json(presence_subscribe(1))
+        assert ws.receive_json()["type"] == "presence"
@@ -0,0 +1,86 @@
+import asyncio
+import uuid
+
+import pytest
+
+from src.config import Config
+from src.core.errors import RateLimitExceeded
+from src.core.rate_limit import RateLimiter, frame_limiters, parse_limit, route_limiters
+from tests.utils import auth
+
+
+@pytest.fixture
+def limits_on(monkeypatch):
+    monkeypatch.setattr(Config, "RATE_LIMIT_ENABLED", True)
+    for limiter in (*route_limiters.values(), *frame_limiters.values()):
+        limiter._buckets.clear()
+    yield
+    for limiter in (*route_limiters.values(), *frame_limiters.values()):
+        limiter._buckets.clear()
+
+
+def test_parse_limit():
+    assert parse_limit("30/10") == (30, 3.0)
+
+
+async def test_burst_then_refill():
+    limiter = RateLimiter("test", "2/0.2")
+    assert await limiter.retry_after("k") == 0
+    assert await limiter.retry_after("k") == 0
+    wait = await limiter.retry_after("k")
+    assert 0 < wait <= 0.1
+    assert await limiter.retry_after("other") == 0
+    await asyncio.sleep(0.15)
+    assert await limiter.retry_after("k") == 0
+    assert limiter.rejected == 1
+
+
+async def test_shared_bucket_holds_across_workers(redis):
+    workers = [RateLimiter("shared", "2/60", redis=redis) for _ in range(2)]
+    await workers[0].hit("k")
+    await workers[1].hit("k")
+    with pytest.raises(RateLimitExceeded):
+        await workers[0].hit("k")
+
+
+def sign_in(client, email: str):
+    return client.post("/auth/sign-in", json={"email_id": email, "password": "Wr0ng!pass"})
+
+
+def test_sign_in_is_limited_per_ip(client, limits_on):
+    burst, _ = parse_limit(Config.RATE_LIMIT_ROUTES["sign_in"])
+    for _ in range(burst):
+        # a different account every time, only the IP bucket runs dry
+        assert sign_in(client, f"{uuid.uuid4().hex}@example.com").status_code != 429
+    limited = sign_in(client, f"{uuid.uuid4().hex}@example.com")
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) >= 1
+
+
+def test_sign_in_is_limited_per_account_across_ips(client, limits_on):
+    burst, _ = parse_limit(Config.RATE_LIMIT_ROUTES["sign_in_account"])
+    target = f"{uuid.uuid4().hex}@example.com"
+    for _ in range(burst):
+        # every attempt from a fresh IP
+        route_limiters["sign_in"]._buckets.clear()
+        assert sign_in(client, target).status_code != 429
+    route_limiters["sign_in"]._buckets.clear()
+    # the same account however it is spelled
+    assert sign_in(client, f"  {target.upper()} ").status_code == 429
+    assert sign_in(client, f"{uuid.uuid4().hex}@example.com").status_code != 429
+
+
+def test_message_frames_are_limited_per_user(client, make_user, limits_on):
+    token, _ = make_user("flooder")
+    _, peer = make_user("peer")
+    burst, _ = parse_limit(Config.RATE_LIMIT_WS_FRAMES["message"])
+    with client.websocket_connect(f"/message/ws?token={token}") as ws:
+        for i in range(burst + 1):
+            ws.send_json({"type": "message", "content": f"m{i}", "receiver_id": peer, "client_id": str(i)})
+        while True:
+            reply = ws.receive_json()
+            if reply["type"] == "error":
+                break
+    assert reply["code"] == "rate_limited"
+    assert reply["client_id"] == str(burst)
+    assert reply["retry_after"] > 0
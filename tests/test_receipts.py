@@ -0,0 +1,91 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tests.utils import auth, send_and_wait_for_ack
+
+
+def receive(ws, frame_type: str) -> dict:
+    """the next frame of ``frame_type``, skipping presence and the like"""
+    while True:
+        frame = ws.receive_json()
+        if frame["type"] in (frame_type, "error"):
+            return frame
+
+
+@pytest.fixture(scope="module")
+def people(make_user):
+    return {name: make_user(name) for name in ("alice", "bob", "carol")}
+
+
+def receipts(client, token, conversation_id) -> dict:
+    response = client.get(f"/message/conversations/{conversation_id}/receipts", headers=auth(token))
+    assert response.status_code == 200, response.text
+    return {row["user_id"]: row for row in response.json()["data"]["participants"]}
+
+
+@pytest.mark.parametrize("timestamp", [
+    lambda: datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+    lambda: datetime.now(timezone(timedelta(hours=-7))).isoformat(),
+    lambda: datetime.now().isoformat(),
+], ids=["utc", "offset", "naive"])
+def test_read_receipt_reaches_the_sender(client, people, timestamp):
+    alice_token, alice = people["alice"]
+    bob_token, bob = people["bob"]
+    with client.websocket_connect(f"/message/ws?token={alice_token}") as alice_ws, \
+            client.websocket_connect(f"/message/ws?token={bob_token}") as bob_ws:
+        assert send_and_wait_for_ack(alice_ws, {"type": "message", "content": "hi", "receiver_id": bob})["status"] == "persisted"
+        message = receive(bob_ws, "message")
+        bob_ws.send_json({
+            "type": "read",
+            "conversation_id": message["conversation_id"],
+            "message_id": message["message_id"],
+            "timestamp": timestamp(),
+        })
+        # the socket that sent the mark is still up
+        bob_ws.send_json({"type": "presence_subscribe", "user_ids": [alice]})
+        assert receive(bob_ws, "presence")["type"] == "presence"
+        # a read also moves the delivered mark, each is forwarded on its own
+        receipts_seen = {}
+        while len(receipts_seen) < 2:
+            receipt = receive(alice_ws, "receipt")
+            receipts_seen[receipt["status"]] = receipt
+        receipt = receipts_seen["read"]
+        assert (receipt["user_id"], receipt["message_id"]) == (bob, message["message_id"])
+
+    marks = receipts(client, alice_token, message["conversation_id"])[bob]
+    assert marks["last_read_message_id"] == message["message_id"]
+    # stored naive on the server clock, comparable with message timestamps
+    assert datetime.fromisoformat(marks["last_read_at"]).tzinfo is None
+    assert datetime.fromisoformat(marks["last_read_at"]) >= datetime.fromisoformat(message["timestamp"])
+
+
+def test_marks_never_run_ahead_of_the_server_clock(client, people):
+    alice_token, _ = people["alice"]
+    bob_token, bob = people["bob"]
+    with client.websocket_connect(f"/message/ws?token={alice_token}") as alice_ws, \
+            client.websocket_connect(f"/message/ws?token={bob_token}") as bob_ws:
+        send_and_wait_for_ack(alice_ws, {"type": "message", "content": "hi", "receiver_id": bob})
+        message = receive(bob_ws, "message")
+        bob_ws.send_json({
+            "type": "delivered",
+            "conversation_id": message["conversation_id"],
+            "message_id": message["message_id"],
+            "timestamp": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+        })
+        receive(alice_ws, "receipt")
+    delivered_at = receipts(client, alice_token, message["conversation_id"])[bob]["last_delivered_at"]
+    assert datetime.fromisoformat(delivered_at) <= datetime.now()
+
+
+@pytest.mark.parametrize("frame", [
+    {"type": "read", "conversation_id": str(uuid.uuid4()), "message_id": str(uuid.uuid4()), "timestamp": "yesterday"},
+    {"type": "read", "conversation_id": str(uuid.uuid4()), "message_id": str(uuid.uuid4()),
+     "timestamp": datetime.now().isoformat()},
+], ids=["bad timestamp", "not a member"])
+def test_bad_receipts_are_answered_with_an_error(client, people, frame):
+    token, _ = people["carol"]
+    with client.websocket_connect(f"/message/ws?token={token}") as ws:
+        ws.send_json(frame)
+        assert receive(ws, "receipt")["type"] == "error"
@@ -0,0 +1,75 @@
+import uuid
+
+import pytest
+
+from tests.utils import auth, send_and_wait_for_ack
+
+
+def receive(ws, frame_type: str) -> dict:
+    """the next frame of ``frame_type``, skipping presence and the like"""
+    while True:
+        frame = ws.receive_json()
+        if frame["type"] in (frame_type, "error"):
+            return frame
+
+
+@pytest.fixture(scope="module")
+def people(make_user):
+    return {name: make_user(name) for name in ("owner", "member", "outsider")}
+
+
+@pytest.fixture
+def room(client, people):
+    owner_token, _ = people["owner"]
+    _, member = people["member"]
+    response = client.post("/rooms", json={"name": "general", "member_ids": [member]}, headers=auth(owner_token))
+    assert response.status_code == 201, response.text
+    data = response.json()["data"]
+    assert data["member_count"] == 2
+    return data["room_id"]
+
+
+def test_room_messages_reach_members_only(client, people, room):
+    (owner_token, owner), (member_token, _), (outsider_token, _) = people["owner"], people["member"], people["outsider"]
+    with client.websocket_connect(f"/message/ws?token={owner_token}") as owner_ws, \
+            client.websocket_connect(f"/message/ws?token={member_token}") as member_ws, \
+            client.websocket_connect(f"/message/ws?token={outsider_token}") as outsider_ws:
+        ack = send_and_wait_for_ack(owner_ws, {"type": "message", "content": "hi all", "room_id": room})
+        assert ack["status"] == "persisted"
+        frame = receive(member_ws, "message")
+        assert (frame["room_id"], frame["sender_id"], frame["content"]) == (room, owner, "hi all")
+        assert send_and_wait_for_ack(outsider_ws, {"type": "message", "content": "me too", "room_id": room})["type"] == "error"
+
+    history = client.get(f"/rooms/{room}/messages", headers=auth(member_token))
+    assert [message["content"] for message in history.json()] == ["hi all"]
+    assert client.get(f"/rooms/{room}/messages", headers=auth(outsider_token)).status_code == 404
+    assert client.get(f"/rooms/{room}", headers=auth(outsider_token)).status_code == 404
+
+
+def test_joining_and_leaving(client, people, room):
+    (owner_token, owner), (member_token, member), (outsider_token, outsider) = (
+        people["owner"], people["member"], people["outsider"],
+    )
+    with client.websocket_connect(f"/message/ws?token={outsider_token}") as outsider_ws:
+        response = client.post(f"/rooms/{room}/members", json={"user_ids": [outsider, member]}, headers=auth(member_token))
+        assert response.json()["data"]["member_count"] == 3
+        assert receive(outsider_ws, "room_joined")["room_id"] == room
+        # a new member can post right away
+        ack = send_and_wait_for_ack(outsider_ws, {"type": "message", "content": "hello", "room_id": room})
+        assert ack["status"] == "persisted"
+
+        # only the creator removes other people
+        assert client.delete(f"/rooms/{room}/members/{owner}", headers=auth(outsider_token)).status_code == 403
+        assert client.delete(f"/rooms/{room}/members/{outsider}", headers=auth(owner_token)).status_code == 200
+        assert receive(outsider_ws, "room_left")["room_id"] == room
+        assert send_and_wait_for_ack(outsider_ws, {"type": "message", "content": "still here?", "room_id": room})["type"] == "error"
+
+    assert client.delete(f"/rooms/{room}/members/{member}", headers=auth(member_token)).status_code == 200
+    assert client.get(f"/rooms/{room}", headers=auth(member_token)).status_code == 404
+    assert client.get(f"/rooms/{room}", headers=auth(owner_token)).json()["data"]["member_count"] == 1
+
+
+def test_unknown_members_are_rejected(client, people):
+    owner_token, _ = people["owner"]
+    response = client.post("/rooms", json={"name": "ghosts", "member_ids": [str(uuid.uuid4())]}, headers=auth(owner_token))
+    assert response.status_code == 400
@@ -0,0 +1,83 @@
+import uuid
+
+import pytest
+
+from tests.utils import auth, send_and_wait_for_ack
+
+
+@pytest.fixture(scope="module")
+def chats(client, make_user):
+    """alice talks to bob and carol; every word is unique to the test so other tests' messages never match"""
+    word = lambda: f"w{uuid.uuid4().hex[:8]}"  # noqa: E731
+    words = {name: word() for name in ("fox", "dog", "quick", "brown")}
+    alice_token, alice = make_user("alice")
+    bob_token, bob = make_user("bob")
+    carol_token, carol = make_user("carol")
+    messages = {
+        bob: [f"the {words['quick']} {words['brown']} {words['fox']}", f"a {words['dog']} sleeps",
+              f"{words['quick']} {words['quick']} {words['fox']}"],
+        carol: [f"{words['fox']} in the henhouse"],
+    }
+    with client.websocket_connect(f"/message/ws?token={alice_token}") as ws:
+        for receiver, contents in messages.items():
+            for content in contents:
+                ack = send_and_wait_for_ack(ws, {"type": "message", "content": content, "receiver_id": receiver})
+                assert ack["status"] == "persisted"
+    return words, {"alice": (alice_token, alice), "bob": (bob_token, bob), "carol": (carol_token, carol)}
+
+
+def search(client, token: str, **params) -> dict:
+    response = client.get("/message/search", params=params, headers=auth(token))
+    assert response.status_code == 200, response.text
+    return response.json()["data"]
+
+
+def test_search_covers_every_conversation_of_the_user(client, chats):
+    words, users = chats
+    alice_token, _ = users["alice"]
+    hits = search(client, alice_token, q=words["fox"])["results"]
+    assert len(hits) == 3
+    # the message repeating a term ranks above the others
+    assert hits[0]["content"].startswith(f"{words['quick']} {words['quick']}")
+    assert [hit["rank"] for hit in hits] == sorted((hit["rank"] for hit in hits), reverse=True)
+
+
+def test_search_is_limited_to_the_users_conversations(client, chats, make_user):
+    words, users = chats
+    bob_token, _ = users["bob"]
+    assert len(search(client, bob_token, q=words["fox"])["results"]) == 2
+    outsider_token, _ = make_user("outsider")
+    assert search(client, outsider_token, q=words["fox"])["results"] == []
+
+
+def test_search_one_conversation(client, chats):
+    words, users = chats
+    alice_token, _ = users["alice"]
+    _, carol = users["carol"]
+    hits = search(client, alice_token, q=words["fox"], receiver_id=carol)["results"]
+    assert [hit["content"] for hit in hits] == [f"{words['fox']} in the henhouse"]
+
+
+def test_every_word_has_to_match(client, chats):
+    words, users = chats
+    alice_token, _ = users["alice"]
+    assert len(search(client, alice_token, q=f"{words['brown']} {words['fox']}")["results"]) == 1
+    assert search(client, alice_token, q=f"{words['dog']} {words['fox']}")["results"] == []
+
+
+def test_query_syntax_in_user_input_is_just_text(client, chats):
+    words, users = chats
+    alice_token, _ = users["alice"]
+    assert search(client, alice_token, q=f'{words["fox"]}" OR "{words["dog"]}')["results"] == []
+    assert search(client, alice_token, q="*:()")["results"] == []
+
+
+def test_pages_through_hits(client, chats):
+    words, users = chats
+    alice_token, _ = users["alice"]
+    first = search(client, alice_token, q=words["fox"], limit=2)
+    assert first["next_offset"] == 2
+    rest = search(client, alice_token, q=words["fox"], limit=2, offset=first["next_offset"])
+    assert rest["next_offset"] is None
+    ids = [hit["id"] for hit in first["results"] + rest["results"]]
+    assert len(set(ids)) == 3
@@ -0,0 +1,75 @@
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+import src.database
+from src.database import get_redis
+from src.main import app
+from src.services.user_service import DIRECTORY_COUNTER_FIELD, directory_version_key
+from tests.utils import auth
+
+
+class UnavailableRedis:
+    def pipeline(self, *args, **kwargs):
+        raise RedisConnectionError("redis is down")
+
+    async def get(self, *args, **kwargs):
+        raise RedisConnectionError("redis is down")
+
+    async def set(self, *args, **kwargs):
+        raise RedisConnectionError("redis is down")
+
+
+def test_cursor_walk_returns_every_user_once(client, make_user):
+    token, _ = make_user("viewer")
+    for i in range(4):
+        make_user(f"walk-{i}")
+    ids, after = [], None
+    while True:
+        params = {"limit": 2, **({"after": after} if after else {})}
+        page = client.get("/user/get_all_users", params=params, headers=auth(token)).json()["data"]
+        ids += [user["id"] for user in page["users"]]
+        after = page["next_cursor"]
+        if after is None:
+            break
+    assert ids == sorted(ids) and len(ids) == len(set(ids)) >= 5
+
+
+def test_unchanged_directory_answers_304(client, make_user):
+    token, _ = make_user("viewer")
+    first = client.get("/user/get_all_users", headers=auth(token))
+    etag = first.headers["ETag"]
+
+    again = client.get("/user/get_all_users", headers={**auth(token), "If-None-Match": etag})
+    assert again.status_code == 304
+
+    make_user("newcomer")
+    changed = client.get("/user/get_all_users", headers={**auth(token), "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_lost_version_never_matches_an_old_etag(client, make_user):
+    token, _ = make_user("viewer")
+    etag = client.get("/user/get_all_users", headers=auth(token)).headers["ETag"]
+    # a flush or restart loses the counter, which then counts up to the same value again
+    redis, key = src.database.redis_client, directory_version_key()
+    counter = client.portal.call(redis.hget, key, DIRECTORY_COUNTER_FIELD) or 0
+    client.portal.call(redis.delete, key)
+    client.portal.call(redis.hset, key, DIRECTORY_COUNTER_FIELD, counter)
+
+    response = client.get("/user/get_all_users", headers={**auth(token), "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_without_redis_the_page_has_no_etag(client, make_user):
+    token, _ = make_user("viewer")
+    etag = client.get("/user/get_all_users", headers=auth(token)).headers["ETag"]
+
+    app.dependency_overrides[get_redis] = UnavailableRedis
+    try:
+        response = client.get("/user/get_all_users", headers={**auth(token), "If-None-Match": etag})
+    finally:
+        app.dependency_overrides.pop(get_redis)
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
+    assert response.json()["data"]["users"]
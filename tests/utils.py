@@ -0,0 +1,14 @@
+"""Helpers for tests that talk to the app through the test client."""
+
+
+def auth(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def send_and_wait_for_ack(ws, frame: dict) -> dict:
+    """send ``frame`` and return the persisted ack or error that answers it, skipping other frames"""
+    ws.send_json(frame)
+    while True:
+        reply = ws.receive_json()
+        if reply["type"] in ("ack", "error"):
+            return reply